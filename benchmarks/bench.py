@@ -0,0 +1,251 @@
+"""
+Throughput benchmark of get-html against a local corpus (see `server.py`), so that runs are reproducible.
+
+Usage:
+> python benchmarks/bench.py -o results.json                      # all workloads, 1 and 4 threads
+> python benchmarks/bench.py -w default_get mode:DEFAULT -t 1 8 16 -n 200
+> python benchmarks/bench.py -o new.json --compare results.json   # print the differences with a previous run
+
+For each workload and thread count, the results contain the number of pages and errors, the pages per second,
+the p50/p95/p99 latencies (seconds), the peak RSS (MB, this process and its children, e.g. Chromium)
+and the peak number of Chromium processes.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from server import CorpusServer, PAGE_KINDS
+
+from get_html import Modes, HtmlRenderer
+from get_html._default import default_get
+
+#: Workloads run by default: `mode:<name>` runs `env_defined_get.do_get` in the given mode
+WORKLOADS = ['default_get', 'render', 'async_render'] + [f'mode:{m.name}' for m in Modes]
+#: Interval (in seconds) between two measures of the memory and Chromium processes
+SAMPLE_INTERVAL = 0.1
+
+
+# == resources
+
+def _children(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(c) for c in f.read().split()]
+    except OSError:
+        return []
+
+
+def _descendants(pid):
+    pids, todo = [], [pid]
+    while todo:
+        children = _children(todo.pop())
+        pids.extend(children)
+        todo.extend(children)
+    return pids
+
+
+def _rss_and_name(pid):
+    # resident set size in bytes (from /proc, Linux only) and process name
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            status = dict(line.split(':', 1) for line in f if ':' in line)
+        return int(status.get('VmRSS', '0 kB').split()[0]) * 1024, status['Name'].strip()
+    except (OSError, KeyError, ValueError):
+        return 0, ''
+
+
+class ResourceSampler(threading.Thread):
+    """Record the peak RSS of this process and its descendants, and the peak number of Chromium processes."""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.peak_rss, self.peak_chromium = 0, 0
+        self.available = os.path.exists(f'/proc/{os.getpid()}/status')
+        self._done = threading.Event()
+
+    def sample(self):
+        rss, chromium = 0, 0
+        for pid in [os.getpid()] + _descendants(os.getpid()):
+            size, name = _rss_and_name(pid)
+            rss += size
+            chromium += 'chrom' in name.lower()
+        self.peak_rss, self.peak_chromium = max(self.peak_rss, rss), max(self.peak_chromium, chromium)
+
+    def run(self):
+        while self.available and not self._done.wait(SAMPLE_INTERVAL):
+            self.sample()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self._done.set()
+        self.join()
+        if self.available:
+            self.sample()
+
+
+# == workloads: each returns a list of (latency, error) for the urls
+
+def _timed(get, url):
+    start = time.monotonic()
+    try:
+        error = None if get(url) is not None else 'no response'
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+    return time.monotonic() - start, error
+
+
+def _threaded(get, urls, threads):
+    with ThreadPoolExecutor(threads) as executor:
+        return list(executor.map(lambda u: _timed(get, u), urls))
+
+
+def run_default_get(urls, threads, timeout):
+    return _threaded(lambda u: default_get(u, timeout=timeout), urls, threads)
+
+
+def run_render(urls, threads, timeout):
+    renderer = HtmlRenderer()
+    try:
+        renderer.render(urls[0], timeout=timeout)  # warm-up: launch the browser
+        return _threaded(lambda u: renderer.render(u, timeout=timeout), urls, threads)
+    finally:
+        renderer.close()
+
+
+def run_async_render(urls, threads, timeout):
+    # asyncio.gather over all the urls, at most `threads` renders at once
+    loop = asyncio.new_event_loop()
+    renderer = HtmlRenderer(loop=loop)
+
+    async def bench():
+        semaphore = asyncio.Semaphore(threads)
+
+        async def timed(url):
+            async with semaphore:
+                start = time.monotonic()
+                try:
+                    error = None if await renderer.async_render(url, timeout=timeout) is not None else 'no response'
+                except Exception as e:
+                    error = f'{type(e).__name__}: {e}'
+                return time.monotonic() - start, error
+
+        await renderer.async_browser
+        return await asyncio.gather(*[timed(u) for u in urls])
+
+    try:
+        return loop.run_until_complete(bench())
+    finally:
+        loop.run_until_complete(renderer.async_close())
+        loop.close()
+
+
+def run_mode(mode, urls, threads, timeout):
+    from get_html import env_defined_get
+    env_defined_get.configure(mode)
+    try:
+        return _threaded(lambda u: env_defined_get.do_get(u, timeout=timeout), urls, threads)
+    finally:
+        env_defined_get.close_all()
+
+
+def run_workload(workload, urls, threads, timeout):
+    if workload.startswith('mode:'):
+        return run_mode(Modes[workload[5:]], urls, threads, timeout)
+    return globals()[f'run_{workload}'](urls, threads, timeout)
+
+
+# == statistics
+
+def percentile(values, p):
+    """:return: the p-th percentile (0-100) of the values, with linear interpolation"""
+    values = sorted(values)
+    if not values:
+        return None
+    k = (len(values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def benchmark(workload, urls, threads, timeout):
+    """:return: the result (a dict) of running the workload on the urls"""
+    with ResourceSampler() as sampler:
+        start = time.monotonic()
+        timings = run_workload(workload, urls, threads, timeout)
+        duration = time.monotonic() - start
+    latencies = [latency for latency, _ in timings]
+    errors = [error for _, error in timings if error is not None]
+    return dict(
+        workload=workload, threads=threads, pages=len(urls), errors=len(errors), first_errors=errors[:5],
+        duration=round(duration, 3), pages_per_sec=round(len(urls) / duration, 2),
+        **{f'p{p}': round(percentile(latencies, p), 4) for p in [50, 95, 99]},
+        peak_rss_mb=round(sampler.peak_rss / 2 ** 20, 1) if sampler.available else None,
+        chromium_processes=sampler.peak_chromium if sampler.available else None)
+
+
+def compare(results, baseline):
+    """Print the relative difference of pages/sec and p95 with the matching results of a previous run."""
+    previous = {(r['workload'], r['threads']): r for r in baseline['results'] if 'failed' not in r}
+    print(f'\n{"workload":<24} {"threads":>7} {"pages/s":>9} {"Δ":>8} {"p95":>8} {"Δ":>8}')
+    for r in results:
+        if 'failed' in r:
+            continue
+        old = previous.get((r['workload'], r['threads']))
+        delta = (lambda key: f'{(r[key] - old[key]) / old[key]:+.1%}' if old and old[key] else '-')
+        print(f'{r["workload"]:<24} {r["threads"]:>7} {r["pages_per_sec"]:>9} {delta("pages_per_sec"):>8} '
+              f'{r["p95"]:>8} {delta("p95"):>8}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-w', '--workloads', nargs='+', default=WORKLOADS, choices=WORKLOADS, metavar='WORKLOAD',
+                        help=f'workloads to run, among: {", ".join(WORKLOADS)}')
+    parser.add_argument('-t', '--threads', nargs='+', type=int, default=[1, 4], help='thread counts (concurrency)')
+    parser.add_argument('-n', '--pages', type=int, default=60, help='number of pages per run')
+    parser.add_argument('-k', '--kinds', nargs='+', default=PAGE_KINDS, choices=PAGE_KINDS, help='kinds of pages')
+    parser.add_argument('--timeout', type=int, default=30, help='timeout of each call, in seconds')
+    parser.add_argument('-o', '--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', type=argparse.FileType('r'), help='JSON file of a previous run to compare with')
+    args = parser.parse_args(argv)
+
+    baseline = json.load(args.compare) if args.compare else None
+    results = []
+    with CorpusServer() as server:
+        urls = server.urls(args.kinds, args.pages)
+        for workload in args.workloads:
+            for threads in args.threads:
+                try:
+                    result = benchmark(workload, urls, threads, args.timeout)
+                except Exception as e:  # e.g. Chromium cannot be launched: go on with the other workloads
+                    print(f'{workload:<24} threads={threads:<3} FAILED: {type(e).__name__}: {e}', file=sys.stderr)
+                    results.append(dict(workload=workload, threads=threads, failed=f'{type(e).__name__}: {e}'))
+                    continue
+                print(f'{workload:<24} threads={threads:<3} {result["pages_per_sec"]:>8} pages/s  '
+                      f'p50={result["p50"]:.3f}s p95={result["p95"]:.3f}s p99={result["p99"]:.3f}s  '
+                      f'errors={result["errors"]} rss={result["peak_rss_mb"]}MB chromium={result["chromium_processes"]}',
+                      file=sys.stderr)
+                results.append(result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(dict(
+                date=datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                python=platform.python_version(), platform=platform.platform(), cpu_count=os.cpu_count(),
+                pages=args.pages, kinds=args.kinds, timeout=args.timeout, results=results), f, indent=2)
+    if baseline is not None:
+        compare(results, baseline)
+    return results
+
+
+if __name__ == '__main__':
+    main()
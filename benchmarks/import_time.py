@@ -0,0 +1,57 @@
+"""
+Import time of get-html's modules, each measured in fresh interpreters (median of several runs).
+
+Usage:
+> python benchmarks/import_time.py                              # print the import times
+> python benchmarks/import_time.py -o imports.json --max-ms 400  # fail (exit 1) if an import takes longer
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+#: What is imported, from the lightest to the heaviest use
+IMPORTS = {
+    'get_html': 'import get_html',
+    'env_defined_get': 'from get_html.env_defined_get import do_get',
+    'renderer': 'from get_html import HtmlRenderer; HtmlRenderer()',
+}
+
+_MEASURE = '''
+import time
+start = time.perf_counter()
+{}
+print(time.perf_counter() - start)
+'''
+
+
+def import_time(code, runs):
+    """:return: the median time (in milliseconds) to run the code in a new interpreter"""
+    env = {k: v for k, v in os.environ.items() if k != 'RENDER_HTML'}
+    times = [float(subprocess.run([sys.executable, '-c', _MEASURE.format(code)], env=env, check=True,
+                                  stdout=subprocess.PIPE, universal_newlines=True).stdout) for _ in range(runs)]
+    return round(statistics.median(times) * 1000, 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--runs', type=int, default=5, help='number of runs of each import')
+    parser.add_argument('-o', '--output', help='write the results to this JSON file')
+    parser.add_argument('--max-ms', type=float, help='fail if importing get_html or env_defined_get takes longer')
+    args = parser.parse_args(argv)
+
+    results = {name: import_time(code, args.runs) for name, code in IMPORTS.items()}
+    for name, ms in results.items():
+        print(f'{name:<20} {ms:>8.1f} ms')
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.max_ms is not None and max(results['get_html'], results['env_defined_get']) > args.max_ms:
+        print(f'import time regression: more than {args.max_ms}ms', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
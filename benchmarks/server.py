@@ -0,0 +1,110 @@
+"""
+A local web server serving a synthetic corpus of pages, so that benchmarks are reproducible and do not depend
+on the network. Run it standalone with `python benchmarks/server.py [port]` to browse the corpus.
+"""
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+#: Kinds of pages in the corpus, used to build URLs: /<kind>/<n>
+PAGE_KINDS = ['static', 'js', 'xhr', 'images', 'redirect', 'large']
+
+_PARAGRAPH = '<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt ut labore.</p>'
+_IMAGE = b'\x89PNG\r\n\x1a\n' + b'\0' * 50_000
+
+
+def _html(title, body, head=''):
+    return f'<!doctype html><html><head><title>{title}</title>{head}</head><body>{body}</body></html>'
+
+
+class CorpusHandler(BaseHTTPRequestHandler):
+    """
+    * `/static/<n>`: a server-side rendered page;
+    * `/js/<n>`: an empty page, whose content is generated by JavaScript;
+    * `/xhr/<n>`: a page whose content is loaded by a slow XHR (`/api/<n>`, 300ms);
+    * `/images/<n>`: a page with 20 images of 50KB;
+    * `/redirect/<n>`: a chain of 3 redirects to `/static/<n>`;
+    * `/large/<n>`: a 2MB page.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        match = re.fullmatch(r'/(\w+)/(\d+)(?:/(\d+))?', self.path.split('?')[0])
+        if match is None:
+            return self._send(404, _html('not found', 'not found'))
+        kind, n, hop = match.group(1), match.group(2), match.group(3)
+
+        if kind == 'static':
+            self._send(200, _html(f'static {n}', _PARAGRAPH * 20))
+        elif kind == 'js':
+            script = f'<script>document.getElementById("root").innerHTML = "{_PARAGRAPH * 20}";</script>'
+            self._send(200, _html(f'js {n}', '<div id="root"></div>' + script))
+        elif kind == 'xhr':
+            script = ('<script>fetch("/api/%s").then(r => r.text()).then(t => '
+                      'document.getElementById("root").innerHTML = t);</script>' % n)
+            self._send(200, _html(f'xhr {n}', '<div id="root"></div>' + script))
+        elif kind == 'api':
+            time.sleep(0.3)
+            self._send(200, _PARAGRAPH * 20, content_type='text/plain')
+        elif kind == 'images':
+            images = ''.join(f'<img src="/img/{n}/{i}">' for i in range(20))
+            self._send(200, _html(f'images {n}', _PARAGRAPH + images))
+        elif kind == 'img':
+            self._send(200, _IMAGE, content_type='image/png', cache=False)
+        elif kind == 'redirect':
+            hop = int(hop or 0)
+            location = f'/redirect/{n}/{hop + 1}' if hop < 2 else f'/static/{n}'
+            self.send_response(302)
+            self.send_header('Location', location)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        elif kind == 'large':
+            self._send(200, _html(f'large {n}', _PARAGRAPH * 20_000))
+        else:
+            self._send(404, _html('not found', 'not found'))
+
+    def _send(self, status, body, content_type='text/html; charset=utf-8', cache=False):
+        body = body.encode('utf-8') if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'max-age=3600' if cache else 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class CorpusServer:
+    """Serve the corpus from a background thread, on a random free port."""
+
+    def __init__(self, port=0):
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), CorpusHandler)
+        self._server.daemon_threads = True
+        self.base_url = f'http://127.0.0.1:{self._server.server_address[1]}'
+
+    def urls(self, kinds, n):
+        """:return: n URLs, cycling through the given kinds of pages"""
+        return [f'{self.base_url}/{kinds[i % len(kinds)]}/{i}' for i in range(n)]
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == '__main__':
+    with CorpusServer(int(sys.argv[1]) if len(sys.argv) > 1 else 8000) as server:
+        print(f'Serving the corpus on {server.base_url} (CTRL+C to stop)')
+        for kind in PAGE_KINDS:
+            print(f' - {server.base_url}/{kind}/1')
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
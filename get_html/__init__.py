@@ -1,2 +1,21 @@
-from ._default import Modes, ENV_VARIABLE
+from ._default import Modes, ENV_VARIABLE, enable_pooling, disable_pooling, pool_stats, \
+    enable_cache, disable_cache, cache_stats, enable_politeness, disable_politeness, \
+    enable_body_limits, disable_body_limits, enable_circuit_breaker, disable_circuit_breaker, enable_retries, \
+    disable_retries, enable_coalescing, disable_coalescing, enable_resource_cache, disable_resource_cache
+from .metrics import MetricsRegistry, add_hook as add_metrics_hook, remove_hook as remove_metrics_hook
+from .http_cache import HttpCache
+from .politeness import HostLimiter
+from .limits import BodyLimits, HTML_CONTENT_TYPES
+from .http_pool import SessionPool
 from .html_renderer import HtmlRenderer, create_renderer
+from .result import RenderResult
+from .browser_pool import BrowserPool
+from .blocking import BlockingPolicy
+from .readiness import Readiness
+from .recycling import RecyclePolicy
+from .resilience import CircuitBreaker, CircuitOpenError, RetryPolicy
+from .sink import ResultSink, read_results
+from .coalescing import SingleFlight, UrlCanonicalizer
+from .adaptive import AdaptiveLimiter
+from .deadline import Deadline, DeadlineExceeded
+from .resource_cache import ResourceCache
@@ -1,54 +1,194 @@
-if __name__ == '__main__':
-    import argparse
-    import logging
-    import threading
+import argparse
+import asyncio
+import collections
+import datetime
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+
+import requests
+
+from get_html import enable_politeness, enable_circuit_breaker, enable_retries, enable_coalescing, ResultSink, \
+    AdaptiveLimiter
+from get_html.env_defined_get import do_get
+
+# https://www.fis-ski.com/DB/general/athlete-biography.html?sector=AL&competitorid=147749&type=result
 
-    from get_html.env_defined_get import do_get
+#: Maximum number of URLs a worker puts aside while their host is busy
+MAX_DEFERRED = 100
 
-    # https://www.fis-ski.com/DB/general/athlete-biography.html?sector=AL&competitorid=147749&type=result
 
-    parser = argparse.ArgumentParser()
-    parser.add_argument('input_file', type=argparse.FileType('r'))
+def main(argv=None) -> int:
+    """
+    Fetch the URLs of a file (or stdin) using `do_get`, see `python -m get_html --help`.
+    :param argv: the command line arguments, defaults to `sys.argv[1:]`
+    :return: the exit code: 0 if all the URLs could be fetched, 1 if some failed
+    """
+    parser = argparse.ArgumentParser(prog='python -m get_html')
+    parser.add_argument('input_file', type=argparse.FileType('r'), help='file with one URL per line, - for stdin')
     parser.add_argument('-t', '--threads', type=int, default=1)
-    args = parser.parse_args()
+    parser.add_argument('-o', '--output', help='append one JSON line per URL to this file (status, timings, size, error)')
+    parser.add_argument('--resume', action='store_true', help='skip the URLs already present in the output file')
+    parser.add_argument('--retry-errors', action='store_true', help='with --resume, process failed URLs again')
+    parser.add_argument('--per-host', type=int, help='maximum number of requests in flight per host')
+    parser.add_argument('--delay', type=float, help='minimum delay (in seconds) between two requests to the same host')
+    parser.add_argument('--crawl-delay', action='store_true', help="honor the Crawl-delay of the hosts' robots.txt")
+    parser.add_argument('--retries', type=int, help='retry transient failures (timeouts, connection errors, 5xx)')
+    parser.add_argument('--circuit-breaker', type=int, metavar='FAILURES',
+                        help='stop contacting a host after that many consecutive timeouts or connection errors')
+    parser.add_argument('--coalesce', action='store_true',
+                        help='fetch the same URL (ignoring tracking parameters, fragments...) only once at a time')
+    parser.add_argument('--sink', metavar='DIR', help='store the pages (HTML and headers) in compressed files in DIR')
+    parser.add_argument('--sink-format', default='jsonl.gz', choices=['jsonl.gz', 'jsonl.zst', 'warc.gz'],
+                        help='the format of the files of --sink')
+    parser.add_argument('--adaptive', action='store_true',
+                        help='adapt the number of URLs in flight (up to --threads) to the latency, timeouts and CPU load')
+    args = parser.parse_args(argv)
+
+    if args.resume and not args.output:
+        parser.error('--resume requires --output')
 
     logging.basicConfig(level=logging.INFO)
 
-    urls = []
-    for line in args.input_file:
-        u = line.strip()
-        if u.startswith('http'):
-            urls.append(u)
-        else:
-            print(f'{u}: not a regular URL. Skipping')
+    limiter = None
+    if args.per_host or args.delay or args.crawl_delay:
+        limiter = enable_politeness(max_per_host=args.per_host or args.threads, min_delay=args.delay or 0,
+                                    crawl_delay=args.crawl_delay)
+    if args.retries:
+        enable_retries(max_retries=args.retries)
+    if args.circuit_breaker:
+        enable_circuit_breaker(failure_threshold=args.circuit_breaker)
+    if args.coalesce:
+        enable_coalescing()
+    # workers take a slot before each URL: the limit grows from 1 while the pages stay fast
+    adaptive = AdaptiveLimiter(max_limit=max(args.threads, 1)) if args.adaptive else None
 
+    # == resume: collect the URLs already processed
 
-    class Worker(threading.Thread):
+    done = set()
+    if args.resume:
+        try:
+            with open(args.output) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # truncated line, the run was interrupted while writing
+                    if not (args.retry_errors and record.get('error')):
+                        done.add(record['url'])
+        except FileNotFoundError:
+            pass
+        print(f'Resuming: {len(done)} URLs already processed.', file=sys.stderr)
 
-        def __init__(self, urls):
-            super().__init__()
-            self.urls = urls
+    # == output
 
-        def run(self):
-            for u in self.urls:
-                try:
-                    r = do_get(u)
-                    print(
-                        f'@@ {u}: {r.status_code} {r.reason}. Content length: {len(r.text)}, encoding {r.encoding}. Redirects: {len(r.history)}. Elapsed: {r.elapsed}.')
-                except Exception as e:
-                    print(f'@@ {u}: ERROR ! {e}')
+    output = open(args.output, 'a') if args.output else None
+    output_lock = threading.Lock()
+    failed = [0]  # the number of URLs which could not be fetched, for the exit code
+    # pages are written by a background thread: workers never wait for the disk
+    sink = ResultSink(args.sink, format=args.sink_format) if args.sink else None
+
+    def report(record):
+        with output_lock:
+            if record['error']:
+                failed[0] += 1
+            if output is not None:
+                output.write(json.dumps(record) + '\n')
+                output.flush()
+            elif record['error']:
+                print(f'@@ {record["url"]}: ERROR ! {record["error"]}')
+            else:
+                print(f'@@ {record["url"]}: {record["status"]} {record["reason"]}. Content length: '
+                      f'{record["length"]}, encoding {record["encoding"]}. Redirects: {record["redirects"]}. '
+                      f'Elapsed: {record["elapsed"]}.')
 
+    # == workers pull URLs from a shared queue, so a slow site only holds one worker
 
-    n = min(args.threads, len(urls))
+    urls = queue.Queue(maxsize=max(args.threads, 1) * 2)  # bounded: the input is read lazily
 
-    if n <= 1:
-        Worker(urls).run()
+    class Worker(threading.Thread):
+
+        def run(self):
+            # with per-host limits, URLs of busy hosts are put aside to work on other hosts in the meantime
+            deferred, finished = collections.deque(), False
+            while deferred or not finished:
+                u = self.next_ready(deferred)
+                if u is None and not finished and len(deferred) < MAX_DEFERRED:
+                    try:
+                        # do not block forever when some URLs are waiting for their host
+                        u = urls.get(timeout=0.1 if deferred else None)
+                    except queue.Empty:
+                        continue
+                    if u is None:
+                        finished = True
+                        continue
+                    if limiter is not None and limiter.delay(u) != 0:
+                        deferred.append(u)
+                        continue
+                if u is None:
+                    # nothing is ready: wait for the oldest deferred URL (do_get blocks until its host is ready)
+                    u = deferred.popleft()
+                self.process(u)
 
-    else:
-        workers = [Worker(urls[i::n]) for i in range(n)]
+        @staticmethod
+        def next_ready(deferred):
+            for i, u in enumerate(deferred):
+                if limiter.delay(u) == 0:
+                    del deferred[i]
+                    return u
+            return None
 
-        for w in workers:
-            w.start()
+        @staticmethod
+        def process(u):
+            if adaptive is not None:
+                adaptive.acquire()
+            record = dict(url=u, timestamp=datetime.datetime.now(datetime.timezone.utc).isoformat(), error=None)
+            start = time.time()
+            r, timeout = None, False
+            try:
+                r = do_get(u)
+                record.update(status=r.status_code, reason=r.reason, final_url=r.url, length=len(r.text),
+                              size=len(r.content), encoding=r.encoding, redirects=len(r.history),
+                              elapsed=r.elapsed.total_seconds(),
+                              timings={k: round(v, 4) for k, v in getattr(r, 'timings', {}).items()})
+            except Exception as e:
+                record['error'] = f'{type(e).__name__}: {e}'
+                timeout = isinstance(e, (requests.exceptions.Timeout, TimeoutError, asyncio.TimeoutError))
+            record['duration'] = round(time.time() - start, 3)
+            if adaptive is not None:
+                adaptive.release(None if record['error'] else record['duration'], timeout)
+                record['concurrency'] = adaptive.limit
+            if sink is not None:
+                sink.write(u, r, record['error'], timings=record.get('timings'))
+            report(record)
 
+    workers = [Worker(daemon=True) for _ in range(max(args.threads, 1))]
+    for w in workers:
+        w.start()
+
+    try:
+        for line in args.input_file:
+            u = line.strip()
+            if not u or u in done:
+                continue
+            if u.startswith('http'):
+                urls.put(u)
+            else:
+                print(f'{u}: not a regular URL. Skipping')
+    finally:
+        for _ in workers:
+            urls.put(None)
         for w in workers:
             w.join()
+        if output is not None:
+            output.close()
+        if sink is not None:
+            sink.close()
+    return 1 if failed[0] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,35 @@
+import asyncio
+
+
+async def bounded_as_completed(func, items, concurrency):
+    """
+    Await `func(item)` for each item, with at most `concurrency` calls in flight.
+    Items are consumed lazily, so `items` can be a generator of any size.
+    :return: an async generator of `(item, result or exception)` tuples, in completion order
+    """
+
+    async def _call(item):
+        try:
+            return item, await func(item)
+        except Exception as e:
+            return item, e
+
+    items = iter(items)
+    pending = set()
+    try:
+        while True:
+            for item in items:
+                pending.add(asyncio.ensure_future(_call(item)))
+                if len(pending) >= concurrency:
+                    break
+            if not pending:
+                return
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        # the caller stopped iterating early: do not leave calls running
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
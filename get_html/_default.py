@@ -1,8 +1,19 @@
+import time
 from enum import IntEnum
 
 import requests
 import urllib3
 
+from . import metrics
+from .http_cache import HttpCache, CACHE_MAX_SIZE
+from .resource_cache import ResourceCache
+from .http_pool import SessionPool
+from .limits import BodyLimits
+from .politeness import HostLimiter
+from .resilience import CircuitBreaker, RetryPolicy, is_transient
+from .deadline import DeadlineExceeded
+from .coalescing import SingleFlight
+
 #: Default user-agent if not overriden
 DEFAULT_USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_10_3) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/44.0.2403.89 Safari/537.36'
 #: Timeout used in requests.get
@@ -19,19 +30,321 @@ class Modes(IntEnum):
     DEFAULT = 0
     RENDER_HTML_MONO = 1
     RENDER_HTML_MULTI = 2
+    RENDER_HTML_POOL = 3
+    AUTO = 4
 
 
 #: Environment variable to switch between Modes
 ENV_VARIABLE = 'RENDER_HTML'
+#: Environment variable to set the number of browsers in RENDER_HTML_POOL mode
+POOL_SIZE_ENV_VARIABLE = 'RENDER_HTML_POOL_SIZE'
+#: Environment variable to turn on keep-alive connection pooling in default_get
+POOL_ENV_VARIABLE = 'HTTP_POOL'
+#: Environment variable to turn on the on-disk HTTP cache of default_get: the path of the cache file
+CACHE_ENV_VARIABLE = 'HTTP_CACHE'
+#: Environment variable to set the number of pages rendered at the same time by the renderer shared by all threads
+#: (RENDER_HTML_MONO and AUTO modes)
+CONCURRENCY_ENV_VARIABLE = 'RENDER_HTML_CONCURRENCY'
+#: Environment variable to render in a running browser (see `get_html.launcher`): its websocket endpoint or DevTools URL
+BROWSER_ENV_VARIABLE = 'RENDER_HTML_BROWSER'
+#: Environment variable to turn on the on-disk cache of the resources loaded by rendered pages: the path of the cache file
+RESOURCE_CACHE_ENV_VARIABLE = 'RENDER_HTML_RESOURCE_CACHE'
+
+# the session pool used by default_get, if pooling is enabled
+_session_pool = None
+# the persistent cache used by default_get, if caching is enabled
+_http_cache = None
+# the per-host limits of default_get and HtmlRenderer, if politeness is enabled
+_host_limiter = None
+# the size/type/duration limits of the bodies read by default_get and HtmlRenderer, if any
+_body_limits = None
+# the per-host circuit breaker of default_get and HtmlRenderer, if enabled
+_circuit_breaker = None
+# the retry policy of default_get and HtmlRenderer, if retries are enabled
+_retry_policy = None
+# the single-flight layer of do_get and HtmlRenderer, if coalescing is enabled
+_single_flight = None
+# the persistent cache of the resources (scripts, fonts...) of the rendered pages, if enabled
+_resource_cache = None
+
+
+def enable_pooling(**kwargs) -> SessionPool:
+    """
+    Make `default_get` reuse keep-alive connections instead of opening new ones on each call.
+    This also applies to `env_defined_get.do_get` in DEFAULT mode and to the fallback of `HtmlRenderer.render`.
+    If pooling is already enabled, the current pool is closed and replaced.
+    :param kwargs: passed as-is to `SessionPool`'s constructor (pool sizes, retries, ...)
+    :return: the new `SessionPool`
+    """
+    global _session_pool
+    disable_pooling()
+    _session_pool = SessionPool(**kwargs)
+    return _session_pool
+
+
+def disable_pooling():
+    """Close the current session pool, if any, and go back to one connection per `default_get` call."""
+    global _session_pool
+    pool, _session_pool = _session_pool, None
+    if pool is not None:
+        pool.close()
+
+
+def pool_stats():
+    """
+    :return: the connection reuse statistics of the current session pool (see `SessionPool.stats`),
+     or None if pooling is disabled
+    """
+    pool = _session_pool
+    return pool.stats() if pool is not None else None
+
+
+def enable_cache(path, max_size=CACHE_MAX_SIZE) -> HttpCache:
+    """
+    Make `default_get` use a persistent HTTP cache, honoring `Cache-Control`/`Expires` and revalidating
+    stale responses with conditional requests. The same file can be used by multiple processes.
+    :param path: the path of the cache file (SQLite database)
+    :param max_size: the maximum size of the cache, in bytes. Least recently used responses are evicted first.
+    :return: the new `HttpCache`
+    """
+    global _http_cache
+    disable_cache()
+    _http_cache = HttpCache(path, max_size=max_size)
+    return _http_cache
+
+
+def disable_cache():
+    """Stop using the persistent HTTP cache (the cache file is kept)."""
+    global _http_cache
+    cache, _http_cache = _http_cache, None
+    if cache is not None:
+        cache.close()
+
+
+def cache_stats():
+    """:return: the statistics of the current HTTP cache (see `HttpCache.stats`), or None if caching is disabled"""
+    cache = _http_cache
+    return cache.stats() if cache is not None else None
+
+
+def enable_politeness(**kwargs) -> HostLimiter:
+    """
+    Limit the load put on each host by `default_get`, `HtmlRenderer` and `env_defined_get`
+    (concurrency per host, delay between requests, Retry-After, ...), from all threads and async tasks.
+    :param kwargs: passed as-is to `HostLimiter`'s constructor
+    :return: the new `HostLimiter`
+    """
+    global _host_limiter
+    _host_limiter = HostLimiter(**kwargs)
+    return _host_limiter
+
+
+def disable_politeness():
+    """Remove the per-host limits."""
+    global _host_limiter
+    _host_limiter = None
+
+
+def host_limiter():
+    """:return: the current `HostLimiter`, or None if politeness is disabled"""
+    return _host_limiter
+
+
+def enable_body_limits(**kwargs) -> BodyLimits:
+    """
+    Limit the size, type and read duration of the bodies fetched by `default_get` (streaming read, early abort)
+    and rendered by `HtmlRenderer`. Responses are marked with `truncated` and `rejected` attributes.
+    :param kwargs: passed as-is to `BodyLimits`'s constructor
+    :return: the new `BodyLimits`
+    """
+    global _body_limits
+    _body_limits = BodyLimits(**kwargs)
+    return _body_limits
+
+
+def disable_body_limits():
+    """Read whole bodies again, whatever their size and type."""
+    global _body_limits
+    _body_limits = None
+
+
+def body_limits():
+    """:return: the current `BodyLimits`, or None if bodies are not limited"""
+    return _body_limits
+
+
+def enable_circuit_breaker(**kwargs) -> CircuitBreaker:
+    """
+    Stop contacting hosts which keep timing out or refusing connections, in `default_get`, `HtmlRenderer`
+    and `env_defined_get`: calls fail fast with `CircuitOpenError` until a probe request succeeds.
+    :param kwargs: passed as-is to `CircuitBreaker`'s constructor
+    :return: the new `CircuitBreaker`
+    """
+    global _circuit_breaker
+    _circuit_breaker = CircuitBreaker(**kwargs)
+    return _circuit_breaker
+
 
+def disable_circuit_breaker():
+    """Contact all hosts again, whatever their failures."""
+    global _circuit_breaker
+    _circuit_breaker = None
 
-def default_get(url, headers=None, timeout=GET_TIMEOUT) -> requests.Response:
+
+def circuit_breaker():
+    """:return: the current `CircuitBreaker`, or None if disabled"""
+    return _circuit_breaker
+
+
+def enable_retries(**kwargs) -> RetryPolicy:
+    """
+    Retry the transient failures (timeouts, connection errors, 5xx, ...) of `default_get`, `HtmlRenderer`
+    and `env_defined_get`, with exponential backoff and jitter.
+    :param kwargs: passed as-is to `RetryPolicy`'s constructor
+    :return: the new `RetryPolicy`
+    """
+    global _retry_policy
+    _retry_policy = RetryPolicy(**kwargs)
+    return _retry_policy
+
+
+def disable_retries():
+    """Make a single attempt per call again."""
+    global _retry_policy
+    _retry_policy = None
+
+
+def retry_policy():
+    """:return: the current `RetryPolicy`, or None if retries are disabled"""
+    return _retry_policy
+
+
+def enable_coalescing(**kwargs) -> SingleFlight:
+    """
+    Make concurrent calls of `env_defined_get.do_get` and `HtmlRenderer.render` for the same URL (once canonicalized,
+    see `UrlCanonicalizer`) share one fetch or render. Each caller gets its own response object.
+    :param kwargs: passed as-is to `SingleFlight`'s constructor
+    :return: the new `SingleFlight`
+    """
+    global _single_flight
+    _single_flight = SingleFlight(**kwargs)
+    return _single_flight
+
+
+def disable_coalescing():
+    """Fetch each URL as many times as it is requested again."""
+    global _single_flight
+    _single_flight = None
+
+
+def single_flight():
+    """:return: the current `SingleFlight`, or None if coalescing is disabled"""
+    return _single_flight
+
+
+def enable_resource_cache(path, **kwargs) -> ResourceCache:
+    """
+    Make all `HtmlRenderer`s serve the static resources of the pages (scripts, stylesheets, fonts, images) from
+    a persistent cache, instead of downloading them on every render. The same file can be used by multiple processes.
+    :param path: the path of the cache file
+    :param kwargs: passed as-is to `ResourceCache`'s constructor (maximum size, resource types, ...)
+    :return: the new `ResourceCache`
+    """
+    global _resource_cache
+    disable_resource_cache()
+    _resource_cache = ResourceCache(path, **kwargs)
+    return _resource_cache
+
+
+def disable_resource_cache():
+    """Stop using the resource cache (the cache file is kept)."""
+    global _resource_cache
+    cache, _resource_cache = _resource_cache, None
+    if cache is not None:
+        cache.close()
+
+
+def resource_cache():
+    """:return: the current `ResourceCache`, or None if it is disabled"""
+    return _resource_cache
+
+
+def default_get(url, headers=None, timeout=GET_TIMEOUT, deadline=None) -> requests.Response:
+    """
+    Get a URL using requests, ignoring SSL certificates.
+    :param deadline: a `Deadline` shared by all the attempts (see `enable_retries`), instead of the `timeout`
+     of each: every attempt gets the time left, and there is no retry once it passed
+    :return: a `requests.Response`, with an additional `timings` attribute: the time (in seconds) spent in each phase
+     (`wait` for the host's politeness limits, `request` until the headers are received, `body`, `retry` waiting
+     between attempts, `cache`, `total`)
+    """
     if headers is None:
         headers = dict()
     headers.setdefault('User-Agent', DEFAULT_USER_AGENT)
 
+    timer = metrics.PhaseTimer()
+    try:
+        cache = _http_cache
+        if cache is not None:
+            resp = cache.get(url, headers, lambda h: _fetch(url, h, timeout, timer, deadline))
+            timer.mark('cache')
+        else:
+            resp = _fetch(url, headers, timeout, timer, deadline)
+    except Exception:
+        metrics.record('default_get', timer.finish(), 'error')
+        raise
+    resp.timings = timer.finish()
+    metrics.record('default_get', resp.timings, 'ok')
+    return resp
+
+
+def _fetch(url, headers, timeout, timer, deadline=None) -> requests.Response:
+    breaker, retry, attempt = _circuit_breaker, _retry_policy, 0
+    while True:
+        if breaker is not None:
+            breaker.check(url)
+        try:
+            resp = _fetch_once(url, headers, timeout, timer, deadline)
+        except Exception as e:
+            if breaker is not None and not isinstance(e, DeadlineExceeded):
+                breaker.record(url, failure=is_transient(e))
+            delay = None if retry is None else retry.next_delay(attempt, deadline, error=e)
+            if delay is None:
+                raise
+        else:
+            if breaker is not None:
+                breaker.record(url, failure=False)
+            delay = None if retry is None else retry.next_delay(attempt, deadline, status=resp.status_code)
+            if delay is None:
+                return resp
+        time.sleep(delay)
+        timer.mark('retry')
+        attempt += 1
+
+
+def _fetch_once(url, headers, timeout, timer, deadline) -> requests.Response:
+    limiter = _host_limiter
+    if limiter is None:
+        return _send(url, headers, timeout, timer, deadline)
+    with limiter.limit(url, deadline) as slot:
+        timer.mark('wait')
+        slot.response = _send(url, headers, timeout, timer, deadline)
+    return slot.response
+
+
+def _send(url, headers, timeout, timer, deadline) -> requests.Response:
+    get = requests.get if _session_pool is None else _session_pool.get
+    if deadline is not None:
+        timeout = deadline.timeout('fetch')  # what is left after the wait for the host
     # ignore SSL certificates
-    resp = requests.get(url, verify=False, stream=True, headers=headers, timeout=timeout)
-    # this triggers content decoding, thus can generate ContentDecodingError
-    _ = resp.content
+    resp = get(url, verify=False, stream=True, headers=headers, timeout=timeout)
+    timer.mark('request')
+    limits = _body_limits
+    if limits is not None:
+        # read the body chunk by chunk, stopping early if needed (can also generate ContentDecodingError)
+        limits.read(resp)
+    else:
+        # this triggers content decoding, thus can generate ContentDecodingError
+        _ = resp.content
+    timer.mark('body')
     return resp
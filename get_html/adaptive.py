@@ -0,0 +1,172 @@
+import asyncio
+import collections
+import logging
+import os
+import statistics
+import threading
+import time
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+#: How often (in seconds) to check again when waiting for a free slot from an async task
+POLL_INTERVAL = 0.05
+#: Number of decisions kept for monitoring (see `AdaptiveLimiter.decisions`)
+MAX_DECISIONS = 100
+#: How fast the latency baseline may rise (per window), so that it follows slower pages without hiding overloads
+BASELINE_DRIFT = 1.1
+
+
+def cpu_load():
+    """:return: the 1-minute load average per CPU, or None if unknown on this platform"""
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return None
+
+
+class AdaptiveLimiter:
+
+    def __init__(self, min_limit=1, max_limit=16, initial=None, window=20, increase=1, decrease=0.5,
+                 target_latency=None, latency_tolerance=2., max_timeout_rate=0.1, max_load=1., max_rss=None,
+                 rss=None):
+        """
+        Adapt the number of calls in flight (e.g. renders) to what the machine and the sites can take, using AIMD:
+        after each `window` calls, the limit is increased by `increase` if everything went well and the limit
+        was reached, or multiplied by `decrease` on signs of overload:
+        * too many timeouts (more than `max_timeout_rate`),
+        * a median latency above `target_latency`, or if not set, above `latency_tolerance` times the best median
+          latency seen so far,
+        * a CPU load (per CPU) above `max_load`,
+        * a memory usage above `max_rss`.
+        Shared by threads (`acquire`) and asyncio tasks (`async_acquire`).
+
+        :param min_limit: the minimum number of calls in flight
+        :param max_limit: the maximum number of calls in flight
+        :param initial: the initial limit, defaults to `min_limit`
+        :param window: the number of calls between two decisions
+        :param increase: how much to add to the limit when everything went well
+        :param decrease: the factor applied to the limit on overload
+        :param target_latency: the maximum median latency, in seconds
+        :param latency_tolerance: without `target_latency`, how much slower than the best median latency is too slow
+        :param max_timeout_rate: the maximum ratio of calls which timed out
+        :param max_load: the maximum 1-minute load average per CPU, None to ignore the CPU
+        :param max_rss: the maximum memory, in bytes, as returned by `rss`
+        :param rss: a function returning the memory used (in bytes, e.g. by the browser), or None if unknown
+        """
+        self.min_limit, self.max_limit = min_limit, max_limit
+        self.window, self.increase, self.decrease = window, increase, decrease
+        self.target_latency, self.latency_tolerance = target_latency, latency_tolerance
+        self.max_timeout_rate, self.max_load, self.max_rss, self.rss = max_timeout_rate, max_load, max_rss, rss
+        self._limit = max(min(initial or min_limit, max_limit), min_limit)
+        self._in_flight, self._saturated = 0, False
+        self._latencies, self._calls, self._timeouts = [], 0, 0
+        self._baseline = None
+        self._decisions = collections.deque(maxlen=MAX_DECISIONS)
+        self._stats = dict(increases=0, decreases=0)
+        self.__lock = threading.Lock()
+        self.__released = threading.Condition(self.__lock)
+
+    @property
+    def limit(self) -> int:
+        """The current maximum number of calls in flight."""
+        return self._limit
+
+    # == slots
+
+    def _try_acquire(self):
+        if self._in_flight >= self._limit:
+            self._saturated = True
+            return False
+        self._in_flight += 1
+        if self._in_flight == self._limit:
+            self._saturated = True
+        return True
+
+    def acquire(self):
+        """Wait for a free slot. Call `release` once done."""
+        with self.__released:
+            while not self._try_acquire():
+                self.__released.wait()
+
+    async def async_acquire(self):
+        """Async version of `acquire`: other tasks keep running while waiting."""
+        while True:
+            with self.__lock:
+                if self._try_acquire():
+                    return
+            await asyncio.sleep(POLL_INTERVAL)
+
+    def release(self, latency=None, timeout=False):
+        """
+        Give back a slot, with the outcome of the call.
+        :param latency: the duration of the call, in seconds, None if it failed (not counted)
+        :param timeout: True if the call timed out
+        """
+        with self.__released:
+            self._in_flight -= 1
+            if timeout:
+                self._calls += 1
+                self._timeouts += 1
+            elif latency is not None:
+                self._calls += 1
+                self._latencies.append(latency)
+            if self._calls >= self.window:
+                self._adjust()
+            self.__released.notify_all()
+
+    # == decisions
+
+    def _overload(self):
+        # :return: the sign of overload, if any
+        if self._timeouts / self._calls > self.max_timeout_rate:
+            return f'{self._timeouts}/{self._calls} timeouts'
+        if self._latencies:
+            median = statistics.median(self._latencies)
+            if self.target_latency is not None:
+                if median > self.target_latency:
+                    return f'median latency {median:.2f}s > {self.target_latency:.2f}s'
+            else:
+                baseline = self._baseline
+                self._baseline = median if baseline is None else min(median, baseline * BASELINE_DRIFT)
+                if baseline is not None and median > baseline * self.latency_tolerance:
+                    return f'median latency {median:.2f}s > {self.latency_tolerance}x {baseline:.2f}s'
+        if self.max_load is not None:
+            load = cpu_load()
+            if load is not None and load > self.max_load:
+                return f'cpu load {load:.2f}'
+        if self.max_rss is not None and self.rss is not None:
+            rss = self.rss()
+            if rss is not None and rss > self.max_rss:
+                return f'memory {rss / 2 ** 20:.0f}MB'
+        return None
+
+    def _adjust(self):
+        reason = self._overload()
+        previous = self._limit
+        if reason is not None:
+            self._limit = max(self.min_limit, int(self._limit * self.decrease))
+            decision = 'decrease'
+        elif self._saturated:
+            self._limit = min(self.max_limit, self._limit + self.increase)
+            decision, reason = 'increase', 'healthy'
+        else:
+            decision = None  # the limit was not reached: no need for more
+        self._latencies, self._calls, self._timeouts, self._saturated = [], 0, 0, False
+
+        if decision is not None and self._limit != previous:
+            logger.info(f'concurrency {previous} -> {self._limit} ({reason})')
+            self._stats[f'{decision}s'] += 1
+            self._decisions.append(dict(time=time.time(), previous=previous, limit=self._limit, reason=reason))
+            metrics.record('adaptive', {}, decision)
+
+    def decisions(self) -> list:
+        """:return: the last changes of the limit, as dicts with `time`, `previous`, `limit` and `reason`"""
+        with self.__lock:
+            return list(self._decisions)
+
+    def stats(self) -> dict:
+        """:return: the current `limit`, the calls `in_flight` and the number of `increases` and `decreases`"""
+        with self.__lock:
+            return dict(self._stats, limit=self._limit, in_flight=self._in_flight)
@@ -0,0 +1,170 @@
+import asyncio
+import datetime
+import logging
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from . import metrics
+from ._default import DEFAULT_USER_AGENT, GET_TIMEOUT, default_get, host_limiter, body_limits, circuit_breaker, \
+    retry_policy
+from .limits import CHUNK_SIZE, content_type_of
+from .resilience import is_transient
+from .deadline import DeadlineExceeded
+from .http_pool import POOL_MAXSIZE
+
+# aiohttp is slow to import: it is only imported on first use, see _import_aiohttp
+# (False: not imported yet, None: not installed)
+aiohttp = False
+
+logger = logging.getLogger(__name__)
+
+#: Maximum number of simultaneous connections (all hosts) of the async client
+ASYNC_CONNECTIONS = 1000
+
+# loop -> aiohttp.ClientSession (sessions cannot be shared between loops)
+_sessions = {}
+
+
+def _import_aiohttp():
+    global aiohttp
+    if aiohttp is False:
+        try:
+            import aiohttp as module
+        except ModuleNotFoundError:
+            module = None
+        aiohttp = module
+    return aiohttp
+
+
+def _session():
+    loop = asyncio.get_event_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=ASYNC_CONNECTIONS, limit_per_host=POOL_MAXSIZE, ssl=False),
+            # do not keep cookies between calls, as with requests.get
+            cookie_jar=aiohttp.DummyCookieJar())
+        _sessions[loop] = session
+    return session
+
+
+async def async_default_get(url, headers=None, timeout=GET_TIMEOUT, deadline=None) -> requests.Response:
+    """
+    Async version of `default_get`, using a pooled [aiohttp](https://docs.aiohttp.org) session (one per event loop).
+    If aiohttp is not installed, `default_get` is run in the default executor instead.
+    :return: a `requests.Response`, with all the usual fields except `cookies` and `request`,
+     and the same `timings` as `default_get` (except `cache`)
+    """
+    if headers is None:
+        headers = dict()
+    headers.setdefault('User-Agent', DEFAULT_USER_AGENT)
+
+    loop = asyncio.get_event_loop()
+    if _import_aiohttp() is None:
+        logger.debug('aiohttp not found, running default_get in an executor')
+        return await loop.run_in_executor(None, lambda: default_get(url, headers=headers, timeout=timeout,
+                                                                        deadline=deadline))
+
+    timer = metrics.PhaseTimer()
+    breaker, retry, attempt = circuit_breaker(), retry_policy(), 0
+    try:
+        while True:
+            if breaker is not None:
+                breaker.check(url)
+            try:
+                resp = await _fetch_once(url, headers, timeout, timer, deadline)
+            except Exception as e:
+                if breaker is not None and not isinstance(e, DeadlineExceeded):
+                    breaker.record(url, failure=is_transient(e))
+                delay = None if retry is None else retry.next_delay(attempt, deadline, error=e)
+                if delay is None:
+                    raise
+            else:
+                if breaker is not None:
+                    breaker.record(url, failure=False)
+                delay = None if retry is None else retry.next_delay(attempt, deadline, status=resp.status_code)
+                if delay is None:
+                    break
+            await asyncio.sleep(delay)
+            timer.mark('retry')
+            attempt += 1
+    except Exception:
+        metrics.record('async_default_get', timer.finish(), 'error')
+        raise
+    resp.timings = timer.finish()
+    metrics.record('async_default_get', resp.timings, 'ok')
+    return resp
+
+
+async def _fetch_once(url, headers, timeout, timer, deadline) -> requests.Response:
+    limiter = host_limiter()
+    if limiter is not None:
+        await limiter.async_acquire(url, deadline)
+        timer.mark('wait')
+    if deadline is not None:
+        timeout = deadline.timeout('fetch')  # what is left after the wait for the host
+    r = None
+    try:
+        start = datetime.datetime.now()
+        async with _session().get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as r:
+            timer.mark('request')
+            limits = body_limits()
+            if limits is None:
+                content = await r.read()
+            else:
+                content, rejected, truncated = await _read_limited(r, limits)
+            timer.mark('body')
+    finally:
+        if limiter is not None:
+            limiter.release(url, *((r.status, r.headers) if r is not None else ()))
+    resp = _create_response(r, content)
+    resp.elapsed = datetime.datetime.now() - start
+    if limits is not None:
+        resp.rejected, resp.truncated = rejected, truncated
+    return resp
+
+
+async def _read_limited(r, limits):
+    # see BodyLimits.read
+    content_type = content_type_of(r.headers)
+    if not limits.allows(content_type):
+        r.close()
+        return b'', f'content-type: {content_type}', None
+
+    deadline = time.monotonic() + limits.max_duration if limits.max_duration is not None else None
+    chunks, size, truncated = [], 0, None
+    async for chunk in r.content.iter_chunked(CHUNK_SIZE):
+        chunks.append(chunk)
+        size += len(chunk)
+        if limits.max_bytes is not None and size > limits.max_bytes:
+            truncated = 'max_bytes'
+            break
+        if deadline is not None and time.monotonic() > deadline:
+            truncated = 'deadline'
+            break
+    if truncated:
+        r.close()  # do not reuse a half-read connection
+    content = b''.join(chunks)
+    return (content[:limits.max_bytes] if truncated == 'max_bytes' else content), None, truncated
+
+
+def _create_response(r, content=b''):
+    # convert an aiohttp.ClientResponse to a requests.Response, like HtmlRenderer._create_response
+    resp = requests.Response()
+    resp.url = str(r.url)
+    resp.status_code, resp.reason = r.status, r.reason
+    resp.headers = CaseInsensitiveDict(r.headers)
+    resp._content = content
+    resp.encoding = get_encoding_from_headers(resp.headers)
+    resp.history = [_create_response(h) for h in r.history]
+    return resp
+
+
+async def async_close():
+    """Close the async session of the running loop, if any."""
+    session = _sessions.pop(asyncio.get_event_loop(), None)
+    if session is not None:
+        await session.close()
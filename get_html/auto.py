@@ -0,0 +1,200 @@
+import logging
+import re
+import threading
+from urllib.parse import urlsplit
+
+import requests
+
+from ._default import GET_TIMEOUT
+from .deadline import Deadline
+
+logger = logging.getLogger(__name__)
+
+#: Number of consecutive identical verdicts after which a domain is remembered (and no longer probed)
+LEARN_AFTER = 3
+
+_SCRIPT_RE = re.compile(r'<script\b[^>]*>(.*?)</script\s*>', re.IGNORECASE | re.DOTALL)
+_INVISIBLE_RE = re.compile(r'<(script|style|noscript|template)\b[^>]*>.*?</\1\s*>|<!--.*?-->',
+                           re.IGNORECASE | re.DOTALL)
+_TAG_RE = re.compile(r'<[^>]+>')
+_SPACES_RE = re.compile(r'\s+')
+
+
+class ProbedPage:
+    """The raw HTML of a page, with the derived values used by the heuristics (computed lazily, once)."""
+
+    def __init__(self, html):
+        self.html = html
+        self._visible_text, self._script_length = None, None
+
+    @property
+    def visible_text(self) -> str:
+        if self._visible_text is None:
+            text = _TAG_RE.sub(' ', _INVISIBLE_RE.sub(' ', self.html))
+            self._visible_text = _SPACES_RE.sub(' ', text).strip()
+        return self._visible_text
+
+    @property
+    def script_length(self) -> int:
+        if self._script_length is None:
+            self._script_length = sum(len(s) for s in _SCRIPT_RE.findall(self.html))
+        return self._script_length
+
+
+# == heuristics: functions taking a ProbedPage and returning True if the page needs JavaScript
+
+def empty_body(page, min_text_length=200):
+    """Almost no visible text."""
+    return len(page.visible_text) < min_text_length
+
+
+_EMPTY_ROOT_RE = re.compile(
+    r'<div[^>]+id=["\']?(root|app|__nuxt|__next|main-app)["\']?[^>]*>\s*</div>|<app-root[^>]*>\s*</app-root>',
+    re.IGNORECASE)
+
+
+def empty_root(page):
+    """An empty mount point of a client-side framework (React, Vue, Angular, ...)."""
+    return _EMPTY_ROOT_RE.search(page.html) is not None
+
+
+_NOSCRIPT_HINT_RE = re.compile(r'<noscript\b[^>]*>[^<]*(enable|requires?|need)[^<]*javascript',
+                               re.IGNORECASE | re.DOTALL)
+
+
+def noscript_hint(page):
+    """A `<noscript>` asking to enable JavaScript."""
+    return _NOSCRIPT_HINT_RE.search(page.html) is not None
+
+
+def script_ratio(page, max_ratio=5.):
+    """Much more inline script than visible text."""
+    return page.script_length > max_ratio * max(len(page.visible_text), 1)
+
+
+_SPA_MARKERS_RE = re.compile(r'\bng-app\b|{{\s*[\w.$]+\s*}}|<div[^>]+id=["\']?__next["\']?[^>]*>\s*</div>',
+                             re.IGNORECASE)
+
+
+def spa_markers(page):
+    """Client-side templates or application shells."""
+    return _SPA_MARKERS_RE.search(page.html) is not None
+
+
+#: Heuristics used by default, in order (the first one matching wins)
+DEFAULT_HEURISTICS = [empty_body, empty_root, noscript_hint, script_ratio, spa_markers]
+
+
+class AutoGetter:
+
+    def __init__(self, get, render, async_get=None, async_render=None, heuristics=None, learn_after=LEARN_AFTER):
+        """
+        Fetch the raw HTML first, and render the page only if it looks like it needs JavaScript.
+        Each domain's verdict is remembered after `learn_after` identical verdicts, after which the
+        domain is not probed anymore: pages are either rendered directly, or fetched raw without heuristics.
+
+        :param get: the function fetching the raw HTML, e.g. `default_get`. Probes get the `deadline` shared with
+         the render.
+        :param render: the function rendering a page, e.g. `HtmlRenderer.render`
+        :param async_get: the async counterpart of `get`, needed for `async_get`
+        :param async_render: the async counterpart of `render`, needed for `async_get`
+        :param heuristics: functions taking a `ProbedPage` and returning True if the page needs rendering,
+         defaults to `DEFAULT_HEURISTICS`
+        :param learn_after: number of consecutive identical verdicts before a domain's verdict is remembered
+         (0 means never remember)
+        """
+        self._get, self._render = get, render
+        self._async_get, self._async_render = async_get, async_render
+        self.heuristics = heuristics if heuristics is not None else list(DEFAULT_HEURISTICS)
+        self.learn_after = learn_after
+        self._domains = {}  # host -> (verdict, number of consecutive identical verdicts)
+        self._stats = dict(probes=0, renders=0, renders_avoided=0, skipped_probes=0)
+        self.__lock = threading.Lock()
+
+    def needs_rendering(self, resp: requests.Response) -> bool:
+        """Apply the heuristics to a raw response. Only successful HTML responses can need rendering."""
+        if not self._probeable(resp):
+            return False
+        page = ProbedPage(resp.text)
+        for heuristic in self.heuristics:
+            if heuristic(page):
+                logger.debug(f'{resp.url}: needs rendering ({heuristic.__name__})')
+                return True
+        return False
+
+    def verdict(self, url):
+        """:return: the remembered verdict for the domain of the url (True if it needs rendering), or None"""
+        host = urlsplit(url).hostname
+        with self.__lock:
+            verdict, count = self._domains.get(host, (None, 0))
+        return verdict if self.learn_after and count >= self.learn_after else None
+
+    def stats(self) -> dict:
+        """
+        :return: the number of `probes` (raw fetches analyzed), `renders`, `renders_avoided` (probes which
+         did not need rendering) and `skipped_probes` (thanks to a remembered domain verdict)
+        """
+        with self.__lock:
+            return dict(self._stats, domains_learned=sum(
+                1 for _, count in self._domains.values() if self.learn_after and count >= self.learn_after))
+
+    def get(self, url, headers=None, timeout=GET_TIMEOUT) -> requests.Response:
+        """Get the raw or rendered HTML of a page, depending on the heuristics."""
+        verdict = self.verdict(url)
+        if verdict is not None:
+            self._count('skipped_probes')
+            if verdict:
+                self._count('renders')
+                return self._render(url, timeout=timeout)
+            return self._get(url, headers=headers, timeout=timeout)
+
+        deadline = Deadline(timeout)  # the render only gets the time left after the probe
+        resp = self._get(url, headers=headers, timeout=timeout, deadline=deadline)
+        if self._probe(url, resp) and not self._out_of_time(url, deadline):
+            resp = self._render(url, timeout=deadline.timeout('render'))
+        return resp
+
+    async def async_get(self, url, headers=None, timeout=GET_TIMEOUT) -> requests.Response:
+        """Async version of `get`."""
+        verdict = self.verdict(url)
+        if verdict is not None:
+            self._count('skipped_probes')
+            if verdict:
+                self._count('renders')
+                return await self._async_render(url, timeout=timeout)
+            return await self._async_get(url, headers=headers, timeout=timeout)
+
+        deadline = Deadline(timeout)  # the render only gets the time left after the probe
+        resp = await self._async_get(url, headers=headers, timeout=timeout, deadline=deadline)
+        if self._probe(url, resp) and not self._out_of_time(url, deadline):
+            resp = await self._async_render(url, timeout=deadline.timeout('render'))
+        return resp
+
+    @staticmethod
+    def _out_of_time(url, deadline):
+        # the raw page is better than nothing
+        if deadline.expired:
+            logger.info(f'{url}: no time left to render, returning the raw page')
+            return True
+        return False
+
+    @staticmethod
+    def _probeable(resp):
+        return resp.status_code == 200 and 'html' in resp.headers.get('Content-Type', 'text/html')
+
+    def _probe(self, url, resp):
+        if not self._probeable(resp):
+            # errors, PDFs, ... say nothing about the domain
+            return False
+        render = self.needs_rendering(resp)
+        host = urlsplit(url).hostname
+        with self.__lock:
+            self._stats['probes'] += 1
+            self._stats['renders' if render else 'renders_avoided'] += 1
+            verdict, count = self._domains.get(host, (None, 0))
+            self._domains[host] = (render, count + 1 if verdict == render else 1)
+        return render
+
+    def _count(self, key):
+        with self.__lock:
+            self._stats[key] += 1
@@ -0,0 +1,123 @@
+import asyncio
+import logging
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+#: Well-known analytics/advertising domains, blocked by the "dom-only" preset
+TRACKER_DOMAINS = (
+    'google-analytics.com', 'googletagmanager.com', 'googlesyndication.com', 'doubleclick.net',
+    'googleadservices.com', 'facebook.net', 'connect.facebook.com', 'scorecardresearch.com',
+    'hotjar.com', 'segment.io', 'segment.com', 'newrelic.com', 'nr-data.net', 'quantserve.com',
+    'criteo.com', 'taboola.com', 'outbrain.com', 'adnxs.com', 'amazon-adsystem.com',
+)
+
+#: Rough median size (in bytes) of a resource of each type, used to estimate the bytes saved by blocking.
+#: Blocked requests are never sent, so their actual size is unknown.
+TYPICAL_SIZES = {
+    'image': 15_000, 'media': 250_000, 'font': 30_000, 'stylesheet': 10_000,
+    'script': 15_000, 'texttrack': 2_000, 'xhr': 2_000, 'fetch': 2_000, 'other': 2_000,
+}
+
+
+def _host_matches(host, domains):
+    return any(host == d or host.endswith('.' + d) for d in domains)
+
+
+async def continue_request(request):
+    """The default request handler: let the request through."""
+    await request.continue_()
+
+
+async def intercept_requests(page, handler):
+    """
+    Enable request interception on the page: each request is then paused until the handler continues,
+    aborts or answers it.
+    :param page: a pyppeteer page
+    :param handler: an async function taking a pyppeteer `Request`
+    """
+
+    async def intercept(request):
+        try:
+            await handler(request)
+        except Exception as e:
+            # the request may have been handled already, or the page closed in the meantime
+            logger.debug(f'{request.url}: interception failed: {e}')
+
+    await page.setRequestInterception(True)
+    page.on('request', lambda request: asyncio.ensure_future(intercept(request)))
+
+
+class BlockingPolicy:
+
+    def __init__(self, resource_types=(), deny_domains=(), allow_domains=None):
+        """
+        Rules deciding which requests a page is not allowed to make while rendering.
+        The navigation request of the main frame is never blocked.
+        Note: pyppeteer disables the browser cache on pages with request interception (see `ResourceCache`).
+
+        :param resource_types: resource types to abort, e.g. `('image', 'font')`. See
+         [`puppeteer's resourceType`](https://pptr.dev/#?product=Puppeteer&version=v2.1.1&show=api-httprequestresourcetype)
+        :param deny_domains: requests to those domains (or their subdomains) are aborted
+        :param allow_domains: if set, requests to any other domain are aborted
+        """
+        self.resource_types = frozenset(resource_types)
+        self.deny_domains = tuple(deny_domains)
+        self.allow_domains = tuple(allow_domains) if allow_domains is not None else None
+
+    def should_block(self, url, resource_type) -> bool:
+        if resource_type in self.resource_types:
+            return True
+        host = (urlsplit(url).hostname or '').lower()
+        if not host:  # data: URLs and the like
+            return False
+        if _host_matches(host, self.deny_domains):
+            return True
+        return self.allow_domains is not None and not _host_matches(host, self.allow_domains)
+
+    async def install(self, page, handler=continue_request) -> dict:
+        """
+        Enable request interception on the page, aborting the requests matching the policy.
+        :param page: a pyppeteer page
+        :param handler: what to do with the other requests, see `intercept_requests`. Defaults to let them through.
+        :return: a dict updated in place with the number of `blocked` requests, the blocked requests
+         per resource type (`blocked_by_type`) and an estimate of the `bytes_saved`
+        """
+        stats = dict(blocked=0, blocked_by_type={}, bytes_saved=0)
+
+        async def intercept(request):
+            if request.isNavigationRequest() and request.frame is page.mainFrame \
+                    or not self.should_block(request.url, request.resourceType):
+                await handler(request)
+                return
+            await request.abort()
+            stats['blocked'] += 1
+            stats['blocked_by_type'][request.resourceType] = \
+                stats['blocked_by_type'].get(request.resourceType, 0) + 1
+            stats['bytes_saved'] += TYPICAL_SIZES.get(request.resourceType, 0)
+
+        await intercept_requests(page, intercept)
+        return stats
+
+    @classmethod
+    def get(cls, policy):
+        """
+        :param policy: None, a `BlockingPolicy`, or the name of a preset in `PRESETS`
+        :return: the matching `BlockingPolicy`, or None
+        """
+        if policy is None or isinstance(policy, cls):
+            return policy
+        try:
+            return PRESETS[policy]
+        except KeyError:
+            raise ValueError(f'unknown blocking preset {policy!r}. Use one of {list(PRESETS)}')
+
+
+#: Predefined policies, to pass by name to HtmlRenderer
+PRESETS = {
+    # keep scripts, so the DOM is the same as in a regular browser, but load nothing that is only visual
+    'dom-only': BlockingPolicy(
+        resource_types=('image', 'media', 'font', 'stylesheet', 'texttrack', 'manifest'),
+        deny_domains=TRACKER_DOMAINS),
+    'no-media': BlockingPolicy(resource_types=('image', 'media', 'font')),
+}
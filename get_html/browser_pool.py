@@ -0,0 +1,63 @@
+import logging
+import os
+import threading
+
+from .html_renderer import HtmlRenderer
+
+logger = logging.getLogger(__name__)
+
+#: Default number of browsers in a BrowserPool
+BROWSER_POOL_SIZE = os.cpu_count() or 2
+
+
+class BrowserPool:
+
+    def __init__(self, size=BROWSER_POOL_SIZE, **renderer_kwargs):
+        """
+        A fixed-size pool of `HtmlRenderer`, each managing its own browser.
+        Each call is routed to the renderer with the fewest renders in flight, so that
+        threads render in parallel (up to `size`) while memory stays bounded.
+        Browsers are launched lazily, on the first render routed to them.
+
+        :param size: the number of browsers
+        :param renderer_kwargs: passed as-is to each `HtmlRenderer`
+        """
+        if size < 1:
+            raise ValueError(f'size must be at least 1, got {size}')
+        self.renderers = [HtmlRenderer(**renderer_kwargs) for _ in range(size)]
+        self._loads = [0] * size
+        self.__lock = threading.Lock()
+
+    def _checkout(self):
+        with self.__lock:
+            i = min(range(len(self._loads)), key=self._loads.__getitem__)
+            self._loads[i] += 1
+        return i
+
+    def _checkin(self, i):
+        with self.__lock:
+            self._loads[i] -= 1
+
+    def loads(self):
+        """:return: the number of renders in flight (or waiting) for each browser"""
+        with self.__lock:
+            return list(self._loads)
+
+    def render(self, url, **kwargs):
+        """
+        Render a URL using the least-loaded browser.
+        :param url: the URL
+        :param kwargs: see `HtmlRenderer.async_render`
+        :return: see `HtmlRenderer.render`
+        """
+        i = self._checkout()
+        try:
+            logger.debug(f'{url}: routed to browser {i}')
+            return self.renderers[i].render(url, **kwargs)
+        finally:
+            self._checkin(i)
+
+    def close(self):
+        """Close all the browsers. They will be launched again if the pool is used afterwards."""
+        for renderer in self.renderers:
+            renderer.close()
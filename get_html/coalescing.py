@@ -0,0 +1,185 @@
+import asyncio
+import copy
+import fnmatch
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import requests
+
+#: Query parameters dropped by default: tracking parameters, which do not change the page (shell-style patterns)
+TRACKING_PARAMS = ('utm_*', 'fbclid', 'gclid', 'dclid', 'msclkid', 'yclid', 'igshid', 'mc_cid', 'mc_eid', '_ga')
+
+_DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+class UrlCanonicalizer:
+
+    def __init__(self, drop_params=TRACKING_PARAMS, drop_fragment=True, sort_query=True, lowercase_host=True,
+                 drop_default_port=True):
+        """
+        Rewrite URLs which lead to the same page in the same way, e.g.
+        `HTTP://Example.com:80/a?b=1&a=2&utm_source=x#top` to `http://example.com/a?a=2&b=1`.
+
+        :param drop_params: the query parameters to remove, as shell-style patterns (e.g. `utm_*`)
+        :param drop_fragment: remove the fragment (`#...`), which is never sent to the server
+        :param sort_query: sort the query parameters by name (the order of repeated parameters is kept)
+        :param lowercase_host: lower-case the scheme and the host
+        :param drop_default_port: remove `:80` from http and `:443` from https URLs
+        """
+        self.drop_params, self.drop_fragment, self.sort_query = drop_params, drop_fragment, sort_query
+        self.lowercase_host, self.drop_default_port = lowercase_host, drop_default_port
+
+    def __call__(self, url) -> str:
+        """:return: the canonical form of the URL"""
+        scheme, netloc, path, query, fragment = urlsplit(url)
+        if self.lowercase_host:
+            scheme, netloc = scheme.lower(), netloc.lower()
+        if self.drop_default_port and ':' in netloc:
+            host, _, port = netloc.rpartition(':')
+            if port.isdigit() and int(port) == _DEFAULT_PORTS.get(scheme.lower()):
+                netloc = host
+        if self.drop_params or self.sort_query:
+            params = parse_qsl(query, keep_blank_values=True)
+            if self.drop_params:
+                params = [(k, v) for k, v in params if not any(fnmatch.fnmatchcase(k, p) for p in self.drop_params)]
+            if self.sort_query:
+                params.sort(key=lambda param: param[0])
+            query = urlencode(params)
+        return urlunsplit((scheme, netloc, path or '/', query, '' if self.drop_fragment else fragment))
+
+
+def copy_response(resp):
+    """
+    :param resp: a `requests.Response` or a `RenderResult`
+    :return: a copy, sharing the body (immutable) but with its own headers, timings...
+    """
+    if isinstance(resp, requests.Response):
+        # not copy.copy: Response's __getstate__ only keeps the standard attributes
+        clone = requests.Response.__new__(requests.Response)
+        clone.__dict__.update(resp.__dict__)
+        clone.history = list(resp.history)
+    else:
+        clone = copy.copy(resp)
+    clone.headers = copy.copy(resp.headers)
+    if getattr(resp, 'timings', None) is not None:
+        clone.timings = dict(resp.timings)
+    return clone
+
+
+class _Flight:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result, self.error = None, None
+
+
+class SingleFlight:
+
+    def __init__(self, canonicalize=None):
+        """
+        Share one fetch between concurrent calls for the same URL: the first call (the leader) does the work,
+        the calls made in the meantime wait for it and get a copy of its response (or its exception).
+        Nothing is kept once the call completed: this is not a cache.
+
+        :param canonicalize: a function computing the canonical form of a URL, defaults to a `UrlCanonicalizer`
+         with the default rules. URLs with the same canonical form are fetched once.
+        """
+        self.canonicalize = canonicalize or UrlCanonicalizer()
+        self._flights = {}  # key -> _Flight
+        self._futures = {}  # (loop, key) -> asyncio.Future
+        self._stats = dict(calls=0, coalesced=0)
+        self.__lock = threading.Lock()
+
+    def _key(self, url, key):
+        try:
+            key = (self.canonicalize(url),) + tuple(key)
+            hash(key)
+            return key
+        except TypeError:
+            return None  # unhashable arguments: do not coalesce
+
+    def do(self, url, func, *key):
+        """
+        Call `func`, unless a call for the same URL is in flight, in which case wait for its result.
+        :param url: the URL
+        :param func: a function without arguments fetching the URL
+        :param key: other values that must match for calls to be shared (e.g. the headers)
+        :return: the result of `func`, or a copy of it (see `copy_response`)
+        """
+        key = self._key(url, key)
+        if key is None:
+            return func()
+        with self.__lock:
+            self._stats['calls'] += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy_response(flight.result) if flight.result is not None else None
+
+        try:
+            flight.result = func()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self.__lock:
+                del self._flights[key]
+            flight.done.set()
+
+    async def async_do(self, url, func, *key):
+        """Async version of `do`: `func` returns an awaitable. Only calls from the same event loop are shared."""
+        key = self._key(url, key)
+        if key is None:
+            return await func()
+        loop = asyncio.get_event_loop()
+        with self.__lock:
+            self._stats['calls'] += 1
+        while True:
+            with self.__lock:
+                future = self._futures.get((loop, key))
+                leader = future is None
+                if leader:
+                    future = self._futures[(loop, key)] = loop.create_future()
+                    # the error is re-raised by the leader, even if no other call is waiting for it
+                    future.add_done_callback(lambda f: f.cancelled() or f.exception())
+                else:
+                    self._stats['coalesced'] += 1
+            if leader:
+                break
+            try:
+                result = await asyncio.shield(future)
+                return copy_response(result) if result is not None else None
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise  # this call was cancelled
+                # the leader was cancelled, not this call: try again (a waiting call becomes the new leader)
+                with self.__lock:
+                    self._stats['coalesced'] -= 1
+
+        try:
+            result = await func()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.__lock:
+                del self._futures[(loop, key)]
+
+    def stats(self) -> dict:
+        """:return: the number of `calls`, and how many of them were `coalesced` (shared another call's fetch)"""
+        with self.__lock:
+            return dict(self._stats)
@@ -0,0 +1,69 @@
+import asyncio
+import time
+
+import requests
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """Raised when the time budget of a call (see `Deadline`) ran out before anything could be returned."""
+
+
+class Deadline:
+
+    def __init__(self, budget):
+        """
+        A time budget shared by all the phases of a call (browser launch, waits, navigation, retries, fallback...):
+        each phase gets the time left, instead of a fresh timeout. Starts right away.
+
+        :param budget: the total time, in seconds
+        """
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+
+    def __repr__(self):
+        return f'Deadline({self.budget}s, {self.remaining():.2f}s left)'
+
+    def remaining(self, reserve=0.) -> float:
+        """
+        :param reserve: time (in seconds) to keep for the phases coming after this one
+        :return: the time left, in seconds (0 if the deadline passed)
+        """
+        return max(0., self.expires_at - time.monotonic() - reserve)
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def timeout(self, phase, reserve=0.) -> float:
+        """
+        :param phase: the name of the phase about to start, for the error message
+        :param reserve: see `remaining`
+        :return: the time left for the phase, in seconds
+        :raises DeadlineExceeded: if there is no time left
+        """
+        remaining = self.remaining(reserve)
+        if remaining <= 0:
+            raise DeadlineExceeded(f'deadline of {self.budget}s exceeded before {phase}')
+        return remaining
+
+    async def wait_for(self, awaitable, phase, reserve=0.):
+        """
+        Await, for at most the time left.
+        :param awaitable: what to await, cancelled if the deadline passes first
+        :param phase: see `timeout`
+        :param reserve: see `remaining`
+        :return: the result of the awaitable
+        :raises DeadlineExceeded: if the deadline passed first
+        """
+        try:
+            timeout = self.timeout(phase, reserve)
+        except DeadlineExceeded:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()  # never awaited
+            raise
+        try:
+            return await asyncio.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError:
+            if self.remaining(reserve) > 0:
+                raise  # the awaitable timed out by itself
+            raise DeadlineExceeded(f'deadline of {self.budget}s exceeded during {phase}') from None
@@ -1,67 +1,319 @@
+import asyncio
+import importlib.util
 import logging
 import os
 import threading
 
 from ._default import *
+from . import metrics
+from ._aio import bounded_as_completed
+from .deadline import Deadline
+from .async_http import async_default_get, async_close as _async_http_close
 
-__all__ = ['do_get', 'Modes', 'mode']
+__all__ = ['do_get', 'async_do_get', 'async_do_get_many', 'configure', 'Modes', 'mode']
+
+#: Default number of concurrent calls of async_do_get_many in DEFAULT mode (rendering modes use RENDER_CONCURRENCY)
+ASYNC_CONCURRENCY = 100
 
 logger = logging.getLogger(__name__)
 
-if os.getenv(ENV_VARIABLE, '0').lower().strip() in ['0', 'false', 'no', 'n', 'off']:
-    logger.info('using REQUESTS for scraping')
-    mode = Modes.DEFAULT
-    do_get = default_get
+_FALSE_VALUES = ['0', 'false', 'no', 'n', 'off']
 
 
-    def close():
-        pass
+def parse_mode(value) -> Modes:
+    """
+    :param value: a `Modes`, or the value of the environment variable `RENDER_HTML`:
+     `0` (or false, no, off) for DEFAULT, `2` for MULTI, `3` for POOL, `4` (or auto) for AUTO, anything else for MONO
+    :return: the corresponding mode
+    """
+    if isinstance(value, Modes):
+        return value
+    value = str(value).lower().strip()
+    if value in _FALSE_VALUES:
+        return Modes.DEFAULT
+    if value in ['4', 'auto']:
+        return Modes.AUTO
+    return {'2': Modes.RENDER_HTML_MULTI, '3': Modes.RENDER_HTML_POOL}.get(value, Modes.RENDER_HTML_MONO)
 
-else:
-    one_browser_per_thread = os.getenv(ENV_VARIABLE, '0') == '2'
-    logger.info(f'using JS_RENDERER for scraping ({"mono" if one_browser_per_thread else "multi"}-thread)')
 
-    # == import modules
+#: The current mode: the one of the environment variable, until `configure` is called
+mode = parse_mode(os.getenv(ENV_VARIABLE, '0'))
 
-    try:
-        import pyppeteer
-        import asyncio
-    except ModuleNotFoundError:
-        print(f'Error: {ENV_VARIABLE} set but pyppeteer not found. Please, run pip install pyppeteer2')
-        exit(1)
+# the state of the current configuration. Renderers are created lazily, on first use
+_configured = False
+_RENDERER = {}  # thread name -> renderer. In MONO and AUTO modes, all threads share the same renderer
+_POOL = None  # the BrowserPool, in RENDER_HTML_POOL mode
+_AUTO = None  # the AutoGetter, in AUTO mode
+_pool_size = None
+_browser_endpoint = None  # the running browser to connect to, if any
+_render_concurrency = 1  # the number of pages rendered at the same time by the shared renderer
+# loop -> renderer: a browser can only be driven from the loop it was launched in
+_ASYNC_RENDERERS = {}
+_lock = threading.RLock()
 
-    # == define the actual do_get
 
-    from .html_renderer import HtmlRenderer
-    from collections import defaultdict
+def configure(mode=None, http_pool=None, http_cache=None, pool_size=None, browser=None,
+              render_concurrency=None, resource_cache=None) -> Modes:
+    """
+    Set up `do_get` and its variants. This is done automatically from the environment variables on first use,
+    but can be called explicitly (and again later) to change the configuration at runtime.
+    The renderers of the previous configuration are closed (the async ones are left to `async_close`).
+    Browsers are only launched on first use.
+
+    :param mode: the `Modes` to use, defaults to the environment variable `RENDER_HTML` (see `parse_mode`)
+    :param http_pool: True/False to turn keep-alive connection pooling on/off (see `enable_pooling`),
+     defaults to the environment variable `HTTP_POOL`. If None and the variable is not set, pooling is left as-is.
+    :param http_cache: the path of the HTTP cache to use (see `enable_cache`), False to turn it off,
+     defaults to the environment variable `HTTP_CACHE`. If None and the variable is not set, the cache is left as-is.
+    :param pool_size: the number of browsers in RENDER_HTML_POOL mode,
+     defaults to the environment variable `RENDER_HTML_POOL_SIZE`, then to `BROWSER_POOL_SIZE`
+    :param browser: the websocket endpoint (or DevTools URL) of a running browser to render in, instead of launching
+     browsers (see `get_html.launcher`), defaults to the environment variable `RENDER_HTML_BROWSER`
+    :param render_concurrency: in RENDER_HTML_MONO and AUTO modes, the number of pages the renderer shared by all
+     threads renders at the same time (see `HtmlRenderer`'s `loop_thread`), defaults to the environment variable
+     `RENDER_HTML_CONCURRENCY`, then to 1 (one page at a time). Can also be an `AdaptiveLimiter`.
+    :param resource_cache: the path of the cache of the resources loaded by the rendered pages (see
+     `enable_resource_cache`), shared by all the browsers, False to turn it off. Defaults to the environment variable
+     `RENDER_HTML_RESOURCE_CACHE`. If None and the variable is not set, the resource cache is left as-is.
+    :return: the new mode
+    :raises ImportError: if the mode needs pyppeteer, and it is not installed
+    """
+    global _configured, _pool_size, _browser_endpoint, _render_concurrency
+    new_mode = parse_mode(os.getenv(ENV_VARIABLE, '0') if mode is None else mode)
+    if new_mode != Modes.DEFAULT and importlib.util.find_spec('pyppeteer') is None:
+        raise ImportError(f'{ENV_VARIABLE} set but pyppeteer not found. Please, run pip install pyppeteer2')
+
+    with _lock:
+        close_all()
+        globals()['mode'] = new_mode  # the parameter shadows the global
+        _pool_size = pool_size or int(os.getenv(POOL_SIZE_ENV_VARIABLE, 0)) or None
+        _browser_endpoint = browser or os.getenv(BROWSER_ENV_VARIABLE) or None
+        _render_concurrency = render_concurrency or int(os.getenv(CONCURRENCY_ENV_VARIABLE, 0)) or 1
 
-    if one_browser_per_thread:
-        # each thread will create its own renderer instance
-        _RENDERER = defaultdict(lambda: HtmlRenderer())
-        mode = Modes.RENDER_HTML_MULTI
+        if http_pool is None and os.getenv(POOL_ENV_VARIABLE) is not None:
+            http_pool = os.getenv(POOL_ENV_VARIABLE).lower().strip() not in _FALSE_VALUES
+        if http_pool and pool_stats() is None:
+            logger.info('using pooled HTTP connections')
+            enable_pooling()
+        elif http_pool is False:
+            disable_pooling()
+
+        if http_cache is None:
+            http_cache = os.getenv(CACHE_ENV_VARIABLE)
+        if http_cache:
+            logger.info(f'using the HTTP cache {http_cache}')
+            enable_cache(http_cache)
+        elif http_cache is False:
+            disable_cache()
+
+        if resource_cache is None:
+            resource_cache = os.getenv(RESOURCE_CACHE_ENV_VARIABLE)
+        if resource_cache:
+            logger.info(f'using the resource cache {resource_cache}')
+            enable_resource_cache(resource_cache)
+        elif resource_cache is False:
+            disable_resource_cache()
+
+        _configured = True
+
+    if new_mode == Modes.DEFAULT:
+        logger.info('using REQUESTS for scraping')
+    elif new_mode == Modes.AUTO:
+        logger.info('using REQUESTS for scraping, JS_RENDERER only for pages needing JavaScript')
     else:
-        # create one renderer instance, shared by all threads
-        renderer = HtmlRenderer()
-        _RENDERER = defaultdict(lambda: renderer)
-        mode = Modes.RENDER_HTML_MONO
+        logger.info(f'using JS_RENDERER for scraping ({new_mode.name})')
+    return new_mode
+
+
+def close_all():
+    """Close the browsers of all the threads. They are launched again if `do_get` is called afterwards."""
+    global _POOL, _AUTO
+    with _lock:
+        renderers, pool = set(_RENDERER.values()), _POOL
+        _RENDERER.clear()
+        _POOL, _AUTO = None, None
+    for renderer in renderers:
+        renderer.close()
+    if pool is not None:
+        pool.close()
+
+
+def _ensure_configured():
+    if not _configured:
+        with _lock:
+            if not _configured:
+                configure()
+
+
+def _renderer():
+    # the renderer of the calling thread, created on first use
+    from .html_renderer import HtmlRenderer
+
+    name = threading.current_thread().name
+    renderer = _RENDERER.get(name)
+    if renderer is None:
+        with _lock:
+            if mode == Modes.RENDER_HTML_MULTI:
+                # each thread has its own renderer instance
+                renderer = HtmlRenderer(browser_ws_endpoint=_browser_endpoint)
+            else:
+                # one renderer instance, shared by all threads
+                renderer = next(iter(_RENDERER.values()), None) or HtmlRenderer(
+                    browser_ws_endpoint=_browser_endpoint,
+                    loop_thread=not isinstance(_render_concurrency, int) or _render_concurrency > 1,
+                    max_concurrency=_render_concurrency)
+            _RENDERER[name] = renderer
+    return renderer
+
+
+def _browser_pool():
+    # a fixed number of browsers, each call is routed to the least loaded one
+    global _POOL
+    if _POOL is None:
+        from .browser_pool import BrowserPool, BROWSER_POOL_SIZE
+        with _lock:
+            if _POOL is None:
+                _POOL = BrowserPool(_pool_size or BROWSER_POOL_SIZE, browser_ws_endpoint=_browser_endpoint)
+    return _POOL
+
+
+def _auto_getter():
+    # raw HTML first, pages needing JS are rendered using one renderer instance, shared by all threads
+    global _AUTO
+    if _AUTO is None:
+        from .auto import AutoGetter
+        with _lock:
+            if _AUTO is None:
+                _AUTO = AutoGetter(get=default_get, render=lambda url, **kw: _renderer().render(url, **kw),
+                                   async_get=async_default_get, async_render=_async_render)
+    return _AUTO
 
 
-    def do_get(url, headers=None, timeout=RENDER_TIMEOUT) -> requests.Response:
-        if headers is None:
-            headers = dict()
-        headers.setdefault('User-Agent', DEFAULT_USER_AGENT)
-        renderer = _RENDERER[threading.current_thread().name]
-        resp = renderer.render(url, timeout=timeout)
+def do_get(url, headers=None, timeout=RENDER_TIMEOUT) -> requests.Response:
+    """
+    Get the HTML of a URL, rendering it or not depending on the mode (see `configure`).
+    :param url: the URL
+    :param headers: the headers, when using requests (renders use the browser's)
+    :param timeout: the timeout, in seconds
+    :return: a `requests.Response`. With coalescing (see `enable_coalescing`), concurrent calls for the same URL
+     share one fetch, but each caller gets its own response object.
+    """
+    _ensure_configured()
+    flight = single_flight()
+    if flight is None:
+        return _do_get(url, headers, timeout)
+    return flight.do(url, lambda: _do_get(url, headers, timeout), 'do_get', mode, timeout,
+                     *sorted((headers or {}).items()))
 
-        return resp
 
+def _do_get(url, headers, timeout):
+    if mode == Modes.DEFAULT:
+        return default_get(url, headers=headers, timeout=timeout)
 
-    def close():
-        """
-        Close the browser assigned to the calling thread.
-        Note: in case multiple threads use the same browser, nothing will happen.
-        """
-        if mode == Modes.RENDER_HTML_MONO and len(_RENDERER) > 1:
-            pass
+    if headers is None:
+        headers = dict()
+    headers.setdefault('User-Agent', DEFAULT_USER_AGENT)
+    timer = metrics.PhaseTimer()
+    try:
+        if mode == Modes.AUTO:
+            resp = _auto_getter().get(url, headers=headers, timeout=timeout)
         else:
-            _RENDERER[threading.current_thread().name].close()
+            renderer = _browser_pool() if mode == Modes.RENDER_HTML_POOL else _renderer()
+            resp = renderer.render(url, timeout=timeout)
+    except Exception:
+        metrics.record('do_get', timer.finish(), 'error')
+        raise
+    # the phases are in resp.timings (and reported by default_get or HtmlRenderer): only report the total
+    metrics.record('do_get', timer.finish(), 'ok')
+    return resp
+
+
+def stats():
+    """:return: in AUTO mode, the statistics of the renders avoided (see `AutoGetter.stats`)"""
+    return _AUTO.stats() if mode == Modes.AUTO and _AUTO is not None else None
+
+
+def close():
+    """
+    Close the browser assigned to the calling thread.
+    Note: in case multiple threads use the same browser, nothing will happen.
+    In RENDER_HTML_POOL mode, all the browsers of the pool are closed (they are relaunched on next use).
+    """
+    if mode == Modes.RENDER_HTML_POOL:
+        if _POOL is not None:
+            _POOL.close()
+    elif mode in [Modes.RENDER_HTML_MONO, Modes.AUTO] and len(_RENDERER) > 1:
+        pass
+    else:
+        renderer = _RENDERER.get(threading.current_thread().name)
+        if renderer is not None:
+            renderer.close()
+
+
+async def async_do_get(url, headers=None, timeout=RENDER_TIMEOUT) -> requests.Response:
+    """
+    Async version of `do_get`. In DEFAULT mode, uses `async_default_get`. Otherwise, renders run directly
+    on the caller's loop, in tabs of one browser per loop (whatever the rendering mode).
+    """
+    _ensure_configured()
+    flight = single_flight()
+    if flight is None:
+        return await _async_do_get(url, headers, timeout)
+    return await flight.async_do(url, lambda: _async_do_get(url, headers, timeout), 'do_get', mode, timeout,
+                                 *sorted((headers or {}).items()))
+
+
+async def _async_do_get(url, headers, timeout):
+    if mode == Modes.DEFAULT:
+        return await async_default_get(url, headers=headers, timeout=timeout)
+    if headers is None:
+        headers = dict()
+    headers.setdefault('User-Agent', DEFAULT_USER_AGENT)
+    if mode == Modes.AUTO:
+        return await _auto_getter().async_get(url, headers=headers, timeout=timeout)
+    return await _async_render(url, timeout=timeout)
+
+
+async def _async_render(url, timeout=RENDER_TIMEOUT, **kwargs):
+    from .html_renderer import HtmlRenderer
+
+    loop = asyncio.get_event_loop()
+    renderer = _ASYNC_RENDERERS.get(loop)
+    if renderer is None:
+        renderer = _ASYNC_RENDERERS[loop] = HtmlRenderer(loop=loop, browser_ws_endpoint=_browser_endpoint)
+    deadline = Deadline(timeout)
+    resp = await renderer.async_render(url, deadline=deadline, **kwargs)
+    if resp is None:
+        # see HtmlRenderer.render
+        resp = await async_default_get(url, deadline=deadline)
+    return resp
+
+
+async def async_close():
+    """Close the browser and the connections of the running loop."""
+    renderer = _ASYNC_RENDERERS.pop(asyncio.get_event_loop(), None)
+    if renderer is not None:
+        await renderer.async_close()
+    await _async_http_close()
+
+
+async def async_do_get_many(urls, concurrency=None, **kwargs):
+    """
+    Call `async_do_get` on multiple URLs concurrently.
+    :param urls: an iterable of URLs, consumed lazily
+    :param concurrency: the maximum number of calls in flight, defaults to `ASYNC_CONCURRENCY` in DEFAULT mode
+     and `RENDER_CONCURRENCY` in the rendering modes
+    :param kwargs: passed to `async_do_get`
+    :return: an async generator of `(url, requests.Response or exception)` tuples, in completion order
+    """
+    from .html_renderer import RENDER_CONCURRENCY
+
+    _ensure_configured()
+    if concurrency is None:
+        concurrency = ASYNC_CONCURRENCY if mode == Modes.DEFAULT else RENDER_CONCURRENCY
+    results = bounded_as_completed(lambda url: async_do_get(url, **kwargs), urls, concurrency)
+    try:
+        async for result in results:
+            yield result
+    finally:
+        await results.aclose()
@@ -1,16 +1,81 @@
 import asyncio
 import datetime
+import inspect
 import logging
 import threading
+import time
 from contextlib import contextmanager
 from http.client import responses as http_client_responses
 
-import pyppeteer
 import requests
+from urllib.parse import urlsplit
 
 logger = logging.getLogger(__name__)
 
-from ._default import RENDER_TIMEOUT, GET_TIMEOUT, default_get
+from . import metrics
+from ._default import RENDER_TIMEOUT, GET_TIMEOUT, default_get, host_limiter, body_limits, circuit_breaker, \
+    retry_policy, single_flight, resource_cache
+from .resilience import is_transient
+from .deadline import Deadline, DeadlineExceeded
+from .limits import content_type_of
+from .page_pool import PagePool, PAGE_MAX_USES, DEFAULT_VIEWPORT
+from .blocking import BlockingPolicy, intercept_requests, continue_request
+from .resource_cache import ResourceCache
+from .readiness import Readiness, NetworkTracker, dom_quiet, SETTLE_QUIET, SETTLE_MAX_WAIT
+from .result import RenderResult
+from .recycling import RecyclePolicy, RSS_CHECK_INTERVAL, PROBE_TIMEOUT, process_tree_rss
+from ._aio import bounded_as_completed
+from .adaptive import AdaptiveLimiter
+
+# pyppeteer is slow to import: it is only imported once a renderer is created, see _import_pyppeteer
+pyppeteer = None
+
+
+def _import_pyppeteer():
+    global pyppeteer
+    if pyppeteer is None:
+        import pyppeteer as module
+        pyppeteer = module
+    return pyppeteer
+
+
+async def launch_browser(**kwargs):
+    """
+    Launch a browser with the options used by `HtmlRenderer`.
+    :param kwargs: additional options of `pyppeteer.launch` (e.g. `headless`, `args`)
+    :return: a pyppeteer `Browser`
+    """
+    return await _import_pyppeteer().launch(
+        # avoid exception "signal only works in main thread"
+        # see https://stackoverflow.com/a/54030151
+        handleSIGINT=False, handleSIGTERM=False, handleSIGHUP=False,
+        devtools=False,
+        # if not set, will freeze after ~12 requests
+        # see https://github.com/miyakogi/pyppeteer/issues/167#issuecomment-442389039
+        # note that another way to avoid too much output AND the bug is to change line 165 of
+        # pyppeteer's launcher.py:
+        #    options['stderr'] = subprocess.DEVNULL # vs subprocess.STDOUT
+        dumpio=True, logLevel='ERROR',
+        **kwargs)
+
+
+#: Default number of pages rendered at the same time by render_many
+RENDER_CONCURRENCY = 4
+#: Maximum time (in seconds) to wait for the renders in flight before recycling a browser
+DRAIN_TIMEOUT = 2 * RENDER_TIMEOUT
+#: How often (in seconds) to check whether the renders in flight are done when draining
+DRAIN_POLL_INTERVAL = 0.05
+#: Maximum time (in seconds) to close a browser properly when recycling it, before killing it
+CLOSE_TIMEOUT = 10
+#: Share of the time budget of a render kept to capture the page, so that a slow page still yields a partial result
+CAPTURE_RESERVE = 0.1
+#: Maximum time (in seconds) kept to capture the page (see CAPTURE_RESERVE)
+MAX_CAPTURE_RESERVE = 2
+
+
+def _capture_reserve(deadline):
+    # the time kept to capture the page, see CAPTURE_RESERVE
+    return min(MAX_CAPTURE_RESERVE, deadline.budget * CAPTURE_RESERVE)
 
 
 @contextmanager
@@ -31,105 +96,539 @@ def create_renderer(*args, **kwargs):
 
 class HtmlRenderer:
 
-    def __init__(self, loop=None, headless=True, ignoreHTTPSErrors=True, browser_args=['--no-sandbox']):
+    def __init__(self, loop=None, headless=True, ignoreHTTPSErrors=True, browser_args=['--no-sandbox'],
+                 page_pool_size=0, page_max_uses=PAGE_MAX_USES, page_pool_overflow=True, block=None,
+                 recycle=None, watchdog_interval=None, browser_ws_endpoint=None, ready=None, loop_thread=False,
+                 max_concurrency=RENDER_CONCURRENCY, resource_cache=None):
         """
         Create a JsRenderer, which manages one browser instance in headless mode.
         Important:
-        * for non-async methods, only one call will be processed at a time (threading.Lock);
+        * for non-async methods, only one call will be processed at a time (threading.Lock), unless `loop_thread`
+          is set;
         * do not forget to call `close` in order to properly shutdown the browser.
 
         :param loop: the asyncio loop to use. If None, a new loop will be created.
         :param headless: launch the browser in headless mode
         :param ignoreHTTPSErrors: turn off HTTPS certificates validation
         :param browser_args: additional arguments passed to the browser at launch
+        :param page_pool_size: if > 0, keep that many pages (tabs) open and reuse them across renders,
+         instead of opening and closing a page on each render
+        :param page_max_uses: with a page pool, replace a page by a fresh one after this many renders
+        :param page_pool_overflow: with a page pool, what to do when all pages are busy: if True, open a
+         temporary page, else wait for a page to be released
+        :param block: the default blocking policy of `async_render`, see its `block` parameter
+        :param recycle: when to replace the browser by a fresh one (e.g. after 500 pages): a `RecyclePolicy`,
+         or a dict of its arguments. Renders in flight are completed first.
+        :param watchdog_interval: if set, check every that many seconds from a background thread that the browser
+         is alive and responsive. A dead or hung browser is killed, and replaced before the next render.
+         The recycle policy is also checked, so that memory-hungry browsers are recycled while idle.
+        :param browser_ws_endpoint: connect to this running browser instead of launching one, e.g. one started by
+         `python -m get_html.launcher`. Either its websocket endpoint (`ws://127.0.0.1:<port>/devtools/browser/<id>`)
+         or its DevTools URL (`http://127.0.0.1:<port>`). Closing the renderer only disconnects from the browser,
+         and the renderer reconnects on the next render if the connection is lost.
+        :param ready: the default readiness of `async_render`, see its `ready` parameter
+        :param loop_thread: run the loop forever in a background thread, to which the non-async methods submit
+         their renders: threads sharing the renderer render in parallel (in tabs of the same browser) instead of
+         one at a time. The async methods must then not be awaited from another loop.
+        :param max_concurrency: with `loop_thread`, the maximum number of pages rendered at the same time by the
+         non-async methods. Other calls wait for a free slot (see the `lock` timing). Can also be an
+         `AdaptiveLimiter`, to adapt it to the latency, timeouts, CPU load and memory of the browser.
+        :param resource_cache: serve the static resources of the pages (scripts, stylesheets, fonts, images) from
+         this `ResourceCache` (or the cache file at this path), and store the ones downloaded. Defaults to the cache
+         shared by all renderers, if any (see `enable_resource_cache`).
         """
+        _import_pyppeteer()
         self.loop = loop or asyncio.new_event_loop()  # with new, the loop will be attached to the thread calling init
         self._browser_args = dict(headless=headless, ignoreHTTPSErrors=ignoreHTTPSErrors, args=browser_args)
+        self._ws_endpoint = browser_ws_endpoint
         self.__browser = None
         self.__lock = threading.Lock()
+        self.__launch_lock = None  # asyncio.Lock, created lazily on the loop
+        self._threaded, self._max_concurrency = loop_thread, max_concurrency if loop_thread else 1
+        self.__loop_thread = None  # with loop_thread, the thread running the loop (started on first use)
+        self.__slots = None  # asyncio.Semaphore limiting the non-async renders, created lazily on the loop
+        if isinstance(max_concurrency, AdaptiveLimiter):
+            self._adopt(max_concurrency)
+        self._page_pool = PagePool(page_pool_size, page_max_uses, page_pool_overflow) if page_pool_size > 0 else None
+        self._block = BlockingPolicy.get(block)
+        self._resource_cache = ResourceCache(resource_cache) if isinstance(resource_cache, str) else resource_cache
+        self._ready = Readiness.get(ready)
+        self._recycle = RecyclePolicy.get(recycle)
+        self._watchdog_interval = watchdog_interval
+        self.__watchdog = None  # (thread, stop event)
+        self.__recycle_due = None  # the reason why the browser must be recycled before the next render
+        self._in_flight, self._browser_pages, self._launched_at, self._rss_checked_at = 0, 0, 0., 0.
+        self._stats = dict(launches=0, recycles=0, restarts=0)
 
     @property
     async def async_browser(self):
         if self.__browser is None:
-            logger.debug('launching browser')
-            self.__browser = await pyppeteer.launch(
-                # avoid exception "signal only works in main thread"
-                # see https://stackoverflow.com/a/54030151
-                handleSIGINT=False, handleSIGTERM=False, handleSIGHUP=False,
-                devtools=False,
-                # if not set, will freeze after ~12 requests
-                # see https://github.com/miyakogi/pyppeteer/issues/167#issuecomment-442389039
-                # note that another way to avoid too much output AND the bug is to change line 165 of
-                # pyppeteer's launcher.py:
-                #    options['stderr'] = subprocess.DEVNULL # vs subprocess.STDOUT
-                dumpio=True, logLevel='ERROR',
-                **self._browser_args)
+            if self.__launch_lock is None:
+                self.__launch_lock = asyncio.Lock()
+            async with self.__launch_lock:  # concurrent tasks must not launch multiple browsers
+                if self.__browser is None:
+                    await self._launch()
         return self.__browser
 
+    async def _launch(self):
+        if self._ws_endpoint is None:
+            logger.debug('launching browser')
+            browser = await launch_browser(**self._browser_args)
+        else:
+            logger.debug(f'connecting to browser {self._ws_endpoint}')
+            key = 'browserURL' if self._ws_endpoint.startswith('http') else 'browserWSEndpoint'
+            browser = await pyppeteer.connect(**{key: self._ws_endpoint}, logLevel='ERROR',
+                                              ignoreHTTPSErrors=self._browser_args['ignoreHTTPSErrors'])
+        browser.on('disconnected', lambda: self._on_disconnected(browser))
+        self.__browser = browser
+        self._browser_pages, self._launched_at = 0, time.monotonic()
+        self._rss_checked_at = self._launched_at
+        self._stats['launches'] += 1
+        if self._watchdog_interval and (self.__watchdog is None or not self.__watchdog[0].is_alive()):
+            stop = threading.Event()
+            self.__watchdog = threading.Thread(target=self._watch, args=(stop,), daemon=True), stop
+            self.__watchdog[0].start()
+        if self._page_pool is not None:
+            await self._page_pool.fill(self.__browser)
+
+    # == recycling and health
+
+    def stats(self) -> dict:
+        """
+        :return: the number of `pages` rendered by the current browser, its `age` (seconds), the renders `in_flight`,
+         the number of browser `launches` (or connections), `recycles` (see `recycle`) and `restarts`
+         (dead, hung or disconnected browsers)
+        """
+        return dict(self._stats, pages=self._browser_pages, in_flight=self._in_flight,
+                    age=time.monotonic() - self._launched_at if self.__browser is not None else 0)
+
+    def _on_disconnected(self, browser):
+        # the connection to the browser was lost (crash, or shared browser stopped): replace it before the next render
+        if browser is self.__browser:
+            logger.warning('lost connection to the browser')
+            self._stats['restarts'] += 1
+            self.__recycle_due = 'disconnected'
+
+    def _browser_rss(self):
+        # the memory of the browser (and its children), None if unknown (not launched, or connected to)
+        browser = self.__browser
+        if browser is None or browser.process is None:
+            return None
+        return process_tree_rss(browser.process.pid)
+
+    def _adopt(self, limiter):
+        # let an adaptive limiter without memory probe watch the memory of this browser
+        if limiter.max_rss is not None and limiter.rss is None:
+            limiter.rss = self._browser_rss
+
+    def _recycle_reason(self, check_rss=False):
+        # check_rss: measure the memory even if it was measured less than RSS_CHECK_INTERVAL ago
+        browser = self.__browser
+        if browser is None or self._recycle is None:
+            return None
+        now, rss = time.monotonic(), None
+        if self._recycle.max_rss and browser.process is not None and \
+                (check_rss or now - self._rss_checked_at >= RSS_CHECK_INTERVAL):
+            self._rss_checked_at = now
+            rss = process_tree_rss(browser.process.pid)
+        return self._recycle.reason(self._browser_pages, now - self._launched_at, rss)
+
+    async def _checkout_browser(self, deadline):
+        # called at the start of each render: recycle the browser first if needed, then count the render in
+        if self.__recycle_due is None:
+            self.__recycle_due = self._recycle_reason()
+        if self.__recycle_due is not None:
+            # the drain and the launch go on if the deadline passes: the new browser is kept for the next renders
+            await deadline.wait_for(asyncio.shield(self._recycle_browser()), 'recycle')
+        browser = await self.async_browser
+        self._in_flight += 1  # no await since the browser check: a recycle cannot start in between
+        return browser
+
+    def _checkin_browser(self):
+        self._in_flight -= 1
+        self._browser_pages += 1
+
+    async def _recycle_browser(self):
+        if self.__launch_lock is None:
+            self.__launch_lock = asyncio.Lock()
+        async with self.__launch_lock:  # new renders wait here until the new browser is ready
+            reason = self.__recycle_due
+            if reason is None:
+                return  # already recycled by another task
+            logger.info(f'recycling browser: {reason}')
+            deadline = time.monotonic() + DRAIN_TIMEOUT
+            while self._in_flight > 0 and time.monotonic() < deadline:
+                await asyncio.sleep(DRAIN_POLL_INTERVAL)
+            if self._in_flight > 0:
+                logger.warning(f'recycling browser with {self._in_flight} renders still in flight')
+            browser = self.__browser
+            try:
+                await asyncio.wait_for(self._close_browser(), CLOSE_TIMEOUT)
+            except Exception as e:
+                logger.warning(f'could not close browser properly, killing it: {e}')
+                if browser is not None and browser.process is not None:
+                    browser.process.kill()
+                self.__browser = None
+            self.__recycle_due = None
+            self._stats['recycles'] += 1
+            await self._launch()
+
+    def _watch(self, stop):
+        # watchdog thread: it does not use the loop, which may be busy or not running at all
+        while not stop.wait(self._watchdog_interval):
+            browser = self.__browser
+            if browser is None or self.__recycle_due is not None:
+                continue
+            try:
+                problem = self._health_problem(browser)
+                if problem is not None:
+                    logger.warning(f'browser is {problem}, replacing it')
+                    if browser.process is not None and browser.process.poll() is None:
+                        browser.process.kill()
+                    self._stats['restarts'] += 1
+                    self.__recycle_due = problem
+                else:
+                    self.__recycle_due = self._recycle_reason(check_rss=True)
+            except Exception as e:
+                logger.warning(f'watchdog error: {e}')
+
+    @staticmethod
+    def _health_problem(browser):
+        # :return: None if the browser is healthy, else what is wrong
+        if browser.process is not None and browser.process.poll() is not None:
+            return 'dead'
+        try:
+            # the DevTools HTTP endpoint is served by the browser process, like the websocket
+            requests.get(f'http://{urlsplit(browser.wsEndpoint).netloc}/json/version', timeout=PROBE_TIMEOUT) \
+                .raise_for_status()
+        except requests.exceptions.RequestException:
+            return 'unresponsive'
+        return None
+
     @property
     def browser(self):
         if not hasattr(self, "_browser"):
-            self.__browser = self.loop.run_until_complete(self.async_browser)
+            self.__browser = self._run(self.async_browser)
         return self.__browser
 
-    async def async_render(self, url, timeout=RENDER_TIMEOUT, wait_until='networkidle0', manipulate_page_func=None,
-                           **kwargs):
+    # == running coroutines from non-async methods
+
+    def _run(self, coro, deadline=None):
+        # run a coroutine on the loop and wait for its result, from any thread
+        if not self._threaded:
+            if not self.__lock.acquire(timeout=-1 if deadline is None else deadline.remaining()):
+                coro.close()
+                raise DeadlineExceeded(f'deadline of {deadline.budget}s exceeded waiting for the lock')
+            try:
+                return self.loop.run_until_complete(coro)
+            finally:
+                self.__lock.release()
+        with self.__lock:
+            if self.__loop_thread is None:
+                self.__loop_thread = threading.Thread(target=self.loop.run_forever, name='HtmlRenderer-loop',
+                                                      daemon=True)
+                self.__loop_thread.start()
+        return asyncio.run_coroutine_threadsafe(self._await(coro), self.loop).result()
+
+    @staticmethod
+    async def _await(awaitable):
+        # run_coroutine_threadsafe only accepts coroutines (not e.g. async generators' __anext__)
+        return await awaitable
+
+    def _stop_loop_thread(self):
+        with self.__lock:
+            thread, self.__loop_thread = self.__loop_thread, None
+        if thread is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            thread.join()
+
+    async def async_render(self, url, timeout=RENDER_TIMEOUT, wait_until=None, manipulate_page_func=None,
+                           block=None, lean=False, ready=None, deadline=None, **kwargs):
         """
         Render a URL in a browser, then get the rendered HTML after JS DOM manipulation.
         :param url: the URL to render
-        :param timeout: maximum time, in seconds, before giving up
+        :param timeout: the time budget of the whole call, in seconds: launching the browser, waiting for the host
+         (see `enable_politeness`), navigating, retrying, manipulating and capturing the page all draw from it.
+         If it runs out once the page was received, the page is captured as is, else `DeadlineExceeded` is raised.
+         A navigation which times out before the page was received returns None.
         :param wait_until: see
-        [`puppeteer.Page.goto`'s waitUntil](https://pptr.dev/#?product=Puppeteer&version=v2.1.1&show=api-pagegotourl-options)
+        [`puppeteer.Page.goto`'s waitUntil](https://pptr.dev/#?product=Puppeteer&version=v2.1.1&show=api-pagegotourl-options).
+         Defaults to `networkidle0`, or to `domcontentloaded` when `ready` is set. If the page does not get there
+         before the timeout, the content loaded so far is captured (the page is not loaded again).
         :param manipulate_page_func: an async function taking page as a parameter,
          if you need to do something such as scroll or evaluate a custom JS before getting content.
+         The content is captured once the DOM stopped changing (see `SETTLE_QUIET`). If the function has a `deadline`
+         argument, it gets the `Deadline` of the call (e.g. `deadline.remaining()`). It is cancelled when the time
+         is up (minus the time kept to capture the page, see `CAPTURE_RESERVE`), and the page is captured as is.
+        :param block: requests the page is not allowed to make (e.g. images), either a `BlockingPolicy`
+         or the name of a preset (`"dom-only"`, `"no-media"`). Defaults to the policy passed to the constructor,
+         use `False` to disable it for this call.
+        :param lean: return a lightweight `RenderResult` instead of a `requests.Response`. It holds the HTML only
+         once (as text) and skips the conversion of the redirects, which matters for large DOMs.
+        :param ready: when the page is ready to be captured, after `wait_until`: a `Readiness` (CSS selector,
+         JS predicate, DOM quiet, network idle, with a hard cap), a dict of its arguments, or a CSS selector.
+         Defaults to the readiness passed to the constructor.
+        :param deadline: a `Deadline` to draw from instead of `timeout`, e.g. shared with what the caller did before
         :param kwargs: additional arguments passed to pyppeteer's Page.goto method
         :return: a `requests.Response`, with `content` set to the rendered raw HTML. The other fields should match
-        the usual `Response`, except `cookies` which will always be `None`.
+        the usual `Response`, except `cookies` which will always be `None`. When requests are blocked, the response
+        has an additional `blocking` attribute with the blocking statistics (see `BlockingPolicy.install`), and with
+        a resource cache, a `resource_cache` attribute with the cache statistics of the page (see `ResourceCache.attach`).
+        With body limits (see `enable_body_limits`), the response is also marked with `rejected` and `truncated`
+        attributes. Main documents which are not allowed are not downloaded further, and not rendered.
+        With retries (see `enable_retries`), transient failures (timeouts, connection errors, 5xx) are rendered again,
+        and with a circuit breaker (see `enable_circuit_breaker`), hosts which keep failing raise `CircuitOpenError`.
+        The response also has a `timings` attribute: the time (in seconds) spent in each phase of the last attempt
+        (`launch`, `wait`, `new_page`, `viewport`, `block`, `goto`, `ready`, `manipulate`, `settle`, `content`,
+        `create_response`, `release` and `total`). The phases are also reported to the metrics hooks, see `add_metrics_hook`.
+        With coalescing (see `enable_coalescing`), concurrent renders of the same URL with the same arguments
+        share one render.
         """
-        page, browser = None, None
+        args = (url, deadline or Deadline(timeout), wait_until, manipulate_page_func, block, lean, ready)
+        flight = single_flight()
+        if flight is None:
+            return await self._render_with_retries(*args, **kwargs)
+        # the renderer is part of the key: renderers may differ in their defaults (block, ready, resource cache...)
+        return await flight.async_do(url, lambda: self._render_with_retries(*args, **kwargs), id(self), timeout,
+                                     *args[2:], *sorted(kwargs.items()))
+
+    async def _render_with_retries(self, url, deadline, wait_until, manipulate_page_func, block, lean, ready,
+                                   **kwargs):
+        breaker, retry, attempt = circuit_breaker(), retry_policy(), 0
+        while True:
+            if breaker is not None:
+                breaker.check(url)
+            try:
+                resp = await self._render_once(url, deadline, wait_until, manipulate_page_func, block, lean, ready,
+                                               **kwargs)
+            except Exception as e:
+                if breaker is not None and not isinstance(e, DeadlineExceeded):
+                    breaker.record(url, failure=is_transient(e))
+                delay = self._retry_delay(retry, attempt, deadline, error=e)
+                if delay is None:
+                    if isinstance(e, pyppeteer.errors.TimeoutError):
+                        logger.warning(f'{url}: timeout error (final).')
+                        return None
+                    raise
+            else:
+                if breaker is not None and resp is not None:
+                    breaker.record(url, failure=False)
+                delay = None if resp is None else self._retry_delay(retry, attempt, deadline, status=resp.status_code)
+                if delay is None:
+                    return resp
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    @staticmethod
+    def _retry_delay(retry, attempt, deadline, **outcome):
+        # the time to wait before the next attempt, None to give up (no retries, or no time left for another attempt)
+        return None if retry is None else retry.next_delay(attempt, deadline, _capture_reserve(deadline), **outcome)
+
+    async def _render_once(self, url, deadline, wait_until, manipulate_page_func, block, lean, ready, **kwargs):
+        policy = self._block if block is None else BlockingPolicy.get(block or None)
+        ready = self._ready if ready is None else Readiness.get(ready)
+        if wait_until is None:
+            wait_until = 'networkidle0' if ready is None else 'domcontentloaded'
+        blocking, caching, limiter, response = None, None, None, None
+        page, browser, failed = None, None, True
+        limits, rejected = body_limits(), []
+        timer, resp, outcome = metrics.PhaseTimer(), None, 'error'
+        cut_short = False  # True if the page was captured before it was ready
+        create = self._create_result if lean else self._create_response
+        # navigation and manipulations are cut short before the deadline, to keep time to capture the page
+        reserve = _capture_reserve(deadline)
         logger.debug(f'{url}: starting async render')
 
         try:
-            browser = await self.async_browser
+            # a launch is not cancelled when the deadline passes: the browser is kept for the next renders
+            await deadline.wait_for(asyncio.shield(self.async_browser), 'launch')
+            browser = await self._checkout_browser(deadline)
+            timer.mark('launch')
+            if host_limiter() is not None:
+                slot = host_limiter()
+                await deadline.wait_for(slot.async_acquire(url), 'wait')
+                limiter = slot  # only set once acquired, so it is released only if acquired
+                timer.mark('wait')
             start = datetime.datetime.now()
-            page = await browser.newPage()
-            # Make the page a bit bigger (height especially useful for sites like twitter)
-            await page.setViewport({'height': 1000, 'width': 1200})
+            page = await self._acquire_page(browser, timer, deadline)
+            cache = self._resource_cache or resource_cache()
+            caching, handler = cache.attach(page) if cache is not None else (None, continue_request)
+            if policy is not None:
+                blocking = await policy.install(page, handler)
+                timer.mark('block')
+            elif cache is not None:
+                await intercept_requests(page, handler)
+            documents = []  # the responses of the main document, to capture the page if the navigation times out
+            page.on('response', lambda r: self._check_document(page, r, limits, rejected, documents))
+            network = NetworkTracker(page) if ready is not None and ready.network_idle is not None else None
             try:
                 # Load the given page (GET request, obviously.)
-                response = await page.goto(url, timeout=timeout * 1000, waitUntil=wait_until, **kwargs)
+                response = await page.goto(url, timeout=deadline.timeout('goto', reserve) * 1000, waitUntil=wait_until,
+                                           **kwargs)
             except pyppeteer.errors.TimeoutError:
-                logger.info(f'{url}: timeout error on {wait_until}. Trying domcontentloaded...')
-                # Try again if the navigation failed, only waiting for dom this time
-                response = await page.goto(url, timeout=timeout * 1000, waitUntil='domcontentloaded', **kwargs)
+                if rejected or not documents:
+                    raise
+                # the page never got to wait_until (long-polling, beacons...): capture what is loaded so far
+                logger.info(f'{url}: timeout error on {wait_until}, capturing the content loaded so far')
+                await page._client.send('Page.stopLoading')
+                response, ready, cut_short = documents[-1], None, True
+            except pyppeteer.errors.PageError:
+                if not rejected:
+                    raise
+                # the navigation was stopped by _check_document
+            timer.mark('goto')
+
+            if ready is not None and response is not None and not rejected:
+                max_wait = deadline.remaining(reserve)
+                if max_wait <= 0 or not await ready.wait(page, network, max_wait):
+                    logger.info(f'{url}: not ready in time, capturing the page as is')
+                    cut_short = True
+                timer.mark('ready')
+
+            if rejected:
+                reason, response = rejected[0]
+                logger.info(f'{url}: rejected ({reason})')
+                failed, outcome = False, 'rejected'
+                resp = create(response, '', datetime.datetime.now() - start)
+                resp.rejected, resp.truncated = reason, None
+                return resp
 
             if response is None:
                 # shouldn't happen, but ... see https://github.com/miyakogi/pyppeteer/issues/299
                 logger.warning(f'{url}: response is None !')
+                failed, outcome = False, 'no_response'
                 return None
 
             if manipulate_page_func is not None:
-                await manipulate_page_func(page)
-                await asyncio.sleep(0.2)  # ensure the changes have time to be "applied" (e.g. scroll)
+                try:
+                    await deadline.wait_for(self._manipulate(manipulate_page_func, page, deadline), 'manipulate',
+                                            reserve)
+                except DeadlineExceeded:
+                    logger.info(f'{url}: out of time while manipulating the page, capturing it as is')
+                    cut_short = True
+                timer.mark('manipulate')
+                # ensure the changes have been "applied" (e.g. content loaded on scroll)
+                if deadline.remaining(reserve) > 0:
+                    await self._settle(page, min(SETTLE_MAX_WAIT, deadline.remaining(reserve)))
+                    timer.mark('settle')
 
             # Return the content of the page, JavaScript evaluated.
-            content = await page.content()
+            content = await deadline.wait_for(page.content(), 'content')
+            timer.mark('content')
+            # the page can safely go back to the pool
+            failed, outcome = False, 'wait_timeout' if cut_short else 'ok'
             logger.debug(f'{url}: status={response.status}')
-            return self._create_response(response, content, datetime.datetime.now() - start)
+            truncated = None
+            # a character is at most 4 bytes in UTF-8: only encode the content if it may be too large
+            if limits is not None and limits.max_bytes is not None and len(content) * 4 > limits.max_bytes:
+                encoded = content.encode('utf-8')
+                if len(encoded) > limits.max_bytes:
+                    content, truncated = encoded[:limits.max_bytes], 'max_bytes'
+            resp = create(response, content, datetime.datetime.now() - start)
+            timer.mark('create_response')
+            if blocking is not None:
+                resp.blocking = blocking
+            if caching is not None:
+                resp.resource_cache = caching
+            if limits is not None:
+                resp.rejected, resp.truncated = None, truncated
+            return resp
 
         except pyppeteer.errors.TimeoutError:
-            logger.warning(f'{url}: timeout error (final).')
-            return None
+            outcome = 'timeout'
+            raise
+        except DeadlineExceeded:
+            outcome = 'deadline'
+            raise
         except pyppeteer.errors.NetworkError as e:
-            if browser and browser.process.poll() is not None:
+            if browser and browser.process is not None and browser.process.poll() is not None:
                 logger.warning(f'{url}: browser process is dead. Restarting')
                 # the chromium process was killed...
                 # close the browser so it is recreated on next call
-                await self.async_close()
+                await self._close_browser()
             raise e
         finally:
+            if limiter is not None:
+                limiter.release(url, *((response.status, response.headers) if response is not None else ()))
             if page:  # avoid leaking pages !!
-                await page.close()
+                await self._release_page(page, discard=failed)
+                timer.mark('release')
+            if browser is not None:
+                self._checkin_browser()
+            # resp is returned as-is, so the timings dict can still be completed here
+            timings = timer.finish()
+            if resp is not None:
+                resp.timings = timings
+            metrics.record('render', timings, outcome)
+
+    @staticmethod
+    def _manipulate(manipulate_page_func, page, deadline):
+        try:
+            parameters = inspect.signature(manipulate_page_func).parameters
+        except (TypeError, ValueError):  # e.g. some builtins
+            parameters = {}
+        if 'deadline' in parameters:
+            return manipulate_page_func(page, deadline=deadline)
+        return manipulate_page_func(page)
+
+    @staticmethod
+    async def _settle(page, max_wait=SETTLE_MAX_WAIT):
+        try:
+            await dom_quiet(page, SETTLE_QUIET, max_wait)
+        except pyppeteer.errors.NetworkError:
+            # the page navigated (e.g. a click on a link): give the new page a moment
+            await asyncio.sleep(SETTLE_QUIET)
+
+    @staticmethod
+    def _check_document(page, response, limits, rejected, documents):
+        # called on each response of the page: keep track of the main document, stop loading it if it is not allowed
+        request = response.request
+        if rejected or not request.isNavigationRequest() or request.frame is not page.mainFrame \
+                or 300 <= response.status < 400:
+            return
+        documents.append(response)
+        if limits is None:
+            return
+        content_type = content_type_of(response.headers)
+        content_length = response.headers.get('content-length', '')
+        if not limits.allows(content_type):
+            rejected.append((f'content-type: {content_type}', response))
+        elif limits.max_bytes is not None and content_length.isdigit() and int(content_length) > limits.max_bytes:
+            rejected.append((f'content-length: {content_length}', response))
+        else:
+            return
+        asyncio.ensure_future(page._client.send('Page.stopLoading'))
+
+    async def _acquire_page(self, browser, timer, deadline):
+        acquiring = asyncio.ensure_future(self._new_page(browser, timer))
+        try:
+            # shielded: a page created (or checked out of the pool) after the deadline is given back, not lost
+            return await deadline.wait_for(asyncio.shield(acquiring), 'new_page')
+        except BaseException:
+            acquiring.add_done_callback(self._give_back_page)
+            raise
+
+    async def _new_page(self, browser, timer):
+        if self._page_pool is not None:
+            page = await self._page_pool.acquire(browser)
+            timer.mark('new_page')
+            return page
+        page = await browser.newPage()
+        timer.mark('new_page')
+        # Make the page a bit bigger (height especially useful for sites like twitter)
+        await page.setViewport(DEFAULT_VIEWPORT)
+        timer.mark('viewport')
+        return page
+
+    def _give_back_page(self, acquiring):
+        if not acquiring.cancelled() and acquiring.exception() is None:
+            asyncio.ensure_future(self._release_page(acquiring.result()))
+
+    async def _release_page(self, page, discard=False):
+        if self._page_pool is not None:
+            await self._page_pool.release(page, discard=discard)
+        else:
+            await page.close()
 
     def render(self, url, **kwargs):
         """
@@ -138,24 +637,163 @@ class HtmlRenderer:
         :param kwargs: see `async_render`
         :return: a `requests.Response`, with the content reflecting the HTML after the rendering.
         """
-        with self.__lock:
-            response = self.loop.run_until_complete(self.async_render(url=url, **kwargs))
+        flight = single_flight()
+        if flight is None:
+            return self._render(url, kwargs)
+        # coalesce before waiting for the lock: threads waiting for the same URL need not render it again
+        return flight.do(url, lambda: self._render(url, kwargs), 'render', id(self), *sorted(kwargs.items()))
+
+    def _render(self, url, kwargs):
+        # the deadline starts before waiting for the lock (or a slot), and the fallback draws from it too
+        deadline = kwargs.get('deadline') or Deadline(kwargs.get('timeout', RENDER_TIMEOUT))
+        kwargs = dict(kwargs, deadline=deadline)
+        response = self._run(self._render_in_slot(url, kwargs, time.perf_counter()), deadline)
+        if response is None:
+            # May happen on incorrect gzip encoding ... see https://github.com/miyakogi/pyppeteer/issues/299
+            # Since I am not sure it is always the reason, back to requests which provides good
+            # exception messages, such as:
+            #    (Received response with content-encoding: gzip, but failed to decode it.',
+            #     error('Error -3 while decompressing data: incorrect header check'))
+            # This runs in the calling thread: the loop (and the other threads) need not wait for it.
+            return self._fallback(url, kwargs)
+        return response
+
+    async def _render_in_slot(self, url, kwargs, start):
+        deadline = kwargs['deadline']
+        if isinstance(self._max_concurrency, AdaptiveLimiter):
+            await deadline.wait_for(self._max_concurrency.async_acquire(), 'lock')
+            waited = time.perf_counter() - start
+            response = await self._render_adaptive(self._max_concurrency, url, kwargs)
+        else:
+            if self.__slots is None:
+                self.__slots = asyncio.Semaphore(self._max_concurrency)
+            await deadline.wait_for(self.__slots.acquire(), 'lock')
+            try:
+                waited = time.perf_counter() - start
+                response = await self.async_render(url=url, **kwargs)
+            finally:
+                self.__slots.release()
+        if response is not None:
+            # time spent waiting for other threads (not part of the total of async_render)
+            response.timings['lock'] = waited
+        return response
+
+    async def _render_adaptive(self, limiter, url, kwargs):
+        # render in the slot acquired from the limiter, then release it with the latency (no response: a timeout)
+        start, latency, timeout = time.perf_counter(), None, False
+        try:
+            response = await self.async_render(url=url, **kwargs)
+            latency, timeout = time.perf_counter() - start, response is None
+            return response
+        except Exception as e:
+            # the failures the limiter must back off on (other errors are not counted)
+            timeout = isinstance(e, DeadlineExceeded) or is_transient(e)
+            raise
+        finally:
+            limiter.release(latency, timeout)
+
+    def render_text(self, url, **kwargs) -> str:
+        """
+        Like `render`, but only return the rendered HTML. Cheaper than `render(url).text` for large pages.
+        :param url: the URL
+        :param kwargs: see `async_render`
+        :return: the HTML, as text
+        """
+        return self.render(url, lean=True, **kwargs).text
+
+    def render_bytes(self, url, **kwargs) -> bytes:
+        """Like `render_text`, but return the HTML encoded in UTF-8 (or as received, for fallbacks)."""
+        return self.render(url, lean=True, **kwargs).content
+
+    async def async_render_text(self, url, **kwargs):
+        """Async version of `render_text`. Like `async_render`, return None if the page could not be rendered."""
+        resp = await self.async_render(url, lean=True, **kwargs)
+        return resp.text if resp is not None else None
+
+    async def async_render_bytes(self, url, **kwargs):
+        """Async version of `render_bytes`. Like `async_render`, return None if the page could not be rendered."""
+        resp = await self.async_render(url, lean=True, **kwargs)
+        return resp.content if resp is not None else None
+
+    @staticmethod
+    def _fallback(url, kwargs):
+        # get the page without rendering it, as a RenderResult when a lean result was requested
+        resp = default_get(url, headers=None, timeout=kwargs.get('timeout', GET_TIMEOUT),
+                           deadline=kwargs.get('deadline'))
+        return RenderResult.from_response(resp) if kwargs.get('lean') else resp
+
+    async def async_render_many(self, urls, concurrency=RENDER_CONCURRENCY, **kwargs):
+        """
+        Render multiple URLs concurrently, in tabs of the same browser.
+        URLs are consumed lazily, so `urls` can be a generator of any size.
+        Like `render`, renders returning no response fall back to `default_get` (run in an executor).
+        :param urls: an iterable of URLs
+        :param concurrency: the maximum number of renders in flight, or an `AdaptiveLimiter`
+        :param kwargs: see `async_render`
+        :return: an async generator of `(url, requests.Response or exception)` tuples, in completion order
+        """
+        # launch the browser once, before the tasks
+        await self.async_browser
+
+        limiter = concurrency if isinstance(concurrency, AdaptiveLimiter) else None
+        if limiter is not None:
+            # up to max_limit tasks, the ones above the current limit wait for a slot
+            self._adopt(limiter)
+            concurrency = limiter.max_limit
+
+        async def _render(url):
+            if limiter is not None:
+                await limiter.async_acquire()
+            # each URL has its own deadline, which starts when its render does (not when the batch does)
+            url_kwargs = dict(kwargs, deadline=Deadline(kwargs.get('timeout', RENDER_TIMEOUT)))
+            if limiter is None:
+                response = await self.async_render(url, **url_kwargs)
+            else:
+                response = await self._render_adaptive(limiter, url, url_kwargs)
             if response is None:
-                # May happen on incorrect gzip encoding ... see https://github.com/miyakogi/pyppeteer/issues/299
-                # Since I am not sure it is always the reason, back to requests which provides good
-                # exception messages, such as:
-                #    (Received response with content-encoding: gzip, but failed to decode it.',
-                #     error('Error -3 while decompressing data: incorrect header check'))
-                return default_get(url, headers=None, timeout=kwargs.get('timeout', GET_TIMEOUT))
+                response = await asyncio.get_event_loop().run_in_executor(None, self._fallback, url, url_kwargs)
             return response
 
+        results = bounded_as_completed(_render, urls, concurrency)
+        try:
+            async for result in results:
+                yield result
+        finally:
+            await results.aclose()
+
+    def render_many(self, urls, concurrency=RENDER_CONCURRENCY, **kwargs):
+        """
+        Sync version of `async_render_many`. Results are streamed as they complete.
+        The lock is only held while the loop runs, so other threads may call `render` between two results
+        (or at the same time, with `loop_thread`).
+        Usage:
+        >>> for url, result in renderer.render_many(urls, concurrency=8):
+        >>>     if isinstance(result, Exception):
+        >>>         # handle error
+        :param urls: an iterable of URLs
+        :param concurrency: the maximum number of renders in flight, or an `AdaptiveLimiter`
+        :param kwargs: see `async_render`
+        :return: a generator of `(url, requests.Response or exception)` tuples, in completion order
+        """
+        results = self.async_render_many(urls, concurrency=concurrency, **kwargs)
+        try:
+            while True:
+                try:
+                    result = self._run(results.__anext__())
+                except StopAsyncIteration:
+                    return
+                yield result
+        finally:
+            self._run(results.aclose())
+
     def _create_response(self, response, content, elapsed=None, with_history=True):
         # Create requests.Response and try to make the fields match what you would expect when using
         # requests directly. The only attributes not updated are: cookies
         resp = requests.Response()
-        # url and content
+        # url and content (str, or bytes if truncated)
         resp.url = response.url
-        resp._content, resp.encoding = content.encode('utf-8'), 'utf-8'
+        resp._content = content.encode('utf-8') if isinstance(content, str) else content
+        resp.encoding = 'utf-8'
         # headers
         resp.headers.update(response.headers)
         # status
@@ -170,16 +808,37 @@ class HtmlRenderer:
         resp.elapsed = elapsed if elapsed is not None else datetime.timedelta(0)
         return resp
 
+    @staticmethod
+    def _create_result(response, content, elapsed=None):
+        # the lean version of _create_response: keep the content as-is (str, or bytes if truncated)
+        text, data = (content, None) if isinstance(content, str) else (None, content)
+        redirects = [(req.response.url, req.response.status, dict(req.response.headers))
+                     for req in response.request.redirectChain]
+        return RenderResult(response.url, response.status, dict(response.headers), text=text, content=data,
+                            elapsed=elapsed, redirects=redirects)
+
     async def async_close(self):
-        if self.__browser is not None:
+        """Close the browser instance, if any, and stop the watchdog."""
+        if self.__watchdog is not None:
+            self.__watchdog[1].set()
+            self.__watchdog = None
+        await self._close_browser()
+
+    async def _close_browser(self):
+        browser, self.__browser = self.__browser, None  # unset first: the disconnection is expected
+        if browser is not None:
             logger.debug('closing browser')
-            await self.__browser.close()
-        self.__browser = None
+            if self._page_pool is not None:
+                await self._page_pool.close()
+            if self._ws_endpoint is None:
+                await browser.close()
+            else:
+                await browser.disconnect()  # do not kill a browser shared with other processes
 
     def close(self):
         """
-        Close the browser instance, if any.
+        Close the browser instance, if any, and stop the watchdog (and the loop thread, with `loop_thread`).
         :return:
         """
-        with self.__lock:
-            self.loop.run_until_complete(self.async_close())
+        self._run(self.async_close())
+        self._stop_loop_thread()
@@ -0,0 +1,253 @@
+import email.utils
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+#: Default maximum size of the cache, in bytes (bodies only)
+CACHE_MAX_SIZE = 1024 ** 3
+#: Do not update the last access time of an entry more often than that (in seconds), to limit writes
+ACCESS_RESOLUTION = 60
+#: How long (in seconds) to wait for the lock of the database when it is used by other processes
+DB_TIMEOUT = 30
+
+# headers of a 304 which describe the (empty) 304 body, not the stored one
+_BODY_HEADERS = ['Content-Length', 'Content-Encoding', 'Transfer-Encoding', 'Content-Type']
+# headers describing the transfer, not the (decoded) body stored, or which must not be replayed
+_TRANSFER_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection', 'keep-alive',
+                     'set-cookie'}
+
+_MAX_AGE_RE = re.compile(r'(?:^|,)\s*max-age\s*=\s*"?(\d+)"?', re.IGNORECASE)
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS responses (
+    url TEXT PRIMARY KEY, final_url TEXT, history TEXT,
+    status INTEGER, reason TEXT, headers TEXT, encoding TEXT, content BLOB,
+    vary TEXT, expires_at REAL, accessed_at REAL, size INTEGER
+);
+CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses(accessed_at);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER);
+INSERT OR IGNORE INTO meta VALUES ('total_size', 0);
+'''
+
+
+def _replayable(headers) -> dict:
+    return {k: v for k, v in headers.items() if k.lower() not in _TRANSFER_HEADERS}
+
+
+def _parse_date(value):
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+class CachedEntry:
+    """A response stored in the cache, with the final URL and the redirects (`(url, status, reason, headers)`)."""
+
+    def __init__(self, url, final_url, history, status, reason, headers, encoding, content, vary, expires_at):
+        self.url, self.final_url, self.history = url, final_url, json.loads(history)
+        self.status, self.reason, self.encoding, self.content = status, reason, encoding, content
+        self.headers = CaseInsensitiveDict(json.loads(headers))
+        self.vary = json.loads(vary)
+        self.expires_at = expires_at
+
+    @property
+    def fresh(self) -> bool:
+        return self.expires_at > time.time()
+
+    def matches(self, headers) -> bool:
+        """:return: True if the request headers match the ones the response varies on"""
+        headers = CaseInsensitiveDict(headers or {})
+        return all(headers.get(name) == value for name, value in self.vary.items())
+
+    def validators(self) -> dict:
+        """:return: the headers of a conditional request revalidating this entry"""
+        validators = dict()
+        if 'ETag' in self.headers:
+            validators['If-None-Match'] = self.headers['ETag']
+        if 'Last-Modified' in self.headers:
+            validators['If-Modified-Since'] = self.headers['Last-Modified']
+        return validators
+
+    def to_response(self) -> requests.Response:
+        resp = self._response(self.final_url, self.status, self.reason, self.headers)
+        resp._content, resp.encoding = self.content, self.encoding
+        resp.history = [self._response(*redirect) for redirect in self.history]
+        resp.from_cache = True
+        return resp
+
+    @staticmethod
+    def _response(url, status, reason, headers):
+        resp = requests.Response()
+        resp.url, resp.status_code, resp.reason = url, status, reason
+        resp.headers = CaseInsensitiveDict(headers)
+        resp._content = b''
+        return resp
+
+
+class HttpCache:
+
+    def __init__(self, path, max_size=CACHE_MAX_SIZE):
+        """
+        A persistent HTTP cache stored in a SQLite database, with a size limit and LRU eviction.
+        Responses are stored according to their `Cache-Control`/`Expires` headers, and stale responses
+        are revalidated using `If-None-Match`/`If-Modified-Since` when possible.
+        It can be shared by multiple threads (one connection per thread) and multiple processes on the same host.
+
+        :param path: the path of the database file, created if it does not exist
+        :param max_size: the maximum size of all the stored bodies, in bytes
+        """
+        self.path, self.max_size = path, max_size
+        self._local = threading.local()
+        self._stats = dict(hits=0, revalidated=0, misses=0, stored=0, evicted=0)
+        self.__lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db.executescript(_SCHEMA)
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            # isolation_level=None: transactions are handled explicitly
+            db = sqlite3.connect(self.path, timeout=DB_TIMEOUT, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')  # readers do not block writers (and vice versa)
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+        return db
+
+    def get(self, url, headers, fetch) -> requests.Response:
+        """
+        Get a response from the cache, or from the network if it is missing or stale.
+        :param url: the URL
+        :param headers: the request headers (not modified)
+        :param fetch: a function taking the request headers and returning a `requests.Response`, with its content read
+        :return: a `requests.Response`. Responses served from the cache have a `from_cache` attribute set to True.
+        """
+        entry = self.lookup(url, headers)
+        if entry is not None and entry.fresh:
+            self._count('hits')
+            return entry.to_response()
+
+        validators = entry.validators() if entry is not None else {}
+        resp = fetch(dict(headers, **validators) if validators else headers)
+
+        if resp.status_code == 304 and entry is not None:
+            self._count('revalidated')
+            # update the stored headers (e.g. new expiration date) with the ones of the 304
+            entry.headers.update((k, v) for k, v in resp.headers.items() if k.title() not in _BODY_HEADERS)
+            self._store(url, entry.status, entry.reason, entry.headers, entry.encoding, entry.content, headers,
+                        entry.final_url, entry.history)
+            cached = entry.to_response()
+            cached.elapsed = resp.elapsed
+            return cached
+
+        self._count('misses')
+        if resp.status_code == 200 and not getattr(resp, 'truncated', None) and not getattr(resp, 'rejected', None):
+            self._store(url, resp.status_code, resp.reason, resp.headers, resp.encoding, resp.content, headers,
+                        resp.url, [(r.url, r.status_code, r.reason, _replayable(r.headers)) for r in resp.history])
+        return resp
+
+    def lookup(self, url, headers=None):
+        """:return: the `CachedEntry` of the url, fresh or not, or None"""
+        row = self._db.execute(
+            'SELECT url, final_url, history, status, reason, headers, encoding, content, vary, expires_at, accessed_at '
+            'FROM responses WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            return None
+        entry = CachedEntry(*row[:-1])
+        if not entry.matches(headers):
+            return None
+        now = time.time()
+        if now - row[-1] > ACCESS_RESOLUTION:
+            self._db.execute('UPDATE responses SET accessed_at = ? WHERE url = ?', (now, url))
+        return entry
+
+    def _store(self, url, status, reason, headers, encoding, content, request_headers, final_url, history):
+        cache_control = headers.get('Cache-Control', '').lower()
+        if 'no-store' in cache_control or headers.get('Vary') == '*':
+            return
+        expires_at = self._expires_at(headers, cache_control)
+        if expires_at is None and not ('ETag' in headers or 'Last-Modified' in headers):
+            return  # can never be served from the cache
+        request_headers = CaseInsensitiveDict(request_headers or {})
+        vary = {name.strip(): request_headers.get(name.strip())
+                for name in headers.get('Vary', '').split(',') if name.strip()}
+
+        now, size = time.time(), len(content)
+        if size > self.max_size:
+            return
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            old = db.execute('SELECT size FROM responses WHERE url = ?', (url,)).fetchone()
+            db.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', (
+                url, final_url, json.dumps(history), status, reason, json.dumps(_replayable(headers)), encoding,
+                content, json.dumps(vary), expires_at or 0, now, size))
+            total = self._update_total_size(size - (old[0] if old else 0))
+            if total > self.max_size:
+                self._evict(total - self.max_size)
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        self._count('stored')
+
+    def _update_total_size(self, delta):
+        db = self._db
+        db.execute("UPDATE meta SET value = value + ? WHERE key = 'total_size'", (delta,))
+        return db.execute("SELECT value FROM meta WHERE key = 'total_size'").fetchone()[0]
+
+    def _evict(self, excess):
+        # remove the least recently used entries, until enough space is freed
+        db, freed, urls = self._db, 0, []
+        for url, size in db.execute('SELECT url, size FROM responses ORDER BY accessed_at'):
+            if freed >= excess:
+                break
+            urls.append(url)
+            freed += size
+        db.executemany('DELETE FROM responses WHERE url = ?', [(u,) for u in urls])
+        db.execute("UPDATE meta SET value = value - ? WHERE key = 'total_size'", (freed,))
+        self._count('evicted', len(urls))
+
+    @staticmethod
+    def _expires_at(headers, cache_control):
+        if 'no-cache' in cache_control:
+            return 0  # store, but always revalidate
+        date = _parse_date(headers.get('Date')) or time.time()
+        match = _MAX_AGE_RE.search(cache_control)
+        if match:
+            return date + int(match.group(1))
+        if 'Expires' in headers:
+            return _parse_date(headers['Expires']) or 0  # invalid dates mean "already expired"
+        return None
+
+    def stats(self) -> dict:
+        """
+        :return: the number of `hits` (fresh responses served from the cache), `revalidated` (stale responses
+         confirmed by a 304), `misses`, `stored` and `evicted` responses of this instance, as well as the current
+         `size` of the cache (shared by all processes)
+        """
+        size = self._db.execute("SELECT value FROM meta WHERE key = 'total_size'").fetchone()[0]
+        with self.__lock:
+            return dict(self._stats, size=size)
+
+    def _count(self, key, n=1):
+        with self.__lock:
+            self._stats[key] += n
+
+    def close(self):
+        """Close the connection of the calling thread (the others are closed when their thread ends)."""
+        db = getattr(self._local, 'db', None)
+        if db is not None:
+            db.close()
+            self._local.db = None
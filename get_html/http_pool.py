@@ -0,0 +1,115 @@
+import threading
+import weakref
+
+import requests
+from requests.adapters import HTTPAdapter
+
+#: Number of hosts for which a pool of keep-alive connections is cached
+POOL_CONNECTIONS = 100
+#: Maximum number of keep-alive connections kept per host
+POOL_MAXSIZE = 10
+#: Retries on connection errors (an int or an `urllib3.util.Retry`)
+POOL_RETRIES = 0
+
+
+class _CountingAdapter(HTTPAdapter):
+    # HTTPAdapter remembering the statistics of the connection pools it discards (LRU eviction or close),
+    # so that the counts reported by SessionPool.stats are not lost along the way
+
+    def __init__(self, *args, **kwargs):
+        self._evicted = dict(requests=0, connections=0)
+        self._evicted_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        pools = self.poolmanager.pools
+        dispose = pools.dispose_func
+
+        def _dispose(pool):
+            self._record(pool)
+            if dispose is not None:
+                dispose(pool)
+
+        pools.dispose_func = _dispose
+
+    def _record(self, pool):
+        with self._evicted_lock:
+            self._evicted['requests'] += pool.num_requests
+            self._evicted['connections'] += pool.num_connections
+
+    def counts(self):
+        with self._evicted_lock:
+            counts = dict(self._evicted)
+        pools = self.poolmanager.pools
+        with pools.lock:  # no public way to iterate without touching the LRU order
+            live = list(pools._container.values())
+        for pool in live:
+            counts['requests'] += pool.num_requests
+            counts['connections'] += pool.num_connections
+        return counts
+
+
+class SessionPool:
+
+    def __init__(self, pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=POOL_RETRIES,
+                 pool_block=False, keep_cookies=False):
+        """
+        Keep-alive HTTP connections shared by all threads.
+        Each thread gets its own `requests.Session` (sessions are not thread-safe), but all sessions are
+        mounted on the same `HTTPAdapter`, so connections opened by one thread are reused by the others.
+
+        :param pool_connections: number of hosts for which a connection pool is cached
+        :param pool_maxsize: maximum number of keep-alive connections per host
+        :param max_retries: retries on connection errors, either an int or an `urllib3.util.Retry`
+        :param pool_block: if True, wait for a free connection instead of opening one beyond `pool_maxsize`
+        :param keep_cookies: if False (default), cookies are dropped after each request, as with `requests.get`
+        """
+        self._adapter = _CountingAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                         max_retries=max_retries, pool_block=pool_block)
+        self._keep_cookies = keep_cookies
+        self._local = threading.local()
+        # weak: the session of a thread is collected with the thread (thread-per-request servers...)
+        self._sessions = weakref.WeakSet()
+        self.__lock = threading.Lock()
+
+    @property
+    def session(self) -> requests.Session:
+        """The `requests.Session` of the calling thread."""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.mount('http://', self._adapter)
+            session.mount('https://', self._adapter)
+            self._local.session = session
+            with self.__lock:
+                self._sessions.add(session)
+        return session
+
+    def get(self, url, **kwargs) -> requests.Response:
+        """Same as `requests.get`, but reusing pooled connections."""
+        session = self.session
+        try:
+            return session.get(url, **kwargs)
+        finally:
+            if not self._keep_cookies:
+                session.cookies.clear()
+
+    def stats(self) -> dict:
+        """
+        Connection reuse statistics since the creation of the pool.
+        :return: a dict with `requests` (requests sent), `misses` (new connections opened)
+         and `hits` (requests sent on an already opened connection)
+        """
+        counts = self._adapter.counts()
+        return dict(requests=counts['requests'], misses=counts['connections'],
+                    hits=max(counts['requests'] - counts['connections'], 0))
+
+    def close(self):
+        """Close all the sessions and the underlying connections."""
+        with self.__lock:
+            sessions, self._sessions = list(self._sessions), weakref.WeakSet()
+        for session in sessions:
+            # closing the session also closes the shared adapter, which is fine at this point
+            session.close()
+        self._adapter.close()
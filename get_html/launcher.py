@@ -0,0 +1,74 @@
+"""
+Launch a long-lived headless browser and publish its DevTools websocket endpoint, so that multiple processes
+(workers, CLI runs, ...) can render in the same warm browser instead of each launching their own.
+
+Usage:
+> python -m get_html.launcher --endpoint-file /tmp/browser.ws
+> RENDER_HTML=1 RENDER_HTML_BROWSER=$(cat /tmp/browser.ws) python -m get_html urls.txt
+
+The browser runs until the launcher is stopped (SIGINT/SIGTERM) or the browser dies.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import sys
+
+from .html_renderer import launch_browser
+
+logger = logging.getLogger(__name__)
+
+
+def _publish(endpoint, endpoint_file):
+    # write then rename, so readers never see a partial endpoint
+    tmp = f'{endpoint_file}.tmp'
+    with open(tmp, 'w') as f:
+        f.write(endpoint + '\n')
+    os.replace(tmp, endpoint_file)
+
+
+async def serve(endpoint_file=None, **browser_args):
+    """
+    Launch a browser and keep it running until SIGINT/SIGTERM or until the browser disconnects.
+    :param endpoint_file: if set, write the websocket endpoint to this file (removed on exit)
+    :param browser_args: passed to `launch_browser`
+    """
+    loop = asyncio.get_event_loop()
+    stop = asyncio.Event()
+    browser = await launch_browser(**browser_args)
+    browser.on('disconnected', stop.set)
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    print(browser.wsEndpoint, flush=True)
+    if endpoint_file:
+        _publish(browser.wsEndpoint, endpoint_file)
+    try:
+        await stop.wait()
+    finally:
+        if endpoint_file and os.path.exists(endpoint_file):
+            os.remove(endpoint_file)
+        logger.info('closing browser')
+        await browser.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--endpoint-file', help='write the websocket endpoint to this file')
+    parser.add_argument('--user-data-dir', help='profile directory: persists the disk cache across restarts')
+    parser.add_argument('--no-headless', action='store_true', help='show the browser window')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    browser_args = dict(headless=not args.no_headless, ignoreHTTPSErrors=True, args=['--no-sandbox'])
+    if args.user_data_dir:
+        browser_args['userDataDir'] = args.user_data_dir
+    try:
+        asyncio.get_event_loop().run_until_complete(serve(args.endpoint_file, **browser_args))
+    except KeyboardInterrupt:
+        sys.exit(130)
+
+
+if __name__ == '__main__':
+    main()
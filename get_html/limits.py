@@ -0,0 +1,70 @@
+import time
+
+#: Content types of HTML pages, a sensible allowlist for BodyLimits
+HTML_CONTENT_TYPES = ['text/html', 'application/xhtml+xml']
+#: Size of the chunks read when streaming a body. The duration limit is checked between chunks.
+CHUNK_SIZE = 16 * 1024
+
+
+def content_type_of(headers) -> str:
+    """
+    :param headers: a case-insensitive dict (requests), or a dict with lower-cased keys (pyppeteer)
+    :return: the lower-cased media type of the Content-Type header, without parameters (may be empty)
+    """
+    return headers.get('content-type', '').split(';')[0].strip().lower()
+
+
+class BodyLimits:
+
+    def __init__(self, max_bytes=None, content_types=None, max_duration=None):
+        """
+        Limits applied when reading a response body.
+        Responses are marked with two attributes:
+        * `rejected`: None, or the reason why the body was not read at all (e.g. `"content-type: application/pdf"`);
+        * `truncated`: None, or the reason why only the beginning of the body was read (`"max_bytes"` or `"deadline"`).
+
+        :param max_bytes: maximum size of the (decoded) body, in bytes
+        :param content_types: if set, the allowed content types (e.g. `HTML_CONTENT_TYPES`).
+         A trailing `*` matches any subtype, e.g. `text/*`. Responses without Content-Type are allowed.
+        :param max_duration: maximum time (in seconds) spent reading the body, on top of the socket timeout
+        """
+        self.max_bytes, self.max_duration = max_bytes, max_duration
+        self.content_types = [t.lower() for t in content_types] if content_types is not None else None
+
+    def allows(self, content_type) -> bool:
+        """:return: True if the content type is allowed (or unknown)"""
+        if not self.content_types or not content_type:
+            return True
+        return any(content_type == t or t.endswith('*') and content_type.startswith(t[:-1])
+                   for t in self.content_types)
+
+    def read(self, resp):
+        """
+        Read the body of a streamed `requests.Response`, checking the content type from the headers first.
+        The content is available as usual with `resp.content` and `resp.text` afterwards.
+        """
+        resp.rejected, resp.truncated = None, None
+        content_type = content_type_of(resp.headers)
+        if not self.allows(content_type):
+            resp.rejected = f'content-type: {content_type}'
+            resp._content, resp._content_consumed = b'', True
+            resp.close()
+            return
+
+        deadline = time.monotonic() + self.max_duration if self.max_duration is not None else None
+        chunks, size = [], 0
+        for chunk in resp.iter_content(CHUNK_SIZE):
+            chunks.append(chunk)
+            size += len(chunk)
+            if self.max_bytes is not None and size > self.max_bytes:
+                resp.truncated = 'max_bytes'
+                break
+            if deadline is not None and time.monotonic() > deadline:
+                resp.truncated = 'deadline'
+                break
+
+        content = b''.join(chunks)
+        resp._content = content[:self.max_bytes] if resp.truncated == 'max_bytes' else content
+        resp._content_consumed = True
+        if resp.truncated:
+            resp.close()  # do not leave a half-read connection in the pool
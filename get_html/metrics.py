@@ -0,0 +1,124 @@
+import bisect
+import threading
+import time
+
+#: Upper bounds (in seconds) of the buckets of MetricsRegistry's histograms
+HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# the installed hooks: when empty, nothing is reported
+_hooks = []
+
+
+def add_hook(hook):
+    """
+    Install a metrics hook. Hooks are called from the threads (and loops) doing the work, so they must be fast
+    and thread-safe.
+    :param hook: a callable taking `(kind, name, value)`, where kind is `"counter"` (value is an increment)
+     or `"histogram"` (value is an observation, e.g. a duration in seconds). A `MetricsRegistry` is a valid hook.
+    :return: the hook
+    """
+    if hook not in _hooks:
+        _hooks.append(hook)
+    return hook
+
+
+def remove_hook(hook):
+    """Uninstall a metrics hook (no-op if it is not installed)."""
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+def record(source, timings, outcome):
+    """
+    Report one call to the hooks: one histogram `<source>.<phase>` per phase and a counter `<source>.<outcome>`.
+    Does nothing if no hook is installed.
+    :param source: what was called, e.g. `"default_get"` or `"render"`
+    :param timings: the phase timings of the call, see `PhaseTimer`
+    :param outcome: e.g. `"ok"` or `"error"`
+    """
+    if not _hooks:
+        return
+    for hook in list(_hooks):
+        for phase, seconds in timings.items():
+            hook('histogram', f'{source}.{phase}', seconds)
+        hook('counter', f'{source}.{outcome}', 1)
+
+
+class PhaseTimer:
+
+    def __init__(self):
+        """
+        Measure the time spent in consecutive phases of a call: `mark(phase)` closes the current phase.
+        Phases marked more than once are summed up.
+        """
+        self.timings = {}
+        self._start = self._last = time.perf_counter()
+
+    def mark(self, phase):
+        """End the current phase, and start the next one."""
+        now = time.perf_counter()
+        self.timings[phase] = self.timings.get(phase, 0.) + now - self._last
+        self._last = now
+
+    def finish(self) -> dict:
+        """:return: the timings (in seconds) of each phase, in order, plus the `total` time since the creation"""
+        self.timings['total'] = time.perf_counter() - self._start
+        return self.timings
+
+
+class _Histogram:
+
+    def __init__(self):
+        self.count, self.sum, self.min, self.max = 0, 0., None, None
+        self.buckets = [0] * (len(HISTOGRAM_BUCKETS) + 1)  # the last one is +inf
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.buckets[bisect.bisect_left(HISTOGRAM_BUCKETS, value)] += 1
+
+    def to_dict(self):
+        return dict(count=self.count, sum=self.sum, mean=self.sum / self.count if self.count else None,
+                    min=self.min, max=self.max,
+                    buckets=dict(zip([str(b) for b in HISTOGRAM_BUCKETS] + ['inf'], self.buckets)))
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        """
+        A minimal in-memory metrics hook, with counters and histograms.
+        Usage:
+        >>> registry = add_metrics_hook(MetricsRegistry())
+        >>> # ... calls to default_get, render, do_get
+        >>> registry.stats()['histograms']['render.goto']['mean']
+        """
+        self._counters, self._histograms = {}, {}
+        self.__lock = threading.Lock()
+
+    def __call__(self, kind, name, value):
+        with self.__lock:
+            if kind == 'counter':
+                self._counters[name] = self._counters.get(name, 0) + value
+            elif kind == 'histogram':
+                histogram = self._histograms.get(name)
+                if histogram is None:
+                    histogram = self._histograms[name] = _Histogram()
+                histogram.observe(value)
+
+    def stats(self) -> dict:
+        """
+        :return: a dict with `counters` (name -> value) and `histograms` (name -> count, sum, mean, min, max and
+         the number of observations per bucket, see `HISTOGRAM_BUCKETS`)
+        """
+        with self.__lock:
+            return dict(counters=dict(self._counters),
+                        histograms={name: h.to_dict() for name, h in self._histograms.items()})
+
+    def reset(self):
+        """Forget all the metrics recorded so far."""
+        with self.__lock:
+            self._counters.clear()
+            self._histograms.clear()
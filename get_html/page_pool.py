@@ -0,0 +1,143 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+#: Default number of pages (tabs) kept open in a PagePool
+PAGE_POOL_SIZE = 4
+#: Default number of renders after which a pooled page is closed and replaced by a fresh one
+PAGE_MAX_USES = 50
+#: Viewport of the pages. The height is especially useful for sites like twitter.
+DEFAULT_VIEWPORT = {'height': 1000, 'width': 1200}
+#: Timeout (in seconds) when resetting a page before putting it back into the pool
+RESET_TIMEOUT = 5
+
+
+class PagePool:
+
+    def __init__(self, size=PAGE_POOL_SIZE, max_uses=PAGE_MAX_USES, overflow=True, viewport=None):
+        """
+        A bounded pool of pre-configured browser pages, reused across renders.
+        Pages are reset (blank page, no listeners, no request interception) before returning to the pool,
+        and replaced after `max_uses` renders.
+        Note: this class is not thread-safe, it must be used from the event loop of the browser.
+
+        :param size: the number of pages kept in the pool
+        :param max_uses: recycle a page after this many renders (0 means never)
+        :param overflow: if True, create temporary pages when the pool is exhausted, else wait for a free one
+        :param viewport: the viewport to set on every page, defaults to `DEFAULT_VIEWPORT`
+        """
+        self.size = size
+        self.max_uses = max_uses
+        self.overflow = overflow
+        self.viewport = viewport or DEFAULT_VIEWPORT
+        self._idle = []  # pages ready to be checked out
+        self._uses = {}  # page -> number of renders, for all pooled pages (idle or checked out)
+        self._pending = 0  # pooled pages being created
+        self._condition = None  # created lazily, to bind to the running loop
+
+    @property
+    def _available(self):
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    @property
+    def _total(self):
+        return len(self._uses) + self._pending
+
+    def stats(self) -> dict:
+        """:return: the number of `idle` and `busy` pooled pages (overflow pages are not counted)"""
+        return dict(idle=len(self._idle), busy=len(self._uses) - len(self._idle))
+
+    async def fill(self, browser):
+        """Pre-create pages so that the pool is full."""
+        while self._total < self.size:
+            page = await self._new_page(browser)
+            self._uses[page] = 0
+            self._idle.append(page)
+
+    async def acquire(self, browser):
+        """
+        Check out a page. If the pool is exhausted, either create an overflow page (closed on release)
+        or wait for a page to be released, depending on `overflow`.
+        """
+        async with self._available:
+            while not self._idle and self._total >= self.size and not self.overflow:
+                await self._available.wait()
+            if self._idle:
+                return self._idle.pop()
+            pooled = self._total < self.size
+            if pooled:
+                self._pending += 1  # reserve the slot while the page is being created
+        try:
+            page = await self._new_page(browser)
+        finally:
+            if pooled:
+                async with self._available:
+                    self._pending -= 1
+                    self._available.notify()
+        if pooled:
+            self._uses[page] = 0
+        return page
+
+    async def release(self, page, discard=False):
+        """
+        Return a page to the pool.
+        :param page: a page obtained with `acquire`
+        :param discard: if True, close the page instead of reusing it (e.g. after an error)
+        """
+        if page not in self._uses:
+            # overflow page
+            await self._close_page(page)
+            return
+
+        self._uses[page] += 1
+        if discard or page.isClosed() or (self.max_uses and self._uses[page] >= self.max_uses):
+            await self._close_page(page)
+            await self._forget(page)
+            return
+
+        try:
+            await asyncio.wait_for(self._reset(page), RESET_TIMEOUT)
+        except Exception as e:
+            logger.debug(f'could not reset page, closing it: {e}')
+            await self._close_page(page)
+            await self._forget(page)
+            return
+
+        async with self._available:
+            self._idle.append(page)
+            self._available.notify()
+
+    async def close(self):
+        """Close all the pages, idle or not. The pool can be reused afterwards."""
+        pages, self._idle, self._uses = list(self._uses), [], {}
+        for page in pages:
+            await self._close_page(page)
+
+    async def _forget(self, page):
+        async with self._available:
+            self._uses.pop(page, None)
+            self._available.notify()
+
+    async def _new_page(self, browser):
+        page = await browser.newPage()
+        await page.setViewport(self.viewport)
+        return page
+
+    async def _reset(self, page):
+        # drop handlers that may have been installed during the render (e.g. by manipulate_page_func)
+        page.remove_all_listeners()
+        await page.setRequestInterception(False)
+        if page.viewport != self.viewport:
+            await page.setViewport(self.viewport)
+        await page.goto('about:blank')
+
+    @staticmethod
+    async def _close_page(page):
+        try:
+            if not page.isClosed():
+                await page.close()
+        except Exception as e:
+            logger.debug(f'error closing page: {e}')
@@ -0,0 +1,262 @@
+import asyncio
+import email.utils
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+import requests
+
+from .deadline import DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+#: Default maximum number of requests in flight per host
+MAX_PER_HOST = 2
+#: Default back-off (in seconds) after a 429/503 without a (valid) Retry-After header
+DEFAULT_BACKOFF = 5
+#: Maximum back-off (in seconds), whatever the Retry-After or Crawl-delay says
+MAX_BACKOFF = 300
+#: How often (in seconds) to check again when waiting for a free slot
+POLL_INTERVAL = 0.05
+#: Timeout (in seconds) when fetching robots.txt
+ROBOTS_TIMEOUT = 10
+#: Default number of hosts tracked before the idle ones are forgotten
+MAX_HOSTS = 10000
+
+
+def host_of(url) -> str:
+    """:return: the key used to group requests: the lower-cased host and port of the url"""
+    return urlsplit(url).netloc.lower()
+
+
+def _parse_retry_after(value):
+    # either a number of seconds or an HTTP date
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        try:
+            return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0)
+        except (TypeError, ValueError, IndexError):
+            return None
+
+
+class _HostState:
+
+    def __init__(self, tokens):
+        self.in_flight = 0
+        self.next_start = 0.  # no request may start before that time (min delay, Retry-After)
+        self.tokens, self.refilled_at = tokens, time.monotonic()
+        self.crawl_delay = None  # None = robots.txt not fetched (yet)
+
+
+class HostLimiter:
+
+    def __init__(self, max_per_host=MAX_PER_HOST, min_delay=0., rate=None, burst=1,
+                 respect_retry_after=True, crawl_delay=False, user_agent='*', max_hosts=MAX_HOSTS):
+        """
+        Per-host politeness limits, shared by threads and asyncio tasks.
+        Requests to different hosts never wait for each other.
+
+        :param max_per_host: maximum number of requests in flight for a given host
+        :param min_delay: minimum delay (in seconds) between the start of two requests to the same host
+        :param rate: if set, the maximum number of requests per second per host (token bucket)
+        :param burst: with `rate`, the number of requests that can be sent at once (bucket capacity)
+        :param respect_retry_after: after a 429 or 503, wait for the `Retry-After` delay before contacting the host again
+        :param crawl_delay: fetch each host's robots.txt, and use its `Crawl-delay` as minimum delay if larger
+        :param user_agent: the user agent used to read `Crawl-delay` from the robots.txt
+        :param max_hosts: beyond that many hosts, forget the idle ones (nothing in flight, nothing to wait for),
+         so that memory does not grow with the number of hosts of a broad crawl. Their robots.txt is read again
+         if they come back.
+        """
+        self.max_per_host, self.min_delay = max_per_host, min_delay
+        self.rate, self.burst = rate, burst
+        self.respect_retry_after, self.crawl_delay, self.user_agent = respect_retry_after, crawl_delay, user_agent
+        self.max_hosts = max_hosts
+        self._hosts = {}
+        self._prune_at = max_hosts  # number of hosts triggering the next pruning
+        self._stats = dict(acquired=0, waited=0., backoffs=0, forgotten=0)
+        self.__lock = threading.Lock()
+        self.__released = threading.Condition(self.__lock)
+
+    # == acquiring and releasing slots
+
+    def delay(self, url):
+        """
+        :return: the time (in seconds) before a request to the url's host could start, 0 if it can start now,
+         or None if all the slots of the host are busy
+        """
+        with self.__lock:
+            return self._delay(self._state(host_of(url)), time.monotonic())
+
+    def try_acquire(self, url) -> bool:
+        """Take a slot for the url's host if one is available right now. Call `release` once the request is done."""
+        host = host_of(url)
+        self._ensure_crawl_delay(host, url)
+        with self.__lock:
+            return self._try_acquire(self._state(host))
+
+    def acquire(self, url, deadline=None):
+        """
+        Wait for a slot for the url's host. Call `release` once the request is done.
+        :param deadline: a `Deadline` bounding the wait
+        :raises DeadlineExceeded: if the wait would outlast the deadline (raised as soon as it is known)
+        """
+        host = host_of(url)
+        self._ensure_crawl_delay(host, url)
+        start = time.monotonic()
+        with self.__lock:
+            # the state is looked up again after each wait: the host may have been forgotten in the meantime
+            while not self._try_acquire(self._state(host)):
+                # when waiting for another request to finish (delay None), release will wake us up
+                delay = self._delay(self._state(host), time.monotonic())
+                self.__released.wait(self._bounded(delay, deadline, host))
+            self._stats['waited'] += time.monotonic() - start
+
+    async def async_acquire(self, url, deadline=None):
+        """Async version of `acquire`: other tasks keep running while waiting."""
+        host = host_of(url)
+        if self._needs_crawl_delay(host):
+            await asyncio.get_event_loop().run_in_executor(None, self._ensure_crawl_delay, host, url)
+        start = time.monotonic()
+        while True:
+            with self.__lock:
+                state = self._state(host)
+                if self._try_acquire(state):
+                    self._stats['waited'] += time.monotonic() - start
+                    return
+                delay = self._delay(state, time.monotonic())
+                wait = self._bounded(delay, deadline, host)
+            await asyncio.sleep(POLL_INTERVAL if delay is None else wait)
+
+    def release(self, url, status=None, headers=None):
+        """
+        Give back a slot taken for the url's host.
+        :param url: the URL
+        :param status: the status code of the response, if any, used to honor `Retry-After` on 429/503
+        :param headers: the headers of the response, if any
+        """
+        with self.__lock:
+            state = self._state(host_of(url))
+            state.in_flight -= 1
+            if self.respect_retry_after and status in [429, 503]:
+                retry_after = _parse_retry_after((headers or {}).get('Retry-After'))
+                if retry_after is None and status == 429:
+                    retry_after = DEFAULT_BACKOFF
+                if retry_after is not None:
+                    logger.info(f'{host_of(url)}: {status}, backing off for {retry_after:.1f}s')
+                    state.next_start = max(state.next_start, time.monotonic() + min(retry_after, MAX_BACKOFF))
+                    self._stats['backoffs'] += 1
+            self.__released.notify_all()
+
+    @contextmanager
+    def limit(self, url, deadline=None):
+        """
+        Context manager acquiring and releasing a slot. Set `.response` on the yielded object to honor Retry-After.
+        Usage:
+        >>> with limiter.limit(url) as slot:
+        >>>     slot.response = requests.get(url)
+        :param deadline: see `acquire`
+        """
+        slot = _Slot()
+        self.acquire(url, deadline)
+        try:
+            yield slot
+        finally:
+            resp = slot.response
+            self.release(url, *((resp.status_code, resp.headers) if resp is not None else ()))
+
+    def stats(self) -> dict:
+        """
+        :return: the number of slots `acquired`, the total time `waited` (seconds), the number of `backoffs`,
+         of `hosts` tracked and of idle hosts `forgotten`, and the requests `in_flight`
+        """
+        with self.__lock:
+            return dict(self._stats, hosts=len(self._hosts), in_flight=sum(s.in_flight for s in self._hosts.values()))
+
+    # == internals (called with the lock held)
+
+    def _state(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            if len(self._hosts) >= self._prune_at:
+                self._prune(time.monotonic())
+            state = self._hosts[host] = _HostState(self.burst)
+        return state
+
+    def _prune(self, now):
+        # forget the hosts in the same state as a new one: no request in flight, no delay or back-off pending
+        for host, state in list(self._hosts.items()):
+            self._refill(state, now)
+            if state.in_flight == 0 and state.next_start <= now and (not self.rate or state.tokens >= self.burst):
+                del self._hosts[host]
+                self._stats['forgotten'] += 1
+        # the busy hosts are not scanned again before the number of hosts doubles
+        self._prune_at = max(self.max_hosts, 2 * len(self._hosts))
+
+    def _refill(self, state, now):
+        if self.rate:
+            state.tokens = min(self.burst, state.tokens + (now - state.refilled_at) * self.rate)
+            state.refilled_at = now
+
+    def _delay(self, state, now):
+        if state.in_flight >= self.max_per_host:
+            return None  # unknown: wait for a release
+        self._refill(state, now)
+        delay = state.next_start - now
+        if self.rate and state.tokens < 1:
+            delay = max(delay, (1 - state.tokens) / self.rate)
+        return max(delay, 0)
+
+    @staticmethod
+    def _bounded(delay, deadline, host):
+        # the time to wait (None: until a release), bounded by the deadline
+        if deadline is None:
+            return delay
+        remaining = deadline.remaining()
+        if remaining <= 0 or (delay is not None and delay >= remaining):
+            raise DeadlineExceeded(f'deadline of {deadline.budget}s exceeded waiting for {host}')
+        return remaining if delay is None else delay
+
+    def _try_acquire(self, state):
+        now = time.monotonic()
+        if self._delay(state, now) != 0:
+            return False
+        state.in_flight += 1
+        if self.rate:
+            state.tokens -= 1
+        state.next_start = now + max(self.min_delay, state.crawl_delay or 0)
+        self._stats['acquired'] += 1
+        return True
+
+    # == robots.txt
+
+    def _needs_crawl_delay(self, host):
+        if not self.crawl_delay:
+            return False
+        with self.__lock:
+            return self._state(host).crawl_delay is None
+
+    def _ensure_crawl_delay(self, host, url):
+        if not self._needs_crawl_delay(host):
+            return
+        parts = urlsplit(url)
+        robots = RobotFileParser(f'{parts.scheme}://{parts.netloc}/robots.txt')
+        delay = 0
+        try:
+            resp = requests.get(robots.url, timeout=ROBOTS_TIMEOUT, verify=False)
+            if resp.status_code == 200:
+                robots.parse(resp.text.splitlines())
+                delay = min(float(robots.crawl_delay(self.user_agent) or 0), MAX_BACKOFF)
+        except Exception as e:
+            logger.debug(f'{host}: could not read robots.txt: {e}')
+        with self.__lock:
+            self._state(host).crawl_delay = delay
+
+
+class _Slot:
+    response = None
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+#: How long (in seconds) the network must stay idle for `network_idle`, like puppeteer's networkidle0/2
+NETWORK_IDLE_TIME = 0.5
+#: How often (in seconds) the number of requests in flight is checked while waiting for the network to be idle
+NETWORK_POLL_INTERVAL = 0.05
+#: After `manipulate_page_func`: how long (in seconds) the DOM must stay unchanged ...
+SETTLE_QUIET = 0.2
+#: ... waiting at most this long (in seconds)
+SETTLE_MAX_WAIT = 2
+
+# resolves to true once the DOM did not change for quietMs, or to false after maxMs
+_DOM_QUIET_JS = '''(quietMs, maxMs) => new Promise(resolve => {
+    let timer, cap;
+    const done = quiet => { observer.disconnect(); clearTimeout(timer); clearTimeout(cap); resolve(quiet); };
+    const observer = new MutationObserver(() => { clearTimeout(timer); timer = setTimeout(done, quietMs, true); });
+    observer.observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+    timer = setTimeout(done, quietMs, true);
+    cap = setTimeout(done, maxMs, false);
+})'''
+
+
+class NetworkTracker:
+    """Keep track of the requests in flight of a page. Must be installed before the navigation starts."""
+
+    def __init__(self, page):
+        self._in_flight = set()
+        self._idle_since = {}  # max connections -> since when there were at most that many requests in flight
+        page.on('request', self._started)
+        page.on('requestfinished', self._ended)
+        page.on('requestfailed', self._ended)
+
+    def _started(self, request):
+        self._in_flight.add(request)
+        for max_connections in list(self._idle_since):
+            if len(self._in_flight) > max_connections:
+                self._idle_since[max_connections] = None
+
+    def _ended(self, request):
+        self._in_flight.discard(request)
+        for max_connections, since in self._idle_since.items():
+            if since is None and len(self._in_flight) <= max_connections:
+                self._idle_since[max_connections] = time.monotonic()
+
+    async def idle(self, max_connections=0, idle_time=NETWORK_IDLE_TIME):
+        """Wait until there are at most `max_connections` requests in flight for `idle_time` seconds."""
+        if max_connections not in self._idle_since:
+            self._idle_since[max_connections] = time.monotonic() if len(self._in_flight) <= max_connections else None
+        while True:
+            since = self._idle_since[max_connections]
+            if since is not None and time.monotonic() - since >= idle_time:
+                return
+            await asyncio.sleep(NETWORK_POLL_INTERVAL)
+
+
+async def dom_quiet(page, quiet, max_wait):
+    """
+    Wait until the DOM of the page did not change (no mutation) for `quiet` seconds.
+    :return: True if the DOM is quiet, False if it was still changing after `max_wait` seconds
+    """
+    return await page.evaluate(_DOM_QUIET_JS, quiet * 1000, max_wait * 1000)
+
+
+class Readiness:
+
+    def __init__(self, selector=None, predicate=None, dom_quiet=None, network_idle=None, max_wait=None):
+        """
+        When a page is ready to be captured, checked once the page is loaded (see `HtmlRenderer.async_render`'s
+        `ready`). All the conditions set must be met. Whatever happens, the content is captured after `max_wait`:
+        pages which never stop loading (long-polling, analytics beacons, ...) are not a failure.
+
+        :param selector: a CSS selector which must match an element of the page
+        :param predicate: a JavaScript function (as a string) which must return a truthy value,
+         e.g. `"() => window.appReady"`
+        :param dom_quiet: the number of seconds during which the DOM must not change
+        :param network_idle: the maximum number of requests in flight during `NETWORK_IDLE_TIME`,
+         e.g. 2 for puppeteer's `networkidle2`
+        :param max_wait: the maximum time to wait for the conditions, in seconds. Defaults to (and is capped by) the
+         time left to render the page.
+        """
+        self.selector, self.predicate, self.dom_quiet = selector, predicate, dom_quiet
+        self.network_idle, self.max_wait = network_idle, max_wait
+
+    async def wait(self, page, network, max_wait):
+        """
+        Wait for the conditions to be met.
+        :param page: the page
+        :param network: the `NetworkTracker` installed on the page, needed for `network_idle`
+        :param max_wait: the maximum time to wait, in seconds (e.g. the time left to render the page). The `max_wait`
+         of this policy can only make it shorter
+        :return: True if all the conditions are met, False if the wait was cut short by `max_wait`
+        """
+        max_wait = min(self.max_wait or max_wait, max_wait)
+        conditions = []
+        if self.selector is not None:
+            conditions.append(page.waitForSelector(self.selector, timeout=max_wait * 1000))
+        if self.predicate is not None:
+            conditions.append(page.waitForFunction(self.predicate, timeout=max_wait * 1000))
+        if self.network_idle is not None:
+            conditions.append(network.idle(self.network_idle))
+        if self.dom_quiet is not None:
+            conditions.append(dom_quiet(page, self.dom_quiet, max_wait))
+        if not conditions:
+            return True
+
+        # the pyppeteer's waits time out by themselves, but a navigation may leave them hanging: wait at most max_wait
+        tasks = [asyncio.ensure_future(condition) for condition in conditions]
+        done, pending = await asyncio.wait(tasks, timeout=max_wait)
+        for task in pending:
+            task.cancel()
+        ready = not pending
+        for task in done:
+            if task.cancelled():
+                ready = False
+            elif task.exception() is not None:
+                logger.debug(f'readiness condition failed: {task.exception()}')
+                ready = False
+            elif task.result() is False:  # dom_quiet cut short
+                ready = False
+        return ready
+
+    @classmethod
+    def get(cls, ready):
+        """:return: a `Readiness` from a readiness (returned as-is), a dict of arguments, a CSS selector, or None"""
+        if ready is None or isinstance(ready, Readiness):
+            return ready
+        if isinstance(ready, str):
+            return cls(selector=ready)
+        return cls(**ready)
@@ -0,0 +1,78 @@
+import logging
+import os
+
+try:
+    import psutil
+except ModuleNotFoundError:
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+#: Minimum interval (in seconds) between two measures of the memory of a browser when rendering
+RSS_CHECK_INTERVAL = 5
+#: Timeout (in seconds) of the watchdog's liveness probe
+PROBE_TIMEOUT = 10
+
+
+def process_tree_rss(pid):
+    """
+    :return: the resident set size (in bytes) of a process and all its descendants, or None if it cannot
+     be measured (the process is gone, or the platform has neither `/proc` nor [psutil](https://pypi.org/project/psutil/))
+    """
+    if psutil is not None:
+        try:
+            process = psutil.Process(pid)
+            return sum(p.memory_info().rss for p in [process] + process.children(recursive=True))
+        except psutil.Error:
+            return None
+
+    if not os.path.exists(f'/proc/{pid}/status'):
+        return None
+    rss, todo = 0, [pid]
+    while todo:
+        p = todo.pop()
+        try:
+            with open(f'/proc/{p}/status') as f:
+                rss += next((int(line.split()[1]) * 1024 for line in f if line.startswith('VmRSS:')), 0)
+            with open(f'/proc/{p}/task/{p}/children') as f:
+                todo.extend(int(c) for c in f.read().split())
+        except (OSError, ValueError):
+            pass  # the process exited in the meantime
+    return rss
+
+
+class RecyclePolicy:
+
+    def __init__(self, max_pages=None, max_age=None, max_rss=None):
+        """
+        When to replace a long-running browser by a fresh one. Renders in flight are completed first (drained),
+        new renders wait for the new browser.
+
+        :param max_pages: recycle the browser after this many renders
+        :param max_age: recycle the browser after this many seconds
+        :param max_rss: recycle the browser once the memory (resident set size, in bytes) of its process tree
+         exceeds this limit. The memory is measured at most every `RSS_CHECK_INTERVAL` seconds (and by the watchdog).
+        """
+        self.max_pages, self.max_age, self.max_rss = max_pages, max_age, max_rss
+
+    def reason(self, pages, age, rss=None):
+        """
+        :param pages: the number of renders done by the browser
+        :param age: the time since the browser was launched, in seconds
+        :param rss: the memory of the browser, in bytes, if measured
+        :return: why the browser should be recycled, or None if it can be kept
+        """
+        if self.max_pages and pages >= self.max_pages:
+            return f'{pages} pages rendered'
+        if self.max_age and age >= self.max_age:
+            return f'launched {age:.0f}s ago'
+        if self.max_rss and rss is not None and rss > self.max_rss:
+            return f'using {rss / 2 ** 20:.0f}MB'
+        return None
+
+    @classmethod
+    def get(cls, policy):
+        """:return: a `RecyclePolicy` from a policy (returned as-is), a dict of arguments, or None"""
+        if policy is None or isinstance(policy, RecyclePolicy):
+            return policy
+        return cls(**policy)
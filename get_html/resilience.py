@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+
+import requests
+
+from .deadline import DeadlineExceeded
+from .politeness import host_of
+
+logger = logging.getLogger(__name__)
+
+#: Default number of consecutive failures (timeouts, connection errors) after which the circuit of a host opens
+FAILURE_THRESHOLD = 5
+#: Default time (in seconds) a circuit stays open before letting a probe request through
+RESET_TIMEOUT = 30
+#: Default HTTP statuses worth retrying
+RETRY_STATUSES = (500, 502, 503, 504)
+
+# the chromium network errors (see HtmlRenderer) meaning that the host is unreachable
+_NET_ERRORS = ('net::ERR_CONNECTION_', 'net::ERR_NAME_NOT_RESOLVED', 'net::ERR_TIMED_OUT',
+               'net::ERR_ADDRESS_UNREACHABLE', 'net::ERR_EMPTY_RESPONSE', 'net::ERR_NETWORK_CHANGED')
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of contacting a host whose circuit is open (the host failed repeatedly)."""
+
+
+def _is_a(error, class_name):
+    # pyppeteer and aiohttp are imported lazily: match their exceptions by name
+    return any(c.__name__ == class_name for c in type(error).__mro__)
+
+
+def is_transient(error) -> bool:
+    """
+    :param error: an exception raised by `default_get`, `async_default_get` or `HtmlRenderer`
+    :return: True for timeouts and connection errors (the host may be down or overloaded)
+    """
+    if isinstance(error, (CircuitOpenError, DeadlineExceeded, requests.exceptions.SSLError)) or \
+            _is_a(error, 'ClientSSLError'):
+        return False
+    # asyncio.TimeoutError (pyppeteer's and aiohttp's timeouts) is only the builtin TimeoutError from python 3.11
+    if isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError, TimeoutError,
+                          asyncio.TimeoutError, ConnectionError)):
+        return True
+    if _is_a(error, 'ClientConnectionError'):  # aiohttp
+        return True
+    return _is_a(error, 'PageError') and str(error).startswith(_NET_ERRORS)  # chromium
+
+
+class _Circuit:
+
+    def __init__(self):
+        self.failures = 0  # consecutive
+        self.opened_at = None  # None = closed
+        self.probe_at = 0.  # when open: no request before that time
+
+
+class CircuitBreaker:
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        """
+        A circuit breaker per host, shared by threads and asyncio tasks. After `failure_threshold` consecutive
+        timeouts or connection errors, the circuit of the host opens: requests fail right away with
+        `CircuitOpenError`. After `reset_timeout` seconds, the circuit is half-open: one request is let through
+        to probe the host. It closes the circuit if it succeeds, or keeps it open for another `reset_timeout`.
+
+        :param failure_threshold: the number of consecutive failures opening the circuit
+        :param reset_timeout: the time (in seconds) before probing a host whose circuit is open
+        """
+        self.failure_threshold, self.reset_timeout = failure_threshold, reset_timeout
+        self._circuits = {}
+        self._stats = dict(opened=0, rejected=0)
+        self.__lock = threading.Lock()
+
+    def check(self, url):
+        """
+        Call before contacting the host of the URL.
+        :raises CircuitOpenError: if the circuit of the host is open
+        """
+        with self.__lock:
+            circuit = self._circuits.get(host_of(url))
+            if circuit is None or circuit.opened_at is None:
+                return
+            now = time.monotonic()
+            if now < circuit.probe_at:
+                self._stats['rejected'] += 1
+                raise CircuitOpenError(f'{host_of(url)}: circuit open after {circuit.failures} failures, '
+                                       f'retrying in {circuit.probe_at - now:.0f}s')
+            # half-open: let this request through, the others wait for its outcome (or another reset_timeout)
+            circuit.probe_at = now + self.reset_timeout
+
+    def record(self, url, failure):
+        """
+        Call with the outcome of a request to the host of the URL.
+        :param url: the URL
+        :param failure: True if the host could not be reached (see `is_transient`)
+        """
+        host = host_of(url)
+        with self.__lock:
+            circuit = self._circuits.get(host)
+            if not failure:
+                if circuit is not None:
+                    if circuit.opened_at is not None:
+                        logger.info(f'{host}: circuit closed')
+                    del self._circuits[host]
+                return
+            circuit = self._circuits.setdefault(host, _Circuit())
+            circuit.failures += 1
+            if circuit.opened_at is None and circuit.failures >= self.failure_threshold:
+                logger.warning(f'{host}: circuit open after {circuit.failures} consecutive failures')
+                circuit.opened_at = time.monotonic()
+                self._stats['opened'] += 1
+            if circuit.opened_at is not None:
+                circuit.probe_at = time.monotonic() + self.reset_timeout
+
+    def state(self, url) -> str:
+        """:return: the state of the circuit of the host of the URL: `closed`, `open` or `half-open`"""
+        with self.__lock:
+            circuit = self._circuits.get(host_of(url))
+            if circuit is None or circuit.opened_at is None:
+                return 'closed'
+            return 'open' if time.monotonic() < circuit.probe_at else 'half-open'
+
+    def stats(self) -> dict:
+        """:return: the number of circuits `opened`, requests `rejected` and the hosts currently `open`"""
+        with self.__lock:
+            return dict(self._stats, open=sorted(h for h, c in self._circuits.items() if c.opened_at is not None))
+
+
+class RetryPolicy:
+
+    def __init__(self, max_retries=2, backoff=1., max_backoff=30., retry_statuses=RETRY_STATUSES):
+        """
+        When and how long to wait before trying again. Only transient errors are retried: timeouts and connection
+        errors (see `is_transient`), bodies which failed to decode and the `retry_statuses`.
+        Other errors (4xx, SSL errors, invalid URLs, open circuits...) are permanent.
+        The delays grow exponentially, with full jitter: a random delay between 0 and `backoff * 2 ** attempt`.
+
+        :param max_retries: the maximum number of retries (so at most `max_retries + 1` attempts)
+        :param backoff: the base delay, in seconds
+        :param max_backoff: the maximum delay, in seconds
+        :param retry_statuses: the HTTP statuses to retry
+        """
+        self.max_retries, self.backoff, self.max_backoff = max_retries, backoff, max_backoff
+        self.retry_statuses = retry_statuses
+
+    def retryable(self, error=None, status=None) -> bool:
+        """:return: True if the error (an exception) or the HTTP status is worth retrying"""
+        if error is not None:
+            return is_transient(error) or isinstance(error, requests.exceptions.ContentDecodingError) or \
+                   _is_a(error, 'ClientPayloadError')  # aiohttp's ContentDecodingError
+        return status in self.retry_statuses
+
+    def retry(self, attempt, error=None, status=None) -> bool:
+        """
+        :param attempt: the number of the attempt which just failed, starting at 0
+        :return: True if another attempt should be made (after `delay(attempt)`)
+        """
+        return attempt < self.max_retries and self.retryable(error, status)
+
+    def delay(self, attempt) -> float:
+        """:return: the time to wait (in seconds) before the attempt `attempt + 1`"""
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def next_delay(self, attempt, deadline=None, reserve=0., error=None, status=None):
+        """
+        :param attempt: see `retry`
+        :param deadline: the `Deadline` of the call, if any: no retry if there would be no time left for it
+        :param reserve: time (in seconds) to keep after the retry (see `Deadline.remaining`)
+        :return: the time to wait (in seconds) before the next attempt, or None to give up
+        """
+        if not self.retry(attempt, error, status):
+            return None
+        delay = self.delay(attempt)
+        return delay if deadline is None or delay < deadline.remaining(reserve) else None
@@ -0,0 +1,260 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from requests.structures import CaseInsensitiveDict
+
+from .http_cache import HttpCache, ACCESS_RESOLUTION, DB_TIMEOUT, _replayable, _parse_date
+
+logger = logging.getLogger(__name__)
+
+#: Default maximum size of the resource cache, in bytes (bodies only, each stored once)
+RESOURCE_CACHE_MAX_SIZE = 512 * 1024 ** 2
+#: Default maximum size of a resource to store, in bytes
+MAX_RESOURCE_SIZE = 10 * 1024 ** 2
+#: Resource types served from (and stored in) the cache by default. See
+#: [`puppeteer's resourceType`](https://pptr.dev/#?product=Puppeteer&version=v2.1.1&show=api-httprequestresourcetype)
+CACHED_TYPES = ('script', 'stylesheet', 'font', 'image')
+#: Maximum freshness (in seconds) of resources with a `Last-Modified` but no explicit freshness: 10% of their age,
+#: like browsers do
+MAX_HEURISTIC_FRESHNESS = 24 * 3600
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS resources (
+    url TEXT PRIMARY KEY, digest TEXT, status INTEGER, headers TEXT, expires_at REAL, accessed_at REAL
+);
+CREATE INDEX IF NOT EXISTS resources_accessed_at ON resources(accessed_at);
+CREATE INDEX IF NOT EXISTS resources_digest ON resources(digest);
+CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, content BLOB, size INTEGER);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER);
+INSERT OR IGNORE INTO meta VALUES ('total_size', 0);
+'''
+
+#: A resource served from the cache
+CachedResource = namedtuple('CachedResource', 'url status headers content')
+
+
+class ResourceCache:
+
+    def __init__(self, path, max_size=RESOURCE_CACHE_MAX_SIZE, resource_types=CACHED_TYPES,
+                 max_resource_size=MAX_RESOURCE_SIZE):
+        """
+        A persistent cache of the static resources (scripts, stylesheets, fonts, images...) loaded by the rendered
+        pages, stored in a SQLite database with a size limit and LRU eviction. Bodies are content-addressed:
+        the same library served under different URLs is stored once.
+        Only fresh resources are served, according to their `Cache-Control`/`Expires` headers (or 10% of their age,
+        see `MAX_HEURISTIC_FRESHNESS`). Stale resources are downloaded again.
+        It can be shared by `HtmlRenderer` instances (see `enable_resource_cache`) and by multiple processes
+        on the same host.
+
+        :param path: the path of the database file, created if it does not exist
+        :param max_size: the maximum size of all the stored bodies, in bytes
+        :param resource_types: the types of the requests served from the cache
+        :param max_resource_size: larger resources are not stored
+        """
+        self.path, self.max_size, self.max_resource_size = path, max_size, max_resource_size
+        self.resource_types = frozenset(resource_types)
+        self._local = threading.local()
+        self._stats = dict(hits=0, misses=0, stored=0, deduplicated=0, evicted=0, bytes_saved=0)
+        self.__lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db.executescript(_SCHEMA)
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            # see HttpCache
+            db = sqlite3.connect(self.path, timeout=DB_TIMEOUT, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+        return db
+
+    # == pages
+
+    def cacheable(self, request) -> bool:
+        """:return: True if the request (a pyppeteer `Request`) may be served from the cache"""
+        return request.method == 'GET' and request.resourceType in self.resource_types and \
+            request.url.startswith(('http:', 'https:'))
+
+    def attach(self, page):
+        """
+        Serve the static resources of the page from the cache, and store the ones it downloads.
+        Request interception is needed: pass the returned handler to `BlockingPolicy.install` or `intercept_requests`.
+        :param page: a pyppeteer page
+        :return: a dict updated in place with the `hits`, `misses`, resources `stored` and `bytes_saved` of the page,
+         and the request handler
+        """
+        stats = dict(hits=0, misses=0, stored=0, bytes_saved=0)
+        served = set()  # the requests answered from the cache, not to store again
+        loop = asyncio.get_event_loop()
+
+        async def handle(request):
+            if not self.cacheable(request):
+                await request.continue_()
+                return
+            try:
+                # in an executor: the database may be locked by another process
+                resource = await loop.run_in_executor(None, self.lookup, request.url)
+                if resource is not None:
+                    served.add(request)
+                    await request.respond(dict(status=resource.status, headers=resource.headers,
+                                               body=resource.content))
+                    self._count(stats, 'hits')
+                    self._count(stats, 'bytes_saved', len(resource.content))
+                    return
+            except Exception as e:
+                # a failing cache must not be worse than no cache: let the request through
+                logger.debug(f'{request.url}: not served from the cache: {e}')
+                served.discard(request)
+            self._count(stats, 'misses')
+            await request.continue_()
+
+        async def store(response):
+            request = response.request
+            if not self.cacheable(request) or request in served or response.status != 200:
+                return
+            try:
+                content = await response.buffer()
+                if await loop.run_in_executor(None, self.store, response.url, response.status, response.headers,
+                                              content):
+                    stats['stored'] += 1
+            except Exception as e:
+                # the page may have been closed in the meantime
+                logger.debug(f'{response.url}: not stored: {e}')
+
+        page.on('response', lambda response: asyncio.ensure_future(store(response)))
+        return stats, handle
+
+    # == storage
+
+    def lookup(self, url):
+        """:return: the fresh `CachedResource` of the url, or None"""
+        row = self._db.execute(
+            'SELECT r.status, r.headers, r.expires_at, r.accessed_at, b.content '
+            'FROM resources r JOIN blobs b ON b.digest = r.digest WHERE r.url = ?', (url,)).fetchone()
+        if row is None:
+            return None
+        status, headers, expires_at, accessed_at, content = row
+        now = time.time()
+        if expires_at <= now:
+            return None
+        if now - accessed_at > ACCESS_RESOLUTION:
+            self._db.execute('UPDATE resources SET accessed_at = ? WHERE url = ?', (now, url))
+        return CachedResource(url, status, json.loads(headers), content)
+
+    def store(self, url, status, headers, content) -> bool:
+        """
+        Store a resource, if its headers allow it.
+        :param url: the URL
+        :param status: the HTTP status, only 200 is stored
+        :param headers: the response headers
+        :param content: the (decoded) body, as bytes
+        :return: True if the resource was stored
+        """
+        headers = CaseInsensitiveDict(headers)
+        cache_control = headers.get('Cache-Control', '').lower()
+        if status != 200 or 'no-store' in cache_control or 'no-cache' in cache_control \
+                or headers.get('Vary') == '*' or len(content) > min(self.max_resource_size, self.max_size):
+            return False
+        expires_at = self._expires_at(headers, cache_control)
+        now = time.time()
+        if expires_at is None or expires_at <= now:
+            return False
+        digest = hashlib.sha256(content).hexdigest()
+        headers = _replayable(headers)
+
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            old = db.execute('SELECT digest FROM resources WHERE url = ?', (url,)).fetchone()
+            db.execute('INSERT OR REPLACE INTO resources VALUES (?, ?, ?, ?, ?, ?)', (
+                url, digest, status, json.dumps(headers), expires_at, now))
+            delta, deduplicated = 0, False
+            if db.execute('SELECT 1 FROM blobs WHERE digest = ?', (digest,)).fetchone() is None:
+                db.execute('INSERT INTO blobs VALUES (?, ?, ?)', (digest, content, len(content)))
+                delta += len(content)
+            else:
+                deduplicated = old is None or old[0] != digest
+            if old is not None and old[0] != digest:
+                delta -= self._release_blob(old[0])
+            total = self._update_total_size(delta)
+            if total > self.max_size:
+                self._evict(total - self.max_size)
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        self._count(None, 'stored')
+        if deduplicated:
+            self._count(None, 'deduplicated')
+        return True
+
+    def _release_blob(self, digest):
+        # delete the body if no resource refers to it anymore: :return: the number of bytes freed
+        db = self._db
+        if db.execute('SELECT 1 FROM resources WHERE digest = ? LIMIT 1', (digest,)).fetchone() is not None:
+            return 0
+        row = db.execute('SELECT size FROM blobs WHERE digest = ?', (digest,)).fetchone()
+        db.execute('DELETE FROM blobs WHERE digest = ?', (digest,))
+        return row[0] if row else 0
+
+    def _update_total_size(self, delta):
+        db = self._db
+        db.execute("UPDATE meta SET value = value + ? WHERE key = 'total_size'", (delta,))
+        return db.execute("SELECT value FROM meta WHERE key = 'total_size'").fetchone()[0]
+
+    def _evict(self, excess):
+        # remove the least recently used resources, until enough bodies are freed
+        db, freed, evicted = self._db, 0, 0
+        for url, digest in db.execute('SELECT url, digest FROM resources ORDER BY accessed_at').fetchall():
+            if freed >= excess:
+                break
+            db.execute('DELETE FROM resources WHERE url = ?', (url,))
+            freed += self._release_blob(digest)
+            evicted += 1
+        db.execute("UPDATE meta SET value = value - ? WHERE key = 'total_size'", (freed,))
+        self._count(None, 'evicted', evicted)
+
+    @staticmethod
+    def _expires_at(headers, cache_control):
+        expires_at = HttpCache._expires_at(headers, cache_control)
+        if expires_at is None and 'Last-Modified' in headers:
+            # heuristic freshness
+            date = _parse_date(headers.get('Date')) or time.time()
+            last_modified = _parse_date(headers['Last-Modified'])
+            if last_modified is not None and last_modified < date:
+                expires_at = date + min(MAX_HEURISTIC_FRESHNESS, (date - last_modified) / 10)
+        return expires_at
+
+    def stats(self) -> dict:
+        """
+        :return: the number of `hits`, `misses`, resources `stored` (and `deduplicated`: their body was already
+         stored), `evicted`, the `bytes_saved` and the `hit_ratio` of this instance, as well as the current `size`
+         of the cache (shared by all processes)
+        """
+        size = self._db.execute("SELECT value FROM meta WHERE key = 'total_size'").fetchone()[0]
+        with self.__lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return dict(self._stats, hit_ratio=self._stats['hits'] / lookups if lookups else 0., size=size)
+
+    def _count(self, page_stats, key, n=1):
+        with self.__lock:
+            self._stats[key] += n
+        if page_stats is not None:
+            page_stats[key] += n
+
+    def close(self):
+        """Close the connection of the calling thread (the others are closed when their thread ends)."""
+        db = getattr(self._local, 'db', None)
+        if db is not None:
+            db.close()
+            self._local.db = None
@@ -0,0 +1,85 @@
+import datetime
+from http.client import responses as http_client_responses
+
+import requests
+
+
+class RenderResult:
+    """
+    A lightweight alternative to `requests.Response` for rendered pages (see `HtmlRenderer.async_render`'s `lean`).
+    The HTML is held once, either as text (renders) or as bytes (fallbacks), and converted on access:
+    accessing `content` on a rendered page encodes the text each time, without keeping the bytes around.
+    Use `to_response` to get a regular `requests.Response`.
+    """
+    __slots__ = ('url', 'status_code', 'headers', 'encoding', 'elapsed', 'timings', 'blocking', 'resource_cache',
+                 'rejected', 'truncated', '_text', '_content', '_redirects')
+
+    def __init__(self, url, status_code, headers, text=None, content=None, encoding='utf-8', elapsed=None,
+                 redirects=()):
+        """
+        :param url: the final URL
+        :param status_code: the HTTP status
+        :param headers: a dict of headers
+        :param text: the HTML as a str, or
+        :param content: the HTML as bytes, in the given encoding
+        :param encoding: the encoding of `content`
+        :param elapsed: the time elapsed, a `datetime.timedelta`
+        :param redirects: the redirects that led to the final url, as `(url, status, headers)` tuples
+        """
+        self.url, self.status_code, self.headers = url, status_code, headers
+        self._text, self._content, self.encoding = text, content, encoding
+        self.elapsed = elapsed if elapsed is not None else datetime.timedelta(0)
+        self._redirects = redirects
+        self.timings, self.blocking, self.rejected, self.truncated = None, None, None, None
+        self.resource_cache = None
+
+    @classmethod
+    def from_response(cls, resp):
+        """:return: a `RenderResult` from a `requests.Response` (e.g. from `default_get`)"""
+        result = cls(resp.url, resp.status_code, dict(resp.headers), content=resp.content,
+                     encoding=resp.encoding or 'utf-8', elapsed=resp.elapsed,
+                     redirects=[(h.url, h.status_code, dict(h.headers)) for h in resp.history])
+        result.timings = getattr(resp, 'timings', None)
+        result.rejected, result.truncated = getattr(resp, 'rejected', None), getattr(resp, 'truncated', None)
+        return result
+
+    @property
+    def text(self) -> str:
+        if self._text is not None:
+            return self._text
+        return self._content.decode(self.encoding, errors='replace')
+
+    @property
+    def content(self) -> bytes:
+        if self._content is not None:
+            return self._content
+        return self._text.encode(self.encoding)
+
+    @property
+    def reason(self) -> str:
+        return http_client_responses.get(self.status_code, '')
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    @property
+    def history(self) -> list:
+        """:return: the redirects, as content-less `RenderResult`s (created on each access)"""
+        return [RenderResult(url, status, headers, content=b'') for url, status, headers in self._redirects]
+
+    def to_response(self) -> requests.Response:
+        """:return: the equivalent `requests.Response`, with the same additional attributes (timings, ...)"""
+        resp = requests.Response()
+        resp.url, resp.status_code, resp.reason = self.url, self.status_code, self.reason
+        resp.headers.update(self.headers)
+        resp._content, resp.encoding = self.content, self.encoding
+        resp.elapsed = self.elapsed
+        resp.history = [h.to_response() for h in self.history]
+        for attribute in ['timings', 'blocking', 'resource_cache', 'rejected', 'truncated']:
+            if getattr(self, attribute) is not None:
+                setattr(resp, attribute, getattr(self, attribute))
+        return resp
+
+    def __repr__(self):
+        return f'<RenderResult [{self.status_code}]>'
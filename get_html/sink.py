@@ -0,0 +1,298 @@
+import datetime
+import glob
+import gzip
+import io
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from http.client import responses as http_client_responses
+from urllib.parse import urlsplit
+
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None  # only needed for the jsonl.zst format
+
+logger = logging.getLogger(__name__)
+
+#: The formats supported by `ResultSink`, by file extension
+FORMATS = ('jsonl.gz', 'jsonl.zst', 'warc.gz')
+#: Default maximum size of a file (compressed, in bytes) before switching to a new one
+MAX_FILE_SIZE = 1024 ** 3
+#: Default number of results compressed and written at once
+BATCH_SIZE = 100
+#: Default maximum time (in seconds) a result waits in memory before being written
+FLUSH_INTERVAL = 1.
+#: Default maximum number of results waiting to be written. Once reached, `ResultSink.write` blocks.
+QUEUE_SIZE = 10000
+
+# headers describing the body as transferred: the stored body is decoded (and, for renders, is the rendered DOM)
+_TRANSFER_HEADERS = ['Content-Encoding', 'Transfer-Encoding', 'Content-Length']
+_CHARSET_RE = re.compile(r';\s*charset=[^;]*', re.IGNORECASE)
+
+
+class ResultSink:
+
+    def __init__(self, directory, format='jsonl.gz', prefix='results', max_file_size=MAX_FILE_SIZE,
+                 batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, queue_size=QUEUE_SIZE):
+        """
+        Store results (responses or errors) in compressed files, from any number of threads.
+        `write` only puts the result in a queue: a background thread serializes, compresses and writes the results
+        in batches, and switches to a new file once `max_file_size` is reached. Files being written end with `.part`,
+        and are renamed once complete. Use `read_results` to iterate over the stored results.
+
+        :param directory: where to write the files (created if needed)
+        :param format: `jsonl.gz` (one JSON object per result), `jsonl.zst` (the same, requires
+         [zstandard](https://pypi.org/project/zstandard/)) or `warc.gz` (a request and a response record per result,
+         see [WARC](https://iipc.github.io/warc-specifications/))
+        :param prefix: the prefix of the file names, e.g. `results-20200308T101112-00001.jsonl.gz`
+        :param max_file_size: the maximum size of a file, in bytes (compressed)
+        :param batch_size: the number of results compressed and written at once
+        :param flush_interval: the maximum time, in seconds, a result waits in memory before being written
+        :param queue_size: the maximum number of results waiting to be written, after which `write` blocks
+        """
+        if format not in FORMATS:
+            raise ValueError(f'unknown format {format!r}. Use one of {list(FORMATS)}')
+        if format == 'jsonl.zst' and zstandard is None:
+            raise ImportError('the jsonl.zst format requires zstandard. Please, run pip install zstandard')
+        os.makedirs(directory, exist_ok=True)
+        self.directory, self.format, self.prefix = directory, format, prefix
+        self.max_file_size, self.batch_size, self.flush_interval = max_file_size, batch_size, flush_interval
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._file, self._path, self._file_size, self._files = None, None, 0, 0
+        self._stats = dict(results=0, files=0, bytes=0, errors=0)
+        self._compress = zstandard.ZstdCompressor().compress if format == 'jsonl.zst' else gzip.compress
+        self._serialize = self._warc_records if format == 'warc.gz' else self._json_line
+        self.__writer = threading.Thread(target=self._run, name='ResultSink', daemon=True)
+        self.__writer.start()
+
+    def write(self, url, response=None, error=None, **extra):
+        """
+        Store a result. Returns right away, unless the queue is full.
+        :param url: the URL requested
+        :param response: the response (`requests.Response` or `RenderResult`), if any
+        :param error: the error (an exception or a message), if any
+        :param extra: additional fields to store (JSONL formats only)
+        """
+        if not self.__writer.is_alive():
+            raise ValueError('the sink is closed')
+        timestamp = datetime.datetime.now(datetime.timezone.utc)
+        self._queue.put((url, response, error, extra, timestamp))
+
+    def close(self):
+        """Write the results waiting in the queue, and close the current file."""
+        if self.__writer.is_alive():
+            self._queue.put(None)
+            self.__writer.join()
+
+    def stats(self) -> dict:
+        """:return: the number of `results` written, `files` completed, `bytes` written, serialization `errors`
+         and results `queued`"""
+        return dict(self._stats, queued=self._queue.qsize())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # == background writer
+
+    def _run(self):
+        batch, closing = [], False
+        while not closing:
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    closing = True
+                    break
+                try:
+                    batch.append(self._serialize(*item))
+                except Exception as e:
+                    logger.warning(f'{item[0]}: cannot store the result ({e})')
+                    self._stats['errors'] += 1
+            if batch:
+                try:
+                    self._write(batch)
+                except OSError as e:
+                    logger.error(f'cannot write the results: {e}')
+                    self._stats['errors'] += len(batch)
+                batch = []
+        self._rotate(reopen=False)
+
+    def _write(self, batch):
+        if self._file is None:
+            self._rotate()
+        if self.format == 'warc.gz':
+            # one gzip member per record, as expected by WARC tools (random access)
+            data = b''.join(gzip.compress(record) for records in batch for record in records)
+        else:
+            data = self._compress(b''.join(batch))  # one gzip member / zstd frame per batch
+        self._file.write(data)
+        self._file.flush()
+        self._file_size += len(data)
+        self._stats['results'] += len(batch)
+        self._stats['bytes'] += len(data)
+        if self._file_size >= self.max_file_size:
+            self._rotate(reopen=False)
+
+    def _rotate(self, reopen=True):
+        if self._file is not None:
+            self._file.close()
+            os.replace(self._path, self._path[:-len('.part')])
+            self._file = None
+            self._stats['files'] += 1
+        if reopen:
+            self._files += 1
+            name = f'{self.prefix}-{datetime.datetime.now():%Y%m%dT%H%M%S}-{self._files:05d}.{self.format}.part'
+            self._path = os.path.join(self.directory, name)
+            self._file, self._file_size = open(self._path, 'wb'), 0
+            if self.format == 'warc.gz':
+                self._write_warcinfo(name[:-len('.part')])
+
+    # == serialization
+
+    @staticmethod
+    def _json_line(url, response, error, extra, timestamp) -> bytes:
+        record = dict(url=url, timestamp=timestamp.isoformat(), error=_error_message(error))
+        if response is not None:
+            record.update(final_url=response.url, status=response.status_code, reason=response.reason,
+                          headers=dict(response.headers), encoding=response.encoding, text=response.text)
+        record.update(extra)
+        return json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+
+    def _write_warcinfo(self, filename):
+        info = b'software: get-html\r\nformat: WARC File Format 1.0\r\n'
+        data = gzip.compress(_warc_record('warcinfo', None, datetime.datetime.now(datetime.timezone.utc), info,
+                                          'application/warc-fields', {'WARC-Filename': filename}))
+        self._file.write(data)
+        self._file_size += len(data)
+        self._stats['bytes'] += len(data)
+
+    @staticmethod
+    def _warc_records(url, response, error, extra, timestamp) -> list:
+        if response is None:
+            # WARC has no record type for failures: store them as metadata
+            payload = json.dumps(dict(error=_error_message(error))).encode('utf-8')
+            return [_warc_record('metadata', url, timestamp, payload, 'application/json')]
+
+        split = urlsplit(response.url)
+        request_headers = getattr(getattr(response, 'request', None), 'headers', None) or {}
+        request = f'GET {split.path or "/"}{"?" + split.query if split.query else ""} HTTP/1.1\r\n' \
+                  f'Host: {split.netloc}\r\n'
+        request += ''.join(f'{k}: {v}\r\n' for k, v in request_headers.items() if k.lower() != 'host') + '\r\n'
+
+        content = response.content
+        headers = [(k, v) for k, v in response.headers.items()
+                   if k.title() not in _TRANSFER_HEADERS and k.lower() != 'content-type']
+        content_type = response.headers.get('Content-Type')
+        if content_type and response.encoding:
+            # the encoding of the content stored (e.g. UTF-8 for renders), which may not be the one of the server
+            content_type = _CHARSET_RE.sub('', content_type) + f'; charset={response.encoding}'
+        if content_type:
+            headers.append(('Content-Type', content_type))
+        headers.append(('Content-Length', str(len(content))))
+        http = f'HTTP/1.1 {response.status_code} {response.reason}\r\n' + \
+               ''.join(f'{k}: {v}\r\n' for k, v in headers) + '\r\n'
+
+        request_id = _record_id()
+        return [
+            _warc_record('request', response.url, timestamp, request.encode('latin-1', errors='replace'),
+                         'application/http; msgtype=request', {'WARC-Record-ID': request_id}),
+            # the requested URL (before redirects) is kept in an extension field, to read back the same url as JSONL
+            _warc_record('response', response.url, timestamp, http.encode('latin-1', errors='replace') + content,
+                         'application/http; msgtype=response',
+                         {'WARC-Concurrent-To': request_id, 'X-Requested-URL': url}),
+        ]
+
+
+def _error_message(error):
+    if error is None or isinstance(error, str):
+        return error
+    return f'{type(error).__name__}: {error}'
+
+
+def _record_id():
+    return f'<urn:uuid:{uuid.uuid4()}>'
+
+
+def _warc_record(warc_type, url, timestamp, block, content_type, headers=None) -> bytes:
+    fields = {'WARC-Type': warc_type, 'WARC-Record-ID': _record_id(),
+              'WARC-Date': timestamp.strftime('%Y-%m-%dT%H:%M:%SZ')}
+    if url is not None:
+        fields['WARC-Target-URI'] = url
+    fields.update(headers or {})
+    fields.update({'Content-Type': content_type, 'Content-Length': str(len(block))})
+    header = 'WARC/1.0\r\n' + ''.join(f'{k}: {v}\r\n' for k, v in fields.items()) + '\r\n'
+    return header.encode('utf-8') + block + b'\r\n\r\n'
+
+
+# == reading
+
+def read_results(path):
+    """
+    Iterate over the results stored by a `ResultSink`.
+    :param path: a file, or a directory (all its complete files, in the order they were written)
+    :return: a generator of dicts with `url`, `timestamp` and `error`, and for responses `final_url`, `status`,
+     `reason`, `headers`, `encoding` and `text` (plus the `extra` fields of `ResultSink.write` in JSONL formats)
+    """
+    if os.path.isdir(path):
+        paths = sorted(p for fmt in FORMATS for p in glob.glob(os.path.join(path, f'*.{fmt}')))
+    else:
+        paths = [path]
+    for p in paths:
+        if p.endswith('.warc.gz'):
+            with gzip.open(p, 'rb') as f:
+                yield from _read_warc(f)
+        elif p.endswith('.zst'):
+            if zstandard is None:
+                raise ImportError(f'reading {p} requires zstandard. Please, run pip install zstandard')
+            with open(p, 'rb') as raw, zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True) as f:
+                for line in io.TextIOWrapper(f, encoding='utf-8'):
+                    yield json.loads(line)
+        else:
+            with gzip.open(p, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    yield json.loads(line)
+
+
+def _read_warc(f):
+    while True:
+        line = f.readline()
+        if not line:
+            return
+        if not line.strip():
+            continue  # the separator of the previous record
+        fields = CaseInsensitiveDict()
+        for line in iter(f.readline, b'\r\n'):
+            key, value = line.decode('utf-8').split(':', 1)
+            fields[key.strip()] = value.strip()
+        block = f.read(int(fields['Content-Length']))
+        warc_type = fields['WARC-Type']
+        result = dict(url=fields.get('X-Requested-URL', fields.get('WARC-Target-URI')), timestamp=fields['WARC-Date'],
+                      error=None)
+        if warc_type == 'metadata':
+            result.update(json.loads(block))
+            yield result
+        elif warc_type == 'response':
+            head, content = block.split(b'\r\n\r\n', 1)
+            status_line, *header_lines = head.decode('latin-1').split('\r\n')
+            _, status, *reason = status_line.split(' ', 2)
+            headers = CaseInsensitiveDict(line.split(': ', 1) for line in header_lines)
+            encoding = get_encoding_from_headers(headers) if 'charset' in headers.get('Content-Type', '') else 'utf-8'
+            result.update(final_url=fields.get('WARC-Target-URI'), status=int(status),
+                          reason=reason[0] if reason else http_client_responses.get(int(status), ''),
+                          headers=dict(headers), encoding=encoding, text=content.decode(encoding, errors='replace'))
+            yield result
@@ -29,5 +29,11 @@ setuptools.setup(
     install_requires=[
         'pyppeteer2==0.2.2',
         'requests>=2.23,<=2.24'
-    ]
+    ],
+    extras_require={
+        # non-blocking HTTP client for async_do_get in DEFAULT mode
+        'async': ['aiohttp>=3.6'],
+        # zstd-compressed JSONL files for ResultSink
+        'zstd': ['zstandard>=0.16'],
+    }
 )
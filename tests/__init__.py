@@ -1,6 +1,13 @@
 from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+import asyncio
 import os
-from get_html import Modes, ENV_VARIABLE
+import threading
+
+import pytest
+
+from get_html import ENV_VARIABLE
 from importlib import reload
 
 
@@ -12,6 +19,242 @@ def load_doget_module(render_html=0):
     try:
         yield hg
     finally:
-        if hasattr(hg, '_RENDERER'):
-            for r in hg._RENDERER.values():
-                r.close()
+        hg.close_all()
+
+
+@contextmanager
+def local_server(handler_class=None):
+    """
+    Start a local HTTP/1.1 server (keep-alive) in a background thread.
+    Yields the base URL, e.g. `http://127.0.0.1:12345`.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler_class or HtmlHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class HtmlHandler(BaseHTTPRequestHandler):
+    """Answers any GET with a small HTML page echoing the path."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = f'<html><body><p>{self.path}</p></body></html>'.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+# == a fake pyppeteer browser, to test HtmlRenderer without Chromium
+
+#: The HTML of the pages rendered by FakeBrowser
+FAKE_HTML = '<html><body><p>rendered</p></body></html>'
+#: The script loaded by the pages of FakeBrowser, with request interception (cacheable for an hour)
+FAKE_SCRIPT = 'http://assets.test/app.js'
+
+
+class FakeProcess:
+    def __init__(self):
+        self.pid, self.killed = os.getpid(), False
+
+    def poll(self):
+        return -9 if self.killed else None
+
+    def kill(self):
+        self.killed = True
+
+
+class FakeRequest:
+    def __init__(self, url, resource_type, frame):
+        self.url, self.resourceType, self.method, self.frame = url, resource_type, 'GET', frame
+        self.handled = None  # how the interception handled it
+
+    def isNavigationRequest(self):
+        return self.resourceType == 'document'
+
+    async def continue_(self):
+        self.handled = 'continued'
+
+    async def abort(self):
+        self.handled = 'aborted'
+
+    async def respond(self, response):
+        self.handled = 'answered'
+
+
+class FakePage:
+    """
+    Rendering a URL takes the number of seconds given as URL (e.g. `"0.1"`), `"refused"` fails like an unreachable host.
+    The document is received right away, so a timeout can capture the page.
+    With request interception, the page also loads `FAKE_SCRIPT`. Pages can be pooled (see `PagePool`).
+    """
+
+    def __init__(self, browser):
+        self.browser, self.mainFrame, self.listeners, self.navigations = browser, object(), [], 0
+        self.request_listeners, self.requests = [], []
+        self.viewport, self.closed = None, False
+        self._client = SimpleNamespace(send=lambda *args: asyncio.sleep(0))
+
+    def on(self, event, callback):
+        if event == 'response':
+            self.listeners.append(callback)
+        elif event == 'request':
+            self.request_listeners.append(callback)
+
+    async def setRequestInterception(self, value):
+        pass
+
+    async def _load_script(self):
+        script = FakeRequest(FAKE_SCRIPT, 'script', self.mainFrame)
+        self.requests.append(script)
+        for callback in self.request_listeners:
+            callback(script)
+        for _ in range(50):  # the handlers run in tasks (and the cache lookups in threads)
+            if script.handled is not None:
+                break
+            await asyncio.sleep(0.01)
+        if script.handled == 'continued':
+            response = SimpleNamespace(url=FAKE_SCRIPT, status=200, request=script,
+                                       headers={'cache-control': 'max-age=3600', 'content-encoding': 'gzip'},
+                                       buffer=lambda: asyncio.sleep(0, b'console.log(1)'))
+            for callback in self.listeners:
+                callback(response)
+
+    async def setViewport(self, viewport):
+        self.viewport = viewport
+
+    def remove_all_listeners(self):
+        self.listeners, self.request_listeners = [], []
+
+    def isClosed(self):
+        return self.closed
+
+    async def goto(self, url, timeout=None, **kwargs):
+        import pyppeteer.errors
+        if url == 'about:blank':
+            return None
+        self.navigations += 1
+        if url == 'refused':
+            raise pyppeteer.errors.PageError(f'net::ERR_CONNECTION_REFUSED at {url}')
+        request = SimpleNamespace(redirectChain=[], isNavigationRequest=lambda: True, frame=self.mainFrame,
+                                  method='GET', resourceType='document', url=url)
+        response = SimpleNamespace(url=url, status=200, headers={'content-type': 'text/html'}, request=request)
+        for callback in self.listeners:
+            callback(response)
+        if self.request_listeners:
+            await self._load_script()
+        if timeout and float(url) > timeout / 1000:
+            await asyncio.sleep(timeout / 1000)
+            raise pyppeteer.errors.TimeoutError('Navigation Timeout Exceeded')
+        await asyncio.sleep(float(url))
+        return response
+
+    async def waitForSelector(self, selector, timeout=None):
+        """Selectors are found right away, except `#never`."""
+        import pyppeteer.errors
+        if selector == '#never':
+            await asyncio.sleep(timeout / 1000)
+            raise pyppeteer.errors.TimeoutError(f'Waiting for selector "{selector}" failed')
+
+    async def evaluate(self, js, *args):
+        return True
+
+    async def content(self):
+        assert not self.browser.closed, 'browser closed during a render'
+        return FAKE_HTML
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self, ws_endpoint, connected=False):
+        # connected browsers (pyppeteer.connect) have no process
+        self.process, self.wsEndpoint, self.closed = None if connected else FakeProcess(), ws_endpoint, False
+        self.disconnected, self._listeners = False, []
+
+    def on(self, event, callback):
+        assert event == 'disconnected'
+        self._listeners.append(callback)
+
+    def lose_connection(self):
+        self.disconnected = True
+        for callback in self._listeners:
+            callback()
+
+    async def newPage(self):
+        assert not self.closed, 'render on a closed browser'
+        return FakePage(self)
+
+    async def close(self):
+        self.closed = True
+
+    async def disconnect(self):
+        self.disconnected = True
+
+
+@contextmanager
+def fake_browsers():
+    """
+    Make `pyppeteer.launch` and `pyppeteer.connect` return `FakeBrowser`s.
+    Yields the list of browsers launched (or connected to).
+    """
+    import pyppeteer
+    launched, launch, connect = [], pyppeteer.launch, pyppeteer.connect
+
+    async def fake_launch(**kwargs):
+        launched.append(FakeBrowser(base_url.replace('http', 'ws') + '/devtools/browser/fake'))
+        return launched[-1]
+
+    async def fake_connect(browserWSEndpoint=None, browserURL=None, **kwargs):
+        launched.append(FakeBrowser(browserWSEndpoint or browserURL, connected=True))
+        return launched[-1]
+
+    with local_server() as base_url:  # answers /json/version, like the DevTools endpoint
+        pyppeteer.launch, pyppeteer.connect = fake_launch, fake_connect
+        try:
+            yield launched
+        finally:
+            pyppeteer.launch, pyppeteer.connect = launch, connect
+
+
+# == fixtures, to import in the test modules using them
+
+@pytest.fixture
+def browsers():
+    """The `FakeBrowser`s launched during the test (see `fake_browsers`)."""
+    with fake_browsers() as launched:
+        yield launched
+
+
+@pytest.fixture
+def renderer():
+    """An `HtmlRenderer` rendering in `FakeBrowser`s."""
+    from get_html import HtmlRenderer
+    with fake_browsers():
+        renderer = HtmlRenderer()
+        try:
+            yield renderer
+        finally:
+            renderer.close()
+
+
+@pytest.fixture
+def registry():
+    """A `MetricsRegistry` recording the metrics of the test."""
+    from get_html import MetricsRegistry, add_metrics_hook, remove_metrics_hook
+    registry = add_metrics_hook(MetricsRegistry())
+    try:
+        yield registry
+    finally:
+        remove_metrics_hook(registry)
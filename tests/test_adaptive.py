@@ -0,0 +1,150 @@
+import threading
+import time
+
+import pyppeteer.errors
+import pytest
+
+from . import browsers
+from get_html import AdaptiveLimiter, HtmlRenderer, MetricsRegistry, DeadlineExceeded, add_metrics_hook, \
+    remove_metrics_hook
+
+
+def run(limiter, calls, latency=0.1, timeout=False):
+    for _ in range(calls):
+        limiter.acquire()
+        limiter.release(latency, timeout)
+
+
+def saturate(limiter, calls, latency=0.1, timeout=False):
+    # keep the limiter at its limit, so that it may increase
+    for _ in range(calls):
+        for _ in range(limiter.limit):
+            limiter.acquire()
+        for _ in range(limiter.stats()['in_flight']):
+            limiter.release(latency, timeout)
+
+
+def test_additive_increase():
+    limiter = AdaptiveLimiter(max_limit=4, window=5, max_load=None)
+    saturate(limiter, 20)
+    assert limiter.limit == 4  # capped
+    assert [d['limit'] for d in limiter.decisions()] == [2, 3, 4]
+    assert limiter.stats() == dict(limit=4, in_flight=0, increases=3, decreases=0)
+
+
+def test_no_increase_below_limit():
+    limiter = AdaptiveLimiter(initial=2, window=5, max_load=None)
+    limiter.acquire()  # only one call at a time: the limit is never reached
+    limiter.release(0.1)
+    run(limiter, 20)
+    assert limiter.limit == 2 and not limiter.decisions()
+
+
+def test_multiplicative_decrease_on_timeouts():
+    limiter = AdaptiveLimiter(initial=8, window=4, max_load=None)
+    run(limiter, 3)
+    run(limiter, 1, timeout=True)  # 25% > 10%
+    assert limiter.limit == 4
+    assert limiter.decisions()[-1]['reason'] == '1/4 timeouts'
+    run(limiter, 12, timeout=True)
+    assert limiter.limit == 1  # min_limit
+
+
+def test_decrease_on_latency():
+    limiter = AdaptiveLimiter(initial=8, window=5, max_load=None)
+    run(limiter, 5, latency=0.1)  # baseline
+    run(limiter, 5, latency=0.15)
+    assert limiter.limit == 8
+    run(limiter, 5, latency=0.5)
+    assert limiter.limit == 4 and 'latency' in limiter.decisions()[-1]['reason']
+
+    limiter = AdaptiveLimiter(initial=8, window=5, max_load=None, target_latency=1)
+    run(limiter, 5, latency=2)
+    assert limiter.limit == 4
+
+
+def test_decrease_on_cpu_and_memory(monkeypatch):
+    import get_html.adaptive
+
+    limiter = AdaptiveLimiter(initial=8, window=2, max_load=0.8, max_rss=100, rss=lambda: 50)
+    monkeypatch.setattr(get_html.adaptive, 'cpu_load', lambda: 2.)
+    run(limiter, 2)
+    assert limiter.limit == 4 and limiter.decisions()[-1]['reason'] == 'cpu load 2.00'
+    monkeypatch.setattr(get_html.adaptive, 'cpu_load', lambda: None)  # unknown: ignored
+    limiter.rss = lambda: 200
+    run(limiter, 2)
+    assert limiter.limit == 2 and limiter.decisions()[-1]['reason'].startswith('memory')
+
+
+def test_metrics():
+    registry = MetricsRegistry()
+    add_metrics_hook(registry)
+    try:
+        limiter = AdaptiveLimiter(initial=2, window=2, max_load=None)
+        saturate(limiter, 1)  # 2 -> 3
+        run(limiter, 2, timeout=True)  # 3 -> 1
+    finally:
+        remove_metrics_hook(registry)
+    counters = registry.stats()['counters']
+    assert counters['adaptive.increase'] == 1 and counters['adaptive.decrease'] == 1
+
+
+def test_threads_wait_for_a_slot():
+    limiter = AdaptiveLimiter(initial=2, max_load=None)
+    in_flight, peak, lock = [0], [0], threading.Lock()
+
+    def call():
+        limiter.acquire()
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.05)
+        with lock:
+            in_flight[0] -= 1
+        limiter.release(0.05)
+
+    threads = [threading.Thread(target=call) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert peak[0] == 2
+
+
+def test_renderer(browsers):
+    limiter = AdaptiveLimiter(max_limit=4, window=2, max_load=None)
+    renderer = HtmlRenderer(loop_thread=True, max_concurrency=limiter)
+    try:
+        results = {}
+        threads = [threading.Thread(target=lambda u=u: results.setdefault(u, renderer.render(u)))
+                   for u in ['0.1', '0.10', '0.100', '0.1000']]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert all(r.status_code == 200 for r in results.values())
+        assert limiter.limit == 3  # 1 -> 2 -> 3, after the 2 windows of 2 renders
+
+        results = list(renderer.render_many(['0.05'] * 8, concurrency=limiter))
+        assert len(results) == 8 and limiter.stats()['in_flight'] == 0
+    finally:
+        renderer.close()
+
+
+def test_renderer_failures(browsers, monkeypatch):
+    # transient errors and deadlines exceeded during the render count as timeouts
+    limiter = AdaptiveLimiter(initial=4, window=2, max_load=None)
+    renderer = HtmlRenderer(loop_thread=True, max_concurrency=limiter)
+    try:
+        with pytest.raises(pyppeteer.errors.PageError):
+            renderer.render('refused')
+
+        async def exceeded(*args, **kwargs):
+            raise DeadlineExceeded('deadline of 1s exceeded before goto')
+
+        monkeypatch.setattr(renderer, 'async_render', exceeded)
+        with pytest.raises(DeadlineExceeded):
+            renderer.render('0')
+        assert limiter.limit == 2 and limiter.decisions()[-1]['reason'] == '2/2 timeouts'
+    finally:
+        renderer.close()
@@ -0,0 +1,75 @@
+import time
+
+import requests
+
+from get_html.auto import AutoGetter, ProbedPage, empty_root, noscript_hint, script_ratio
+
+STATIC = '<html><body><article>' + 'Some server-side rendered text. ' * 20 + '</article></body></html>'
+SPA = '<html><body><div id="root"></div><script src="/bundle.js"></script></body></html>'
+
+
+def make_response(url, html, content_type='text/html; charset=utf-8', status_code=200):
+    resp = requests.Response()
+    resp.url, resp.status_code, resp._content, resp.encoding = url, status_code, html.encode(), 'utf-8'
+    resp.headers['Content-Type'] = content_type
+    return resp
+
+
+def fake_get(url, **kwargs):
+    return make_response(url, SPA if 'spa' in url else STATIC)
+
+
+def fake_render(url, **kwargs):
+    return make_response(url, 'rendered')
+
+
+def test_heuristics():
+    assert empty_root(ProbedPage(SPA))
+    assert not empty_root(ProbedPage(STATIC))
+    assert noscript_hint(ProbedPage('<noscript>Please enable JavaScript to continue.</noscript>'))
+    assert script_ratio(ProbedPage('<p>hi</p><script>' + 'var a = 1;' * 100 + '</script>'))
+    assert not script_ratio(ProbedPage(STATIC))
+
+
+def test_render_only_when_needed():
+    getter = AutoGetter(get=fake_get, render=fake_render, learn_after=0)
+    assert getter.get('https://static.com/a').text == STATIC
+    assert getter.get('https://spa.com/a').text == 'rendered'
+    assert getter.stats() == dict(probes=2, renders=1, renders_avoided=1, skipped_probes=0, domains_learned=0)
+
+
+def test_non_html_never_rendered():
+    getter = AutoGetter(get=lambda url, **kw: make_response(url, '', content_type='application/pdf'),
+                        render=fake_render)
+    assert getter.get('https://spa.com/doc.pdf').text == ''
+    assert getter.stats()['probes'] == 0
+
+
+def test_no_time_left_to_render():
+    deadlines = []
+
+    def slow_get(url, deadline, **kwargs):
+        deadlines.append(deadline)
+        time.sleep(0.1)
+        return fake_get(url)
+
+    getter = AutoGetter(get=slow_get, render=fake_render, learn_after=0)
+    assert getter.get('https://spa.com/a', timeout=0.1).text == SPA  # the raw page, instead of DeadlineExceeded
+    assert deadlines[0].budget == 0.1
+    assert getter.get('https://spa.com/a', timeout=1).text == 'rendered'
+
+
+def test_learn_domain_verdict():
+    gets = []
+
+    def counting_get(url, **kwargs):
+        gets.append(url)
+        return fake_get(url)
+
+    getter = AutoGetter(get=counting_get, render=fake_render, learn_after=2)
+    for i in range(5):
+        assert getter.get(f'https://spa.com/{i}').text == 'rendered'
+    # only the first two were probed, the domain is then rendered directly
+    assert len(gets) == 2
+    assert getter.verdict('https://spa.com/other') is True
+    assert getter.stats()['skipped_probes'] == 3
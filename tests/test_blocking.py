@@ -0,0 +1,26 @@
+import pytest
+
+from get_html.blocking import BlockingPolicy, PRESETS
+
+
+def test_resource_types():
+    policy = BlockingPolicy.get('no-media')
+    assert policy.should_block('https://example.com/a.png', 'image')
+    assert not policy.should_block('https://example.com/app.js', 'script')
+
+
+def test_domains():
+    policy = BlockingPolicy(deny_domains=['tracker.com'], allow_domains=['example.com', 'cdn.net'])
+    assert policy.should_block('https://tracker.com/t.js', 'script')
+    assert policy.should_block('https://sub.tracker.com/t.js', 'script')
+    assert policy.should_block('https://nottracker.com/t.js', 'script')  # outside the allow list
+    assert not policy.should_block('https://www.example.com/app.js', 'script')
+    assert not policy.should_block('https://cdn.net/app.js', 'script')
+    assert not policy.should_block('data:image/png;base64,abc', 'script')
+
+
+def test_presets():
+    assert PRESETS['dom-only'].should_block('https://www.google-analytics.com/analytics.js', 'script')
+    assert BlockingPolicy.get(None) is None
+    with pytest.raises(ValueError):
+        BlockingPolicy.get('unknown')
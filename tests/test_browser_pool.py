@@ -0,0 +1,38 @@
+import threading
+
+import pytest
+
+from get_html.browser_pool import BrowserPool
+
+
+class FakeRenderer:
+    def __init__(self, barrier):
+        self.barrier, self.calls = barrier, 0
+
+    def render(self, url, **kwargs):
+        self.calls += 1
+        self.barrier.wait(timeout=5)
+        return url
+
+    def close(self):
+        pass
+
+
+def test_least_loaded_routing():
+    n = 3
+    barrier = threading.Barrier(n)
+    pool = BrowserPool(n)
+    pool.renderers = [FakeRenderer(barrier) for _ in range(n)]
+
+    threads = [threading.Thread(target=pool.render, args=(f'url{i}',)) for i in range(n)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+
+    # all renders were in flight at the same time, so each went to a different browser
+    assert [r.calls for r in pool.renderers] == [1, 1, 1]
+    assert pool.loads() == [0, 0, 0]
+
+
+def test_invalid_size():
+    with pytest.raises(ValueError):
+        BrowserPool(0)
@@ -0,0 +1,71 @@
+import io
+import json
+
+import pytest
+
+from . import local_server
+from get_html import Modes
+from get_html.__main__ import main
+
+#: Nothing listens on this port: connections are refused right away
+REFUSED_URL = 'http://127.0.0.1:1/'
+
+
+@pytest.fixture(autouse=True)
+def raw_mode(monkeypatch):
+    from get_html import env_defined_get
+    monkeypatch.setenv('RENDER_HTML', '0')
+    env_defined_get.configure(Modes.DEFAULT)
+    yield
+    env_defined_get.close_all()
+
+
+def read_records(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_jsonl_output(tmp_path):
+    output = str(tmp_path / 'results.jsonl')
+    with local_server() as base_url:
+        input_file = tmp_path / 'urls.txt'
+        input_file.write_text(f'{base_url}/a\n\nnot-a-url\n{base_url}/b\n')
+        assert main([str(input_file), '-t', '2', '-o', output]) == 0
+    records = sorted(read_records(output), key=lambda r: r['url'])
+    assert [r['url'] for r in records] == [f'{base_url}/a', f'{base_url}/b']
+    assert all(r['status'] == 200 and r['error'] is None and r['timings']['total'] > 0 for r in records)
+    assert records[0]['final_url'] == f'{base_url}/a' and records[0]['length'] > 0
+
+
+def test_resume(tmp_path, capsys):
+    output = str(tmp_path / 'results.jsonl')
+    with local_server() as base_url:
+        input_file = tmp_path / 'urls.txt'
+        input_file.write_text(f'{base_url}/a\n{REFUSED_URL}\n')
+        assert main([str(input_file), '-o', output]) == 1
+        assert len(read_records(output)) == 2
+
+        input_file.write_text(f'{base_url}/a\n{REFUSED_URL}\n{base_url}/b\n')
+        main([str(input_file), '-o', output, '--resume'])
+        assert [r['url'] for r in read_records(output)[2:]] == [f'{base_url}/b']  # only the new URL
+        assert 'Resuming: 2 URLs already processed.' in capsys.readouterr().err
+
+        main([str(input_file), '-o', output, '--resume', '--retry-errors'])
+        assert [r['url'] for r in read_records(output)[3:]] == [REFUSED_URL]  # the failed URL again
+
+
+def test_stdin(monkeypatch, capsys):
+    with local_server() as base_url:
+        monkeypatch.setattr('sys.stdin', io.StringIO(f'{base_url}/a\n'))
+        assert main(['-']) == 0
+    assert f'@@ {base_url}/a: 200 OK.' in capsys.readouterr().out
+
+
+def test_exit_code(tmp_path, capsys):
+    input_file = tmp_path / 'urls.txt'
+    input_file.write_text(f'{REFUSED_URL}\n')
+    assert main([str(input_file)]) == 1
+    assert f'@@ {REFUSED_URL}: ERROR ! ConnectionError' in capsys.readouterr().out
+    with pytest.raises(SystemExit) as e:
+        main([str(input_file), '--resume'])  # requires --output
+    assert e.value.code == 2
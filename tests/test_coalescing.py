@@ -0,0 +1,164 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+from . import local_server, fake_browsers, load_doget_module
+from get_html import HtmlRenderer, SingleFlight, UrlCanonicalizer, RenderResult, enable_coalescing, \
+    disable_coalescing
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    """Answers after 0.2s, counting the requests."""
+    protocol_version = 'HTTP/1.1'
+    hits = 0
+
+    def do_GET(self):
+        SlowHandler.hits += 1
+        time.sleep(0.2)
+        body = f'<p>{self.path}</p>'.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def cleanup():
+    yield
+    disable_coalescing()
+
+
+def in_threads(func, args):
+    results = [None] * len(args)
+
+    def run(i):
+        results[i] = func(args[i])
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(args))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_canonicalize():
+    canonicalize = UrlCanonicalizer()
+    assert canonicalize('HTTP://Example.COM:80?b=1&a=2&utm_source=x&fbclid=y#top') == 'http://example.com/?a=2&b=1'
+    assert canonicalize('https://example.com:443/a?a=2&a=1') == 'https://example.com/a?a=2&a=1'
+    assert canonicalize('https://example.com:8443/A') == 'https://example.com:8443/A'
+    assert UrlCanonicalizer(drop_params=['ref'], drop_fragment=False)('http://a/?ref=1&utm_x=2#f') == 'http://a/?utm_x=2#f'
+
+
+def test_single_flight():
+    flight, calls = SingleFlight(), []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.2)
+        return RenderResult('http://a/', 200, {'X': '1'}, text='<p>a</p>')
+
+    urls = ['http://a/', 'http://A/#x', 'http://a/?utm_medium=y', 'http://a/']
+    results = in_threads(lambda url: flight.do(url, fetch), urls)
+    assert len(calls) == 1
+    assert len({id(r) for r in results}) == 4 and len({id(r.headers) for r in results}) == 4
+    assert all(r.text == '<p>a</p>' for r in results)
+    assert flight.stats() == dict(calls=4, coalesced=3)
+
+    flight.do('http://a/', fetch)  # nothing is kept once done
+    assert len(calls) == 2
+
+
+def test_single_flight_error():
+    flight = SingleFlight()
+
+    def fail():
+        time.sleep(0.1)
+        raise ValueError('down')
+
+    results = in_threads(lambda url: pytest.raises(ValueError, flight.do, url, fail), ['http://a/'] * 3)
+    assert all(r.value.args == ('down',) for r in results)
+
+
+def test_single_flight_async():
+    flight, calls = SingleFlight(), []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return RenderResult('http://a/', 200, {}, text='a')
+
+    async def main():
+        return await asyncio.gather(*[flight.async_do('http://a/', fetch) for _ in range(3)],
+                                    flight.async_do('http://b/', fetch))
+
+    results = asyncio.new_event_loop().run_until_complete(main())
+    assert len(calls) == 2 and len({id(r) for r in results}) == 4
+
+
+def test_single_flight_async_leader_cancelled():
+    # the leader is cancelled: the calls waiting for it are not, one of them takes over
+    flight, calls = SingleFlight(), []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return RenderResult('http://a/', 200, {}, text='a')
+
+    async def main():
+        leader = asyncio.ensure_future(flight.async_do('http://a/', fetch))
+        await asyncio.sleep(0)
+        followers = [asyncio.ensure_future(flight.async_do('http://a/', fetch)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.gather(*followers)
+
+    results = asyncio.new_event_loop().run_until_complete(main())
+    assert len(calls) == 2 and all(r.text == 'a' for r in results)
+    assert flight.stats() == dict(calls=3, coalesced=1)
+
+
+def test_do_get():
+    SlowHandler.hits = 0
+    enable_coalescing()
+    with local_server(SlowHandler) as base_url, load_doget_module(0) as hg:
+        responses = in_threads(hg.do_get, [f'{base_url}/x?utm_source=a', f'{base_url}/x', f'{base_url}/x#y'])
+    assert SlowHandler.hits == 1
+    assert all(r.text == '<p>/x?utm_source=a</p>' for r in responses)
+    assert len({id(r) for r in responses}) == 3
+    assert all(r.timings['total'] > 0 for r in responses)
+
+
+def test_render():
+    flight = enable_coalescing()
+    with fake_browsers():
+        renderer = HtmlRenderer()
+        try:
+            responses = in_threads(renderer.render, ['0.2'] * 3)
+        finally:
+            renderer.close()
+    assert all(r.status_code == 200 for r in responses)
+    assert flight.stats()['coalesced'] == 2
+
+
+def test_render_renderers_not_shared():
+    # renderers with different defaults never share renders
+    flight = enable_coalescing()
+    with fake_browsers():
+        renderers = [HtmlRenderer(), HtmlRenderer(block='dom-only')]
+        try:
+            responses = in_threads(lambda r: r.render('0.2'), renderers)
+        finally:
+            for renderer in renderers:
+                renderer.close()
+    assert not hasattr(responses[0], 'blocking') and responses[1].blocking is not None
+    assert flight.stats()['coalesced'] == 0
@@ -0,0 +1,28 @@
+from . import fake_browsers
+from get_html import HtmlRenderer
+
+ENDPOINT = 'ws://127.0.0.1:9222/devtools/browser/shared'
+
+
+def test_connect():
+    with fake_browsers() as browsers:
+        renderer = HtmlRenderer(browser_ws_endpoint=ENDPOINT)
+        assert renderer.render('0').status_code == 200
+        renderer.close()
+    assert [b.wsEndpoint for b in browsers] == [ENDPOINT]
+    # the shared browser is left running
+    assert browsers[0].disconnected and not browsers[0].closed
+
+
+def test_reconnect():
+    with fake_browsers() as browsers:
+        renderer = HtmlRenderer(browser_ws_endpoint=ENDPOINT)
+        try:
+            renderer.render('0')
+            browsers[0].lose_connection()
+            assert renderer.render('0').status_code == 200
+            assert len(browsers) == 2
+            assert renderer.stats()['restarts'] == 1
+        finally:
+            renderer.close()
+    assert not any(b.closed for b in browsers)
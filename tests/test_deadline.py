@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+
+import pyppeteer.errors
+import pytest
+import requests
+
+from . import fake_browsers, renderer, registry, FAKE_HTML
+from get_html import HtmlRenderer, Deadline, DeadlineExceeded, RecyclePolicy, enable_retries, disable_retries
+
+
+def test_deadline():
+    deadline = Deadline(0.2)
+    assert 0.1 < deadline.remaining() <= 0.2 and deadline.remaining(reserve=0.2) == 0
+    assert not deadline.expired and deadline.timeout('goto') > 0
+    with pytest.raises(DeadlineExceeded, match='during sleep'):
+        asyncio.run(deadline.wait_for(asyncio.sleep(1), 'sleep'))
+    assert deadline.expired
+    with pytest.raises(DeadlineExceeded, match='before goto'):
+        deadline.timeout('goto')
+    assert isinstance(DeadlineExceeded(), requests.exceptions.Timeout)
+
+
+def test_manipulate_page_func(renderer, registry):
+    # the function gets the deadline, and is cut short before it: the page is captured as is
+    remaining = []
+
+    async def scroll(page, deadline):
+        remaining.append(deadline.remaining())
+        await asyncio.sleep(10)
+
+    start = time.perf_counter()
+    resp = renderer.render('0', timeout=0.5, manipulate_page_func=scroll)
+    assert time.perf_counter() - start < 0.6
+    assert (resp.status_code, resp.text) == (200, FAKE_HTML)
+    assert 0 < remaining[0] < 0.5 and resp.timings['manipulate'] < 0.5
+    assert registry.stats()['counters']['render.wait_timeout'] == 1
+
+
+def test_goto_draws_from_the_budget(renderer):
+    start = time.perf_counter()
+    resp = renderer.render('5', timeout=0.3)
+    assert time.perf_counter() - start < 0.4
+    assert resp.status_code == 200
+
+
+def test_lock_wait(renderer, registry):
+    # without loop_thread, renders wait for each other: the wait draws from the budget
+    thread = threading.Thread(target=renderer.render, args=('0.5',))
+    thread.start()
+    time.sleep(0.1)
+    with pytest.raises(DeadlineExceeded, match='lock'):
+        renderer.render('0', timeout=0.2)
+    thread.join()
+
+
+@pytest.mark.parametrize('options, phase', [
+    (dict(page_pool_size=1, page_pool_overflow=False), 'new_page'),  # waiting for a free page
+    (dict(recycle=RecyclePolicy(max_pages=1)), 'recycle'),  # waiting for the renders in flight to drain
+])
+def test_browser_waits(options, phase):
+    with fake_browsers():
+        renderer = HtmlRenderer(loop_thread=True, max_concurrency=3, **options)
+        try:
+            thread = threading.Thread(target=renderer.render, args=('1',))
+            thread.start()
+            time.sleep(0.1)
+            if phase == 'recycle':
+                renderer.render('0')  # the browser is due for recycling, but a render is in flight
+            start = time.perf_counter()
+            with pytest.raises(DeadlineExceeded, match=phase):
+                renderer.render('0', timeout=0.3)
+            assert time.perf_counter() - start < 0.4
+            thread.join()
+            assert renderer.render('0').status_code == 200
+        finally:
+            renderer.close()
+
+
+def test_no_retry_past_deadline(renderer):
+    enable_retries(max_retries=10, backoff=0.1)
+    try:
+        start = time.perf_counter()
+        with pytest.raises(pyppeteer.errors.PageError):
+            renderer.render('refused', timeout=0.3)
+        assert time.perf_counter() - start < 0.4
+    finally:
+        disable_retries()
+
+
+def test_async_render(renderer):
+    async def render():
+        deadline = Deadline(0.5)
+        await asyncio.sleep(0.5)  # the caller used the whole budget
+        return await renderer.async_render('0', deadline=deadline)
+
+    with pytest.raises(DeadlineExceeded, match='before launch'):
+        renderer.loop.run_until_complete(render())
@@ -47,3 +47,69 @@ def test_threads(mode):
         assert len(all_renderers) == 2
         # ensure the renderers shared/not shared between threads depending on mode
         assert (all_renderers[0] == all_renderers[1]) == (mode == Modes.RENDER_HTML_MONO)
+
+
+def test_pool_routing():
+    import os
+    from get_html._default import POOL_SIZE_ENV_VARIABLE
+    os.environ[POOL_SIZE_ENV_VARIABLE] = '2'
+    try:
+        with load_doget_module(Modes.RENDER_HTML_POOL) as hg:
+            workers = [Worker(urls[i::n], Modes.RENDER_HTML_POOL) for i in range(n)]
+            for w in workers: w.start()
+            for w in workers: w.join()
+            # no render is left in flight
+            assert len(hg._POOL.renderers) == 2
+            assert hg._POOL.loads() == [0, 0]
+    finally:
+        del os.environ[POOL_SIZE_ENV_VARIABLE]
+
+
+def test_async_do_get_many():
+    import asyncio
+    from . import local_server
+
+    async def fetch_all(hg, base_url):
+        try:
+            return [result async for result in hg.async_do_get_many(f'{base_url}/{i}' for i in range(50))]
+        finally:
+            await hg.async_close()
+
+    with load_doget_module(Modes.DEFAULT) as hg, local_server() as base_url:
+        results = asyncio.new_event_loop().run_until_complete(fetch_all(hg, base_url))
+    assert len(results) == 50
+    for url, r in results:
+        assert r.status_code == 200
+        assert url.endswith(r.url[len(base_url):])
+
+
+def test_configure():
+    from . import local_server, fake_browsers
+    from get_html import env_defined_get as hg
+
+    with local_server() as base_url, fake_browsers() as browsers:
+        assert hg.configure(Modes.DEFAULT) == hg.mode == Modes.DEFAULT
+        assert hg.do_get(f'{base_url}/x').status_code == 200
+
+        # browsers are only launched on first use
+        assert hg.configure('1') == hg.mode == Modes.RENDER_HTML_MONO
+        assert browsers == []
+        assert hg.do_get('0').status_code == 200
+        assert len(browsers) == 1
+
+        # re-configuring closes the previous renderers
+        hg.configure(Modes.DEFAULT)
+        assert browsers[0].closed and hg._RENDERER == {}
+
+
+def test_configure_without_pyppeteer(monkeypatch):
+    import importlib.util
+    from get_html import env_defined_get as hg
+
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(importlib.util, 'find_spec', lambda name, *args: None if name == 'pyppeteer' else
+                        find_spec(name, *args))
+    hg.configure(Modes.DEFAULT)
+    with pytest.raises(ImportError, match='pip install pyppeteer2'):
+        hg.configure(Modes.RENDER_HTML_MONO)
+    assert hg.mode == Modes.DEFAULT
@@ -0,0 +1,126 @@
+import gzip
+import os
+import threading
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+from . import local_server
+from get_html import _default, enable_cache, disable_cache, cache_stats
+
+
+class CacheHandler(BaseHTTPRequestHandler):
+    """
+    `/fresh` can be cached for an hour (`/gzip` too, compressed), `/etag` must be revalidated, `/nostore` must not
+    be stored, `/redirect` redirects to `/gzip`.
+    """
+    protocol_version = 'HTTP/1.1'
+    hits = []
+
+    def do_GET(self):
+        CacheHandler.hits.append(self.path)
+        headers = {'Content-Type': 'text/html'}
+        if self.path == '/redirect':
+            self._send(301, {'Location': '/gzip'}, b'')
+            return
+        if self.path in ('/fresh', '/gzip'):
+            headers['Cache-Control'] = 'max-age=3600'
+            if self.path == '/gzip':
+                headers['Content-Encoding'] = 'gzip'
+                self._send(200, headers, gzip.compress(f'<p>{self.path}</p>'.encode()))
+                return
+        elif self.path == '/etag':
+            headers['ETag'], headers['Cache-Control'] = '"v1"', 'no-cache'
+            if self.headers.get('If-None-Match') == '"v1"':
+                self._send(304, headers, b'')
+                return
+        else:
+            headers['Cache-Control'] = 'no-store'
+        self._send(200, headers, f'<p>{self.path}</p>'.encode())
+
+    def _send(self, status, headers, body):
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def cache(tmp_path):
+    CacheHandler.hits.clear()
+    try:
+        yield enable_cache(os.path.join(tmp_path, 'cache.db'))
+    finally:
+        disable_cache()
+
+
+def test_fresh_served_from_cache(cache):
+    with local_server(CacheHandler) as base_url:
+        r1 = _default.default_get(f'{base_url}/fresh')
+        r2 = _default.default_get(f'{base_url}/fresh')
+    assert r1.text == r2.text == '<p>/fresh</p>'
+    assert getattr(r2, 'from_cache', False)
+    assert CacheHandler.hits == ['/fresh']
+    assert cache_stats()['hits'] == 1
+
+
+def test_revalidation(cache):
+    with local_server(CacheHandler) as base_url:
+        _default.default_get(f'{base_url}/etag')
+        r = _default.default_get(f'{base_url}/etag')
+    assert r.status_code == 200 and r.text == '<p>/etag</p>'
+    assert CacheHandler.hits == ['/etag', '/etag']
+    assert cache_stats()['revalidated'] == 1
+
+
+def test_redirect(cache):
+    with local_server(CacheHandler) as base_url:
+        responses = [_default.default_get(f'{base_url}/redirect') for _ in range(2)]
+    assert CacheHandler.hits == ['/redirect', '/gzip']
+    resp = responses[1]
+    assert resp.from_cache and resp.text == '<p>/gzip</p>'
+    assert resp.url == f'{base_url}/gzip' and resp.url == responses[0].url
+    assert [(r.url, r.status_code, r.headers['Location']) for r in resp.history] == \
+        [(f'{base_url}/redirect', 301, '/gzip')]
+    assert 'Content-Encoding' not in resp.headers and 'Content-Length' not in resp.headers
+
+
+def test_no_store(cache):
+    with local_server(CacheHandler) as base_url:
+        _default.default_get(f'{base_url}/nostore')
+        _default.default_get(f'{base_url}/nostore')
+    assert len(CacheHandler.hits) == 2
+    assert cache_stats()['stored'] == 0
+
+
+def test_eviction(tmp_path):
+    from get_html.http_cache import HttpCache
+    import requests
+
+    cache = HttpCache(os.path.join(tmp_path, 'small.db'), max_size=25)
+
+    def fetch(headers):
+        resp = requests.Response()
+        resp.status_code, resp._content, resp.encoding = 200, b'x' * 10, 'utf-8'
+        resp.headers['Cache-Control'] = 'max-age=60'
+        return resp
+
+    for i in range(3):
+        cache.get(f'http://example.com/{i}', {}, fetch)
+    # the oldest entry was evicted to stay below 25 bytes
+    assert cache.lookup('http://example.com/0') is None
+    assert cache.lookup('http://example.com/2') is not None
+    assert cache.stats()['size'] == 20
+
+
+def test_threads(cache):
+    with local_server(CacheHandler) as base_url:
+        threads = [threading.Thread(target=_default.default_get, args=(f'{base_url}/fresh',)) for _ in range(4)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+    assert cache_stats()['stored'] >= 1
@@ -0,0 +1,59 @@
+import gc
+import threading
+
+import pytest
+
+from . import local_server
+from get_html import _default, enable_pooling, disable_pooling, pool_stats
+
+
+@pytest.fixture
+def pool():
+    try:
+        yield enable_pooling(pool_maxsize=2)
+    finally:
+        disable_pooling()
+
+
+def test_connections_reused(pool):
+    with local_server() as base_url:
+        for i in range(5):
+            r = _default.default_get(f'{base_url}/page{i}')
+            assert r.status_code == 200
+            assert f'/page{i}' in r.text
+    stats = pool_stats()
+    assert stats['requests'] == 5
+    assert stats['misses'] == 1
+    assert stats['hits'] == 4
+
+
+def test_shared_across_threads(pool):
+    with local_server() as base_url:
+        def fetch():
+            for i in range(3):
+                _default.default_get(f'{base_url}/{i}')
+
+        threads = [threading.Thread(target=fetch) for _ in range(2)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+    stats = pool_stats()
+    assert stats['requests'] == 6
+    assert stats['misses'] <= 2
+
+
+def test_short_lived_threads(pool):
+    with local_server() as base_url:
+        for _ in range(10):
+            thread = threading.Thread(target=_default.default_get, args=(base_url,))
+            thread.start()
+            thread.join()
+    gc.collect()
+    assert len(pool._sessions) == 0  # collected with their thread
+    assert pool_stats()['requests'] == 10 and pool_stats()['misses'] == 1
+
+
+def test_disabled():
+    disable_pooling()
+    assert pool_stats() is None
+    with local_server() as base_url:
+        assert _default.default_get(base_url).status_code == 200
@@ -0,0 +1,22 @@
+import os
+import subprocess
+import sys
+
+# heavy optional dependencies, which must only be imported when actually used
+HEAVY_MODULES = ['pyppeteer', 'aiohttp']
+
+
+def imported_modules(code):
+    env = {k: v for k, v in os.environ.items() if k != 'RENDER_HTML'}
+    code += f'\nimport sys; print(" ".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))'
+    return subprocess.run([sys.executable, '-c', code], env=env, stdout=subprocess.PIPE,
+                          universal_newlines=True, check=True).stdout.split()
+
+
+def test_lazy_imports():
+    assert imported_modules('import get_html, get_html.env_defined_get') == []
+    assert imported_modules('from get_html.env_defined_get import do_get, configure; configure()') == []
+
+
+def test_renderer_imports_pyppeteer():
+    assert imported_modules('from get_html import HtmlRenderer; HtmlRenderer()') == ['pyppeteer']
@@ -0,0 +1,66 @@
+import asyncio
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+from . import local_server
+from get_html import _default, enable_body_limits, disable_body_limits
+from get_html.async_http import async_default_get, async_close
+from get_html.limits import BodyLimits, HTML_CONTENT_TYPES
+
+
+class SizedHandler(BaseHTTPRequestHandler):
+    """`/<n>.html` returns n bytes of HTML, `/<n>.pdf` n bytes of PDF."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        size, ext = self.path[1:].split('.')
+        body = b'x' * int(size)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8' if ext == 'html' else 'application/pdf')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def limits():
+    try:
+        yield enable_body_limits(max_bytes=50_000, content_types=HTML_CONTENT_TYPES)
+    finally:
+        disable_body_limits()
+
+
+def test_allows():
+    limits = BodyLimits(content_types=['text/html', 'image/*'])
+    assert limits.allows('text/html')
+    assert limits.allows('image/png')
+    assert limits.allows('')
+    assert not limits.allows('application/pdf')
+
+
+def test_default_get(limits):
+    with local_server(SizedHandler) as base_url:
+        small = _default.default_get(f'{base_url}/100.html')
+        large = _default.default_get(f'{base_url}/200000.html')
+        pdf = _default.default_get(f'{base_url}/100.pdf')
+    assert (small.truncated, small.rejected, len(small.content)) == (None, None, 100)
+    assert (large.truncated, large.rejected, len(large.content)) == ('max_bytes', None, 50_000)
+    assert (pdf.truncated, pdf.rejected, pdf.content) == (None, 'content-type: application/pdf', b'')
+
+
+def test_async_default_get(limits):
+    async def fetch(urls):
+        try:
+            return [await async_default_get(url) for url in urls]
+        finally:
+            await async_close()
+
+    with local_server(SizedHandler) as base_url:
+        large, pdf = asyncio.new_event_loop().run_until_complete(
+            fetch([f'{base_url}/200000.html', f'{base_url}/100.pdf']))
+    assert (large.truncated, len(large.content)) == ('max_bytes', 50_000)
+    assert pdf.rejected == 'content-type: application/pdf'
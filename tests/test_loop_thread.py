@@ -0,0 +1,55 @@
+import threading
+import time
+from types import SimpleNamespace
+
+
+from . import browsers
+from get_html import HtmlRenderer
+
+
+def render_in_threads(renderer, urls):
+    results = {}
+    threads = [threading.Thread(target=lambda u=u: results.setdefault(u, renderer.render(u))) for u in urls]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, time.perf_counter() - start
+
+
+def test_parallel_renders(browsers):
+    renderer = HtmlRenderer(loop_thread=True, max_concurrency=4)
+    try:
+        results, elapsed = render_in_threads(renderer, ['0.3', '0.30', '0.300', '0.3000'])
+        assert all(r.status_code == 200 for r in results.values())
+        assert elapsed < 1  # one at a time would take 1.2s
+        assert len(browsers) == 1  # tabs of the same browser
+    finally:
+        renderer.close()
+    assert browsers[0].closed
+
+
+def test_concurrency_limit(browsers):
+    renderer = HtmlRenderer(loop_thread=True, max_concurrency=2)
+    try:
+        results, elapsed = render_in_threads(renderer, ['0.2', '0.20', '0.200', '0.2000'])
+        assert elapsed >= 0.4
+        assert max(r.timings['lock'] for r in results.values()) >= 0.15
+        # the renderer can be reused after close: the loop thread is started again
+        renderer.close()
+        assert [u for u, r in renderer.render_many(['0', '0.1'])] == ['0', '0.1']
+    finally:
+        renderer.close()
+
+
+def test_do_get(browsers):
+    from get_html import Modes, env_defined_get as hg
+
+    hg.configure(Modes.RENDER_HTML_MONO, render_concurrency=4)
+    try:
+        results, elapsed = render_in_threads(SimpleNamespace(render=hg.do_get), ['0.3', '0.30', '0.300'])
+        assert all(r.status_code == 200 for r in results.values())
+        assert elapsed < 0.9 and len(browsers) == 1
+    finally:
+        hg.configure(Modes.DEFAULT)
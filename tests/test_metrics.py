@@ -0,0 +1,54 @@
+import pytest
+import requests
+
+from . import local_server, registry
+from get_html import _default, add_metrics_hook, remove_metrics_hook, enable_politeness, disable_politeness
+from get_html.metrics import PhaseTimer, record
+
+
+def test_phase_timer():
+    timer = PhaseTimer()
+    for phase in ['a', 'b', 'a']:
+        timer.mark(phase)
+    timings = timer.finish()
+    assert list(timings) == ['a', 'b', 'total']
+    assert timings['total'] >= timings['a'] + timings['b']
+
+
+def test_registry(registry):
+    record('test', dict(goto=0.02, total=3), 'ok')
+    record('test', dict(goto=0.2, total=100), 'error')
+    stats = registry.stats()
+    assert stats['counters'] == {'test.ok': 1, 'test.error': 1}
+    goto = stats['histograms']['test.goto']
+    assert (goto['count'], goto['min'], goto['max']) == (2, 0.02, 0.2)
+    assert goto['buckets']['0.025'] == 1 and goto['buckets']['0.25'] == 1
+    assert stats['histograms']['test.total']['buckets']['inf'] == 1
+
+    registry.reset()
+    assert registry.stats() == dict(counters={}, histograms={})
+
+
+def test_no_hook():
+    calls = []
+    hook = add_metrics_hook(lambda *args: calls.append(args))
+    remove_metrics_hook(hook)
+    record('test', dict(total=1), 'ok')
+    assert calls == []
+
+
+def test_default_get(registry):
+    enable_politeness()
+    try:
+        with local_server() as base_url:
+            resp = _default.default_get(f'{base_url}/a')
+            with pytest.raises(requests.exceptions.ConnectionError):
+                _default.default_get('http://127.0.0.1:1/unreachable')
+    finally:
+        disable_politeness()
+
+    assert list(resp.timings) == ['wait', 'request', 'body', 'total']
+    stats = registry.stats()
+    assert stats['counters'] == {'default_get.ok': 1, 'default_get.error': 1}
+    assert stats['histograms']['default_get.total']['count'] == 2
+    assert stats['histograms']['default_get.body']['count'] == 1
@@ -0,0 +1,97 @@
+import asyncio
+
+from get_html.page_pool import PagePool
+
+
+class FakePage:
+    def __init__(self):
+        self.viewport, self.closed, self.listeners = None, False, 0
+
+    async def setViewport(self, viewport):
+        self.viewport = viewport
+
+    async def setRequestInterception(self, value):
+        pass
+
+    async def goto(self, url):
+        pass
+
+    def remove_all_listeners(self):
+        self.listeners = 0
+
+    def isClosed(self):
+        return self.closed
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.created = 0
+
+    async def newPage(self):
+        self.created += 1
+        return FakePage()
+
+
+def run(coro):
+    return asyncio.new_event_loop().run_until_complete(coro)
+
+
+def test_reuse_and_recycle():
+    async def scenario():
+        browser, pool = FakeBrowser(), PagePool(size=2, max_uses=3)
+        await pool.fill(browser)
+        assert browser.created == 2
+        pages = set()
+        for _ in range(7):
+            page = await pool.acquire(browser)
+            page.listeners += 1
+            pages.add(page)
+            await pool.release(page)
+            assert page.closed or page.listeners == 0
+        # 2 pages initially, both recycled after 3 uses, then a fresh one
+        assert browser.created == 3
+        assert pool.stats() == dict(idle=1, busy=0)
+        await pool.close()
+        assert all(p.closed for p in pages)
+
+    run(scenario())
+
+
+def test_overflow():
+    async def scenario():
+        browser, pool = FakeBrowser(), PagePool(size=1, overflow=True)
+        p1, p2 = await pool.acquire(browser), await pool.acquire(browser)
+        await pool.release(p2)
+        assert p2.closed  # overflow pages are not kept
+        await pool.release(p1)
+        assert not p1.closed
+
+    run(scenario())
+
+
+def test_wait_when_exhausted():
+    async def scenario():
+        browser, pool = FakeBrowser(), PagePool(size=1, overflow=False)
+        p1 = await pool.acquire(browser)
+        waiter = asyncio.ensure_future(pool.acquire(browser))
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        await pool.release(p1)
+        assert await waiter is p1
+        assert browser.created == 1
+
+    run(scenario())
+
+
+def test_discard():
+    async def scenario():
+        browser, pool = FakeBrowser(), PagePool(size=1)
+        p1 = await pool.acquire(browser)
+        await pool.release(p1, discard=True)
+        assert p1.closed
+        assert (await pool.acquire(browser)) is not p1
+
+    run(scenario())
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from get_html import Deadline, DeadlineExceeded
+from get_html.politeness import HostLimiter
+
+
+def test_max_per_host():
+    limiter = HostLimiter(max_per_host=2)
+    assert limiter.try_acquire('https://a.com/1')
+    assert limiter.try_acquire('https://a.com/2')
+    assert not limiter.try_acquire('https://A.com/3')
+    assert limiter.delay('https://a.com/3') is None
+    # other hosts are not affected
+    assert limiter.try_acquire('https://b.com/1')
+    limiter.release('https://a.com/1')
+    assert limiter.try_acquire('https://a.com/3')
+
+
+def test_min_delay():
+    limiter = HostLimiter(max_per_host=10, min_delay=0.1)
+    starts = []
+
+    def request():
+        with limiter.limit('https://a.com'):
+            starts.append(time.monotonic())
+
+    threads = [threading.Thread(target=request) for _ in range(3)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    starts.sort()
+    assert all(b - a >= 0.09 for a, b in zip(starts, starts[1:]))
+
+
+def test_token_bucket():
+    limiter = HostLimiter(max_per_host=10, rate=10, burst=2)
+    assert limiter.try_acquire('https://a.com')
+    assert limiter.try_acquire('https://a.com')
+    assert not limiter.try_acquire('https://a.com')
+    assert 0 < limiter.delay('https://a.com') <= 0.1
+
+
+def test_retry_after():
+    limiter = HostLimiter()
+    limiter.acquire('https://a.com')
+    limiter.release('https://a.com', status=429, headers={'Retry-After': '2'})
+    assert limiter.delay('https://a.com') > 1.5
+    assert limiter.stats()['backoffs'] == 1
+
+
+def test_forget_idle_hosts():
+    limiter = HostLimiter(max_per_host=1, max_hosts=3)
+    limiter.acquire('https://busy.com')
+    limiter.acquire('https://slow.com')
+    limiter.release('https://slow.com', status=429, headers={'Retry-After': '10'})
+    for i in range(10):
+        limiter.acquire(f'https://{i}.com')
+        limiter.release(f'https://{i}.com')
+    stats = limiter.stats()
+    assert stats['hosts'] <= 4 and stats['forgotten'] >= 8 and stats['in_flight'] == 1
+    # hosts with a request in flight or a back-off pending are kept
+    assert limiter.delay('https://busy.com') is None and limiter.delay('https://slow.com') > 9
+    limiter.release('https://busy.com')
+    assert limiter.stats()['in_flight'] == 0
+
+
+def test_deadline():
+    limiter = HostLimiter(max_per_host=1)
+    limiter.acquire('https://a.com')
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded, match='a.com'):  # the slot is busy: wait until the deadline
+        limiter.acquire('https://a.com', Deadline(0.1))
+    assert 0.09 <= time.monotonic() - start < 0.2
+    limiter.release('https://a.com', status=429, headers={'Retry-After': '10'})
+
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):  # the back-off outlasts the deadline: raised right away
+        limiter.acquire('https://a.com', Deadline(1))
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(limiter.async_acquire('https://a.com', Deadline(1)))
+    assert time.monotonic() - start < 0.1
+
+
+def test_async():
+    limiter = HostLimiter(max_per_host=1)
+    in_flight, max_in_flight = [0], [0]
+
+    async def request(i):
+        await limiter.async_acquire('https://a.com')
+        in_flight[0] += 1
+        max_in_flight[0] = max(max_in_flight[0], in_flight[0])
+        await asyncio.sleep(0.01)
+        in_flight[0] -= 1
+        limiter.release('https://a.com')
+
+    async def main():
+        await asyncio.gather(*[request(i) for i in range(5)])
+
+    asyncio.new_event_loop().run_until_complete(main())
+    assert max_in_flight[0] == 1
+    assert limiter.stats()['acquired'] == 5
@@ -0,0 +1,50 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from . import renderer, registry, FAKE_HTML
+from get_html import Readiness
+from get_html.readiness import NetworkTracker, NETWORK_IDLE_TIME
+
+
+def test_capture_on_timeout(renderer, registry):
+    # the page never gets to networkidle0: capture it instead of loading it again
+    pages = []
+    start = time.perf_counter()
+    resp = renderer.render('5', timeout=0.2, manipulate_page_func=lambda page: asyncio.sleep(0, pages.append(page)))
+    assert time.perf_counter() - start < 2
+    assert (resp.status_code, resp.text) == (200, FAKE_HTML)
+    assert pages[0].navigations == 1
+    assert registry.stats()['counters']['render.wait_timeout'] == 1
+
+
+def test_readiness(renderer, registry):
+    assert Readiness.get('#app').selector == '#app'
+    assert Readiness.get(dict(dom_quiet=1)).dom_quiet == 1
+
+    resp = renderer.render('0', ready='#app')
+    assert resp.status_code == 200 and 'ready' in resp.timings
+    assert registry.stats()['counters']['render.ok'] == 1
+
+    resp = renderer.render('0', ready=Readiness(selector='#never', max_wait=0.1))
+    assert resp.status_code == 200 and resp.timings['ready'] < 1
+    assert registry.stats()['counters']['render.wait_timeout'] == 1
+
+
+def test_network_idle():
+    page = SimpleNamespace(listeners={})
+    page.on = lambda event, callback: page.listeners.setdefault(event, callback)
+    tracker = NetworkTracker(page)
+
+    async def scenario():
+        for request in range(3):
+            page.listeners['request'](request)
+        idle = asyncio.ensure_future(tracker.idle(max_connections=2))
+        await asyncio.sleep(NETWORK_IDLE_TIME)
+        assert not idle.done()  # 3 requests in flight
+        page.listeners['requestfinished'](0)
+        start = time.monotonic()
+        await idle
+        assert time.monotonic() - start >= NETWORK_IDLE_TIME
+
+    asyncio.new_event_loop().run_until_complete(scenario())
@@ -0,0 +1,59 @@
+import os
+import time
+
+import pytest
+
+from . import browsers
+from get_html import recycling, HtmlRenderer, RecyclePolicy
+
+
+def test_policy():
+    policy = RecyclePolicy(max_pages=10, max_age=60, max_rss=2 ** 30)
+    assert policy.reason(pages=5, age=10, rss=2 ** 20) is None
+    assert policy.reason(pages=10, age=10) is not None
+    assert policy.reason(pages=5, age=61) is not None
+    assert policy.reason(pages=5, age=10, rss=2 ** 31) is not None
+    assert RecyclePolicy.get(dict(max_pages=3)).max_pages == 3
+
+
+def test_process_tree_rss():
+    if not os.path.exists('/proc') and recycling.psutil is None:
+        pytest.skip('no way to measure the memory on this platform')
+    assert recycling.process_tree_rss(os.getpid()) > 0
+
+
+def test_recycle_after_pages(browsers):
+    renderer = HtmlRenderer(recycle=RecyclePolicy(max_pages=2))
+    try:
+        for _ in range(5):
+            assert renderer.render('0').status_code == 200
+        assert len(browsers) == 3
+        assert all(b.closed for b in browsers[:2])
+        assert renderer.stats()['recycles'] == 2
+    finally:
+        renderer.close()
+
+
+def test_recycle_drains(browsers):
+    # renders in flight complete on the old browser, new ones wait for the new browser
+    renderer = HtmlRenderer(recycle=RecyclePolicy(max_pages=1))
+    results = list(renderer.render_many(['0', '0.2', '0.1', '0'], concurrency=4))
+    renderer.close()
+    assert all(r.status_code == 200 for _, r in results)
+    assert renderer.stats()['in_flight'] == 0
+
+
+def test_watchdog(browsers):
+    renderer = HtmlRenderer(watchdog_interval=0.05)
+    try:
+        renderer.render('0')
+        browsers[0].process.kill()
+        deadline = time.monotonic() + 5
+        while renderer.stats()['restarts'] == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert renderer.stats()['restarts'] == 1
+        # the next render runs on a new browser
+        renderer.render('0')
+        assert len(browsers) == 2 and browsers[0].closed
+    finally:
+        renderer.close()
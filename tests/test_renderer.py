@@ -58,3 +58,49 @@ def test_manipulate_page(renderer: HtmlRenderer):
     num_articles_after_scroll = len(re.findall('<article', r.text))
     print(num_articles, num_articles_after_scroll)
     assert num_articles_after_scroll > num_articles
+
+
+def test_block_media(renderer: HtmlRenderer):
+    r = renderer.render('https://xkcd.com', block='no-media')
+    assert r.status_code == 200
+    assert r.blocking['blocked_by_type'].get('image', 0) > 0
+
+
+class SleepyRenderer(HtmlRenderer):
+    """Renders nothing, but sleeps for the number of seconds given as URL and tracks concurrency."""
+
+    def __init__(self):
+        super().__init__()
+        self.in_flight, self.max_in_flight = 0, 0
+
+    @property
+    async def async_browser(self):
+        return None
+
+    async def async_render(self, url, **kwargs):
+        import asyncio
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(url)
+            if url < 0:
+                raise ValueError(url)
+            return url
+        finally:
+            self.in_flight -= 1
+
+
+def test_render_many():
+    renderer = SleepyRenderer()
+    results = list(renderer.render_many(iter([0.05, 0.01, -1, 0.1]), concurrency=2))
+    # completion order, not input order
+    assert [url for url, _ in results] == [0.01, -1, 0.05, 0.1]
+    assert isinstance(results[1][1], ValueError)
+    assert renderer.max_in_flight == 2
+
+
+def test_render_many_stop_early():
+    renderer = SleepyRenderer()
+    for url, result in renderer.render_many([0.01, 0.5, 0.5], concurrency=3):
+        break
+    assert renderer.in_flight == 0
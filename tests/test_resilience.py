@@ -0,0 +1,157 @@
+import asyncio
+import time
+from http.server import BaseHTTPRequestHandler
+
+import pyppeteer.errors
+import pytest
+import requests
+
+from . import local_server, fake_browsers
+from get_html import _default, HtmlRenderer, CircuitBreaker, CircuitOpenError, RetryPolicy, Deadline, \
+    DeadlineExceeded, enable_circuit_breaker, disable_circuit_breaker, enable_retries, disable_retries, \
+    enable_politeness, disable_politeness
+from get_html.resilience import is_transient
+from get_html.async_http import async_default_get, async_close
+
+#: Nothing listens on this port: connections are refused right away
+REFUSED_URL = 'http://127.0.0.1:1/'
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """Answers 503 to the first `failures` requests, then 200."""
+    protocol_version = 'HTTP/1.1'
+    failures, hits = 0, 0
+
+    def do_GET(self):
+        FlakyHandler.hits += 1
+        status = 503 if FlakyHandler.hits <= FlakyHandler.failures else 200
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def cleanup():
+    yield
+    disable_circuit_breaker()
+    disable_retries()
+
+
+def test_retryable():
+    policy = RetryPolicy(max_retries=2, backoff=1, max_backoff=3)
+    assert policy.retryable(requests.exceptions.ReadTimeout())
+    assert policy.retryable(requests.exceptions.ConnectionError())
+    assert policy.retryable(requests.exceptions.ContentDecodingError())
+    assert not policy.retryable(requests.exceptions.SSLError())
+    assert not policy.retryable(requests.exceptions.InvalidURL())
+    assert not policy.retryable(CircuitOpenError())
+    assert policy.retryable(pyppeteer.errors.TimeoutError()) and policy.retryable(asyncio.TimeoutError())
+    assert policy.retryable(status=503) and not policy.retryable(status=404)
+    assert policy.retry(1, status=503) and not policy.retry(2, status=503)
+    assert all(0 <= policy.delay(attempt) <= 3 for attempt in range(10))
+
+
+def test_circuit_breaker():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.1)
+    url = 'http://example.com/a'
+    breaker.record(url, failure=True)
+    breaker.record(url, failure=False)  # not consecutive
+    breaker.record(url, failure=True)
+    breaker.check(url)
+    breaker.record(url, failure=True)
+    assert breaker.state(url) == 'open'
+    with pytest.raises(CircuitOpenError):
+        breaker.check('http://EXAMPLE.com/b')
+    breaker.check('http://example.org/')  # other hosts are not affected
+
+    time.sleep(0.1)
+    assert breaker.state(url) == 'half-open'
+    breaker.check(url)  # the probe goes through...
+    with pytest.raises(CircuitOpenError):
+        breaker.check(url)  # ... but only one
+    breaker.record(url, failure=False)
+    assert breaker.state(url) == 'closed'
+    assert breaker.stats() == dict(opened=1, rejected=2, open=[])
+
+
+def test_render_timeout_opens_circuit():
+    breaker = CircuitBreaker(failure_threshold=1)
+    breaker.record('http://a/', failure=is_transient(pyppeteer.errors.TimeoutError('Navigation Timeout Exceeded')))
+    with pytest.raises(CircuitOpenError):
+        breaker.check('http://a/')
+
+
+def test_default_get_fails_fast():
+    enable_circuit_breaker(failure_threshold=3)
+    enable_retries(max_retries=2, backoff=0.01)
+    with pytest.raises(requests.exceptions.ConnectionError) as e:
+        _default.default_get(REFUSED_URL)
+    assert not isinstance(e.value, CircuitOpenError)
+    with pytest.raises(CircuitOpenError):
+        _default.default_get(REFUSED_URL)
+
+
+def test_default_get_retries():
+    FlakyHandler.failures, FlakyHandler.hits = 2, 0
+    enable_retries(max_retries=2, backoff=0.01)
+    with local_server(FlakyHandler) as base_url:
+        resp = _default.default_get(base_url)
+        assert resp.status_code == 200 and FlakyHandler.hits == 3
+        assert 'retry' in resp.timings
+
+        FlakyHandler.failures, FlakyHandler.hits = 5, 0
+        assert _default.default_get(base_url).status_code == 503  # the last response, after 3 attempts
+        assert FlakyHandler.hits == 3
+
+
+def test_retries_within_deadline():
+    policy = RetryPolicy(max_retries=2, backoff=1)
+    assert policy.next_delay(0, status=503) is not None and policy.next_delay(2, status=503) is None
+    assert policy.next_delay(0, deadline=Deadline(0), status=503) is None
+
+    FlakyHandler.failures = 100
+    enable_retries(max_retries=100, backoff=0.1)
+    with local_server(FlakyHandler) as base_url:
+        async def async_get(url, deadline):
+            try:
+                return await async_default_get(url, deadline=deadline)
+            finally:
+                await async_close()
+
+        for get in [_default.default_get, lambda url, deadline: asyncio.run(async_get(url, deadline))]:
+            FlakyHandler.hits = 0
+            start = time.perf_counter()
+            assert get(base_url, deadline=Deadline(0.5)).status_code == 503
+            assert time.perf_counter() - start < 0.6 and FlakyHandler.hits > 1
+
+
+def test_politeness_within_deadline():
+    FlakyHandler.failures, FlakyHandler.hits = 100, 0
+    enable_politeness(respect_retry_after=True, min_delay=10)
+    try:
+        with local_server(FlakyHandler) as base_url:
+            _default.default_get(base_url)
+            start = time.perf_counter()
+            with pytest.raises(DeadlineExceeded):  # not after 10s
+                _default.default_get(base_url, deadline=Deadline(0.5))
+            assert time.perf_counter() - start < 0.1 and FlakyHandler.hits == 1
+    finally:
+        disable_politeness()
+
+
+def test_render_fails_fast():
+    enable_circuit_breaker(failure_threshold=1)
+    with fake_browsers():
+        renderer = HtmlRenderer()
+        try:
+            assert renderer.render('0', timeout=0.05, ready='#never') is not None  # captured: not a failure
+            assert renderer.render('0').status_code == 200
+            with pytest.raises(pyppeteer.errors.PageError):
+                renderer.render('refused')
+            with pytest.raises(CircuitOpenError):
+                renderer.render('refused')
+        finally:
+            renderer.close()
@@ -0,0 +1,162 @@
+import asyncio
+import email.utils
+import sqlite3
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from . import fake_browsers, FakeRequest, FAKE_SCRIPT
+from get_html import HtmlRenderer, ResourceCache, BlockingPolicy, enable_resource_cache, disable_resource_cache
+
+CACHEABLE = {'Cache-Control': 'max-age=60', 'Content-Type': 'application/javascript'}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResourceCache(str(tmp_path / 'resources.db'), max_size=100)
+    yield cache
+    cache.close()
+
+
+def test_freshness(cache):
+    assert cache.store('http://a/1.js', 200, CACHEABLE, b'1')
+    resource = cache.lookup('http://a/1.js')
+    assert resource.content == b'1' and resource.headers['Content-Type'] == 'application/javascript'
+
+    assert not cache.store('http://a/2.js', 200, {'Cache-Control': 'no-store, max-age=60'}, b'2')
+    assert not cache.store('http://a/3.js', 200, {'Cache-Control': 'no-cache'}, b'3')
+    assert not cache.store('http://a/4.js', 200, {}, b'4')  # no freshness information
+    assert not cache.store('http://a/5.js', 404, CACHEABLE, b'5')
+    assert not cache.store('http://a/6.js', 200, {'Cache-Control': 'max-age=0'}, b'6')
+    assert cache.lookup('http://a/2.js') is None
+
+    # heuristic freshness: 10% of the age
+    now = time.time()
+    headers = {'Date': email.utils.formatdate(now), 'Last-Modified': email.utils.formatdate(now - 1000)}
+    assert cache.store('http://a/7.js', 200, headers, b'7')
+    assert cache.lookup('http://a/7.js') is not None
+
+
+def test_transfer_headers(cache):
+    cache.store('http://a/1.js', 200, dict(CACHEABLE, **{'Content-Encoding': 'gzip', 'Content-Length': '20',
+                                                        'Set-Cookie': 'a=b'}), b'1')
+    assert set(cache.lookup('http://a/1.js').headers) == {'Cache-Control', 'Content-Type'}
+
+
+def test_content_addressed(cache):
+    cache.store('http://a/jquery.js', 200, CACHEABLE, b'x' * 40)
+    cache.store('http://b/jquery.js', 200, CACHEABLE, b'x' * 40)
+    assert cache.stats()['size'] == 40 and cache.stats()['deduplicated'] == 1
+    # a new version: the old body is dropped once no URL refers to it
+    cache.store('http://a/jquery.js', 200, CACHEABLE, b'y' * 40)
+    assert cache.stats()['size'] == 80
+    cache.store('http://b/jquery.js', 200, CACHEABLE, b'y' * 40)
+    assert cache.stats()['size'] == 40
+
+
+def test_lru_eviction(cache, monkeypatch):
+    import get_html.resource_cache
+
+    monkeypatch.setattr(get_html.resource_cache, 'ACCESS_RESOLUTION', 0)
+    for i in range(3):
+        cache.store(f'http://a/{i}.js', 200, CACHEABLE, bytes([i]) * 40)
+        time.sleep(0.01)
+    assert cache.lookup('http://a/0.js') is None  # 120 > 100: the oldest was evicted
+    assert cache.lookup('http://a/1.js') is not None  # now the most recently used
+    cache.store('http://a/3.js', 200, CACHEABLE, b'3' * 40)
+    assert cache.lookup('http://a/1.js') is not None and cache.lookup('http://a/2.js') is None
+    stats = cache.stats()
+    assert stats['evicted'] == 2 and stats['size'] == 80
+    assert not cache.store('http://a/big.js', 200, CACHEABLE, b'b' * 101)
+
+
+def test_shared_between_instances(cache):
+    other = ResourceCache(cache.path)
+    try:
+        other.store('http://a/1.js', 200, CACHEABLE, b'1')
+        assert cache.lookup('http://a/1.js').content == b'1'
+    finally:
+        other.close()
+
+
+def test_failures_let_requests_through(cache, monkeypatch):
+    page = SimpleNamespace(on=lambda event, callback: None, mainFrame=object())
+
+    async def intercept():
+        stats, handle = cache.attach(page)
+        request = FakeRequest('http://a/1.js', 'script', page.mainFrame)
+        await handle(request)
+        return stats, request
+
+    cache.store('http://a/1.js', 200, CACHEABLE, b'1')
+
+    async def fail(response):
+        raise RuntimeError('Request is already handled')
+
+    monkeypatch.setattr(FakeRequest, 'respond', fail)
+    stats, request = asyncio.run(intercept())
+    assert request.handled == 'continued' and stats['misses'] == 1
+
+    def locked(url):
+        raise sqlite3.OperationalError('database is locked')
+
+    monkeypatch.setattr(cache, 'lookup', locked)
+    stats, request = asyncio.run(intercept())
+    assert request.handled == 'continued' and stats['misses'] == 1
+
+
+def wait_stored(cache, n):
+    for _ in range(100):
+        if cache.stats()['stored'] >= n:
+            return
+        time.sleep(0.01)
+
+
+@pytest.mark.parametrize('block', [None, BlockingPolicy(resource_types=('image',))])
+def test_renderer(tmp_path, block):
+    with fake_browsers():
+        renderer = HtmlRenderer(resource_cache=str(tmp_path / 'resources.db'), block=block)
+        try:
+            resp = renderer.render('0')
+            assert (resp.resource_cache['hits'], resp.resource_cache['misses']) == (0, 1)
+            cache = renderer._resource_cache
+            wait_stored(cache, 1)
+            assert cache.lookup(FAKE_SCRIPT).content == b'console.log(1)'
+
+            resp = renderer.render('0')
+            assert resp.resource_cache == dict(hits=1, misses=0, stored=0, bytes_saved=14)
+            stats = cache.stats()
+            assert (stats['hits'], stats['misses'], stats['hit_ratio'], stats['bytes_saved']) == (1, 1, 0.5, 14)
+        finally:
+            renderer.close()
+
+
+def test_lean_render(tmp_path):
+    with fake_browsers():
+        renderer = HtmlRenderer(resource_cache=str(tmp_path / 'resources.db'))
+        try:
+            result = renderer.render('0', lean=True)
+            assert result.resource_cache['misses'] == 1
+            assert result.to_response().resource_cache is result.resource_cache
+            wait_stored(renderer._resource_cache, 1)
+            assert renderer.render_text('0') and renderer._resource_cache.stats()['hits'] == 1
+        finally:
+            renderer.close()
+
+
+def test_enable_resource_cache(tmp_path):
+    cache = enable_resource_cache(str(tmp_path / 'resources.db'))
+    try:
+        with fake_browsers():
+            # renderers share the same cache
+            for _ in range(2):
+                renderer = HtmlRenderer()
+                try:
+                    renderer.render('0')
+                    wait_stored(cache, 1)
+                finally:
+                    renderer.close()
+        assert cache.stats()['hits'] == 1
+    finally:
+        disable_resource_cache()
@@ -0,0 +1,50 @@
+import asyncio
+import datetime
+
+import requests
+
+from . import local_server, renderer, FAKE_HTML
+from get_html import _default, RenderResult
+
+
+def test_conversions():
+    result = RenderResult('http://b', 200, {'Content-Type': 'text/html'}, text='<p>é</p>',
+                          elapsed=datetime.timedelta(seconds=1), redirects=[('http://a', 301, {'Location': '/b'})])
+    result.timings = dict(total=1)
+    assert (result.text, result.content, result.reason, result.ok) == ('<p>é</p>', '<p>é</p>'.encode(), 'OK', True)
+    assert [(h.url, h.status_code) for h in result.history] == [('http://a', 301)]
+    assert not hasattr(result, '__dict__')
+
+    resp = result.to_response()
+    assert isinstance(resp, requests.Response)
+    assert (resp.url, resp.status_code, resp.text, resp.headers['content-type']) == \
+           ('http://b', 200, '<p>é</p>', 'text/html')
+    assert resp.history[0].headers['Location'] == '/b'
+    assert resp.timings == dict(total=1) and not hasattr(resp, 'blocking')
+
+
+def test_from_response():
+    with local_server() as base_url:
+        result = RenderResult.from_response(_default.default_get(f'{base_url}/x'))
+    assert result.url == f'{base_url}/x'
+    assert '<p>/x</p>' in result.text
+    assert result.timings['total'] > 0
+
+
+def test_lean_render(renderer):
+    result = renderer.render('0', lean=True)
+    assert isinstance(result, RenderResult)
+    assert result.text is result.text  # no copy: the text is held as-is
+    assert (result.status_code, result.content) == (200, FAKE_HTML.encode())
+    assert result.timings['total'] > 0
+
+    assert renderer.render_text('0') == FAKE_HTML
+    assert renderer.render_bytes('0') == FAKE_HTML.encode()
+    assert isinstance(renderer.render('0'), requests.Response)
+
+
+def test_lean_render_async(renderer):
+    async def render():
+        return await asyncio.gather(renderer.async_render_text('0'), renderer.async_render_bytes('0'))
+
+    assert renderer.loop.run_until_complete(render()) == [FAKE_HTML, FAKE_HTML.encode()]
@@ -0,0 +1,64 @@
+import os
+import threading
+
+import pytest
+
+from . import local_server
+from get_html import _default, ResultSink, read_results, RenderResult
+
+
+@pytest.fixture
+def responses():
+    with local_server() as base_url:
+        yield [_default.default_get(f'{base_url}/page{i}') for i in range(3)]
+
+
+@pytest.mark.parametrize('format', ['jsonl.gz', 'warc.gz'])
+def test_write_read(tmp_path, responses, format):
+    rendered = RenderResult('http://b/é', 200, {'Content-Type': 'text/html; charset=iso-8859-1'}, text='<p>é</p>')
+    with ResultSink(tmp_path, format=format) as sink:
+        for r in responses:
+            sink.write(r.url, r, timings=r.timings)
+        sink.write('http://b/é', rendered)
+        sink.write('http://down', error=ConnectionError('refused'))
+    assert sink.stats()['results'] == 5 and sink.stats()['files'] == 1
+    assert not any(name.endswith('.part') for name in os.listdir(tmp_path))
+
+    results = list(read_results(str(tmp_path)))
+    assert [r['url'] for r in results] == [r.url for r in responses] + ['http://b/é', 'http://down']
+    assert results[0]['status'] == 200 and '<p>/page0</p>' in results[0]['text']
+    assert results[0]['headers']['Content-Type'].startswith('text/html')
+    assert results[3]['text'] == '<p>é</p>'  # stored in UTF-8, whatever the server said
+    assert results[4]['error'] == 'ConnectionError: refused' and 'status' not in results[4]
+    if format == 'jsonl.gz':
+        assert results[0]['timings']['total'] > 0
+
+
+@pytest.mark.parametrize('format', ['jsonl.gz', 'warc.gz'])
+def test_redirect(tmp_path, format):
+    # the requested URL is read back as url in all formats (e.g. to resume a crawl), the final one as final_url
+    redirected = RenderResult('http://b/final', 200, {'Content-Type': 'text/html'}, text='<p>final</p>',
+                              redirects=[('http://b/start', 301, {'Location': '/final'})])
+    with ResultSink(tmp_path, format=format) as sink:
+        sink.write('http://b/start', redirected)
+    [result] = read_results(str(tmp_path))
+    assert (result['url'], result['final_url'], result['text']) == ('http://b/start', 'http://b/final', '<p>final</p>')
+
+
+def test_rotation_and_threads(tmp_path, responses):
+    r = responses[0]
+    with ResultSink(tmp_path, format='warc.gz', max_file_size=1, batch_size=10, flush_interval=0.01) as sink:
+        threads = [threading.Thread(target=lambda: [sink.write(r.url, r) for _ in range(25)]) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    files = sorted(os.listdir(tmp_path))
+    assert len(files) == sink.stats()['files'] > 1
+    assert len(list(read_results(str(tmp_path)))) == 100
+    assert len(list(read_results(os.path.join(tmp_path, files[0])))) <= 10
+
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        ResultSink(tmp_path, format='zip')